@@ -4,6 +4,13 @@ from rdflib import URIRef
 from trilpy.acl import ACLR
 from trilpy.namespace import LDP, ACL
 
+MODES = [str(ACL.Read), str(ACL.Write), str(ACL.Append), str(ACL.Control)]
+
+
+def granted(aclr, agent, uri, inherited=False):
+    """Set of access modes that aclr permits agent on uri."""
+    return set(m for m in MODES if aclr.permits(agent, m, uri, inherited))
+
 
 class TestAll(unittest.TestCase):
     """TestAll class to run tests."""
@@ -65,3 +72,65 @@ class TestAll(unittest.TestCase):
                 b'<#auth1> a <http://www.w3.org/ns/auth/acl#Authorization>;'
                 b'  <http://www.w3.org/ns/auth/acl#default> <>.')
         self.assertTrue(a.has_heritable_auths)
+
+    def test06_compiled(self):
+        """Test compiled authorizations and modes granted."""
+        a = ACLR(uri='http://ex.org/c.acl', acl_for='http://ex.org/c')
+        a.parse(b'@prefix acl: <http://www.w3.org/ns/auth/acl#>.'
+                b'@prefix foaf: <http://xmlns.com/foaf/0.1/>.'
+                b'<#1> a acl:Authorization; acl:agent <http://ex.org/alice>;'
+                b'  acl:mode acl:Write; acl:accessTo <http://ex.org/c>.'
+                b'<#2> a acl:Authorization; acl:agentClass foaf:Agent;'
+                b'  acl:mode acl:Read; acl:accessTo <http://ex.org/c>; acl:default <http://ex.org/c>.',
+                context='http://ex.org/c.acl')
+        self.assertEqual(len(a.compiled), 2)
+        self.assertTrue(a.has_heritable_auths)
+        self.assertEqual(granted(a, 'http://ex.org/alice', 'http://ex.org/c'),
+                         set([str(ACL.Read), str(ACL.Write), str(ACL.Append)]))
+        self.assertEqual(granted(a, None, 'http://ex.org/c'), set([str(ACL.Read)]))
+        self.assertEqual(granted(a, 'http://ex.org/alice', 'http://ex.org/other'), set())
+        # inherited only uses default authorizations
+        self.assertEqual(granted(a, 'http://ex.org/alice', 'http://ex.org/c/r', inherited=True),
+                         set([str(ACL.Read)]))
+        # recompiled after change
+        compiled = a.compiled
+        self.assertIs(a.compiled, compiled)
+        a.parse(b'@prefix acl: <http://www.w3.org/ns/auth/acl#>.'
+                b'<#3> a acl:Authorization; acl:agentClass acl:AuthenticatedAgent;'
+                b'  acl:mode acl:Append; acl:accessTo <http://ex.org/c>.',
+                context='http://ex.org/c.acl')
+        self.assertEqual(len(a.compiled), 3)
+        self.assertEqual(granted(a, 'http://ex.org/bob', 'http://ex.org/c'),
+                         set([str(ACL.Read), str(ACL.Append)]))
+        self.assertEqual(granted(a, None, 'http://ex.org/c'), set([str(ACL.Read)]))
+        # replacement of content
+        a.content = ACLR().content
+        self.assertEqual(a.compiled, ())
+        self.assertFalse(a.has_heritable_auths)
+
+    def test07_permits(self):
+        """Test permits using indexed authorizations."""
+        a = ACLR(uri='http://ex.org/c.acl', acl_for='http://ex.org/c')
+        a.parse(b'@prefix acl: <http://www.w3.org/ns/auth/acl#>.'
+                b'<#1> a acl:Authorization; acl:agent <http://ex.org/alice>;'
+                b'  acl:mode acl:Write; acl:accessTo <http://ex.org/c>.'
+                b'<#2> a acl:Authorization; acl:agentGroup <http://ex.org/g#staff>;'
+                b'  acl:mode acl:Read; acl:default <http://ex.org/c>.',
+                context='http://ex.org/c.acl')
+        write = str(ACL.Write)
+        append = str(ACL.Append)
+        read = str(ACL.Read)
+        self.assertTrue(a.permits('http://ex.org/alice', write, 'http://ex.org/c'))
+        self.assertTrue(a.permits('http://ex.org/alice', append, 'http://ex.org/c'))
+        self.assertFalse(a.permits('http://ex.org/alice', read, 'http://ex.org/c'))
+        self.assertFalse(a.permits('http://ex.org/alice', write, 'http://ex.org/c/r', inherited=True))
+        self.assertFalse(a.permits(None, write, 'http://ex.org/c'))
+        # groups
+        staff = set(['http://ex.org/bob'])
+        in_group = lambda group, agent: group == 'http://ex.org/g#staff' and agent in staff
+        self.assertTrue(a.permits('http://ex.org/bob', read, 'http://ex.org/c/r', True, in_group))
+        self.assertFalse(a.permits('http://ex.org/carol', read, 'http://ex.org/c/r', True, in_group))
+        self.assertFalse(a.permits('http://ex.org/bob', read, 'http://ex.org/c/r', False, in_group))
+        # group membership not cached
+        staff.add('http://ex.org/carol')
+        self.assertTrue(a.permits('http://ex.org/carol', read, 'http://ex.org/c/r', True, in_group))
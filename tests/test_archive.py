@@ -0,0 +1,179 @@
+"""Archive export and import tests."""
+import hashlib
+import io
+import json
+import os
+import os.path
+import shutil
+import tarfile
+import tempfile
+import unittest
+from urllib.parse import urljoin
+from rdflib import URIRef, Literal
+from rdflib.namespace import RDF
+from trilpy.acl import ACLR
+from trilpy.archive import ArchiveError, ArchiveWriter, nquads_chunks, parse_nquads, read_archive, write_archive
+from trilpy.blob_store import BlobStore
+from trilpy.ldpc import LDPC
+from trilpy.ldpcv import LDPCv
+from trilpy.ldpnr import LDPNR
+from trilpy.ldprs import LDPRS
+from trilpy.namespace import ACL
+from trilpy.store import Store
+from trilpy.store_view import StoreView
+
+BINARY = b'some binary content'
+BINARY_KEY = hashlib.sha256(BINARY).hexdigest()
+MANIFEST = [{'class': 'LDPC', 'uri': 'http://ex.org'},
+            {'class': 'LDPRS', 'uri': 'http://ex.org/r', 'contained_in': 'http://ex.org'},
+            {'class': 'LDPNR', 'uri': 'http://ex.org/b', 'contained_in': 'http://ex.org',
+             'content_type': 'text/plain', 'blob': BINARY_KEY}]
+NQUADS = (b'<http://ex.org/r> <http://ex.org/p> "one" <http://ex.org/r> .\n'
+          b'<http://ex.org/r> <http://ex.org/q> _:b1 <http://ex.org/r> .\n'
+          b'_:b1 <http://ex.org/p> "two" <http://ex.org/r> .\n'
+          b'<http://ex.org> <http://ex.org/p> "root" <http://ex.org> .\n')
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def setUp(self):
+        """Create temporary directory with archive as a directory."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.archive_dir = os.path.join(self.tmpdir, 'archive')
+        os.makedirs(os.path.join(self.archive_dir, 'binaries'))
+        self.write('manifest.jsonl', ''.join(json.dumps(r) + '\n' for r in MANIFEST).encode('utf-8'))
+        self.write('rdf.nq', NQUADS)
+        self.write('binaries/' + BINARY_KEY, BINARY)
+
+    def tearDown(self):
+        """Remove temporary directory."""
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        """Write data to file name in archive directory."""
+        with open(os.path.join(self.archive_dir, name), 'wb') as fh:
+            fh.write(data)
+
+    def test01_nquads_chunks(self):
+        """Test splitting of N-Quads into chunks at graph boundaries."""
+        fh = io.BytesIO(NQUADS)
+        self.assertEqual(list(nquads_chunks(fh)), [NQUADS])
+        fh = io.BytesIO(NQUADS)
+        chunks = list(nquads_chunks(fh, chunk_size=1))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[0].count(b'\n'), 3)
+        graphs = parse_nquads(chunks[0])
+        self.assertEqual(list(graphs.keys()), ['http://ex.org/r'])
+        self.assertEqual(len(graphs['http://ex.org/r']), 3)
+        self.assertRaises(ArchiveError, parse_nquads, b'<http://ex.org/r> <http://ex.org/p> "x" .\n')
+        self.assertRaises(ArchiveError, parse_nquads, b'not n-quads\n')
+
+    def test02_read_archive(self):
+        """Test reading archive from directory and tar file."""
+        resources = read_archive(self.archive_dir, workers=1)
+        self.assertEqual(len(resources), 4)
+        (c, r, b, d) = resources
+        self.assertTrue(isinstance(c, LDPC))
+        self.assertEqual(len(c.content), 1)
+        self.assertEqual(r.contained_in, 'http://ex.org')
+        self.assertEqual(len(r.content), 3)
+        self.assertIn((URIRef('http://ex.org/r'), URIRef('http://ex.org/p'), Literal('one')), r.content)
+        self.assertTrue(isinstance(b, LDPNR))
+        self.assertEqual(b.content, BINARY)
+        self.assertEqual(b.content_type, 'text/plain')
+        self.assertIn('sha-256', b.digests)
+        # New description for the LDPNR
+        self.assertTrue(isinstance(d, LDPRS))
+        self.assertEqual(d.uri, None)
+        self.assertEqual(d.describes, 'http://ex.org/b')
+        # Same as gzipped tar file, parsing RDF in worker processes
+        tar_path = os.path.join(self.tmpdir, 'archive.tar.gz')
+        with tarfile.open(tar_path, 'w:gz') as tar:
+            tar.add(self.archive_dir, arcname='.')
+        resources = read_archive(tar_path, workers=2)
+        self.assertEqual([r.uri for r in resources],
+                         ['http://ex.org', 'http://ex.org/r', 'http://ex.org/b', None])
+        self.assertEqual(len(resources[1].content), 3)
+        self.assertEqual(resources[2].content, BINARY)
+
+    def test03_read_archive_blob_store(self):
+        """Test reading binaries into a blob store."""
+        blob_store = BlobStore(os.path.join(self.tmpdir, 'blobs'))
+        resources = read_archive(self.archive_dir, blob_store=blob_store, workers=1)
+        b = resources[2]
+        self.assertEqual(b.blob, BINARY_KEY)
+        self.assertIn(BINARY_KEY, blob_store)
+        s = Store('http://ex.org', blob_store=blob_store)
+        s.add_batch(resources)
+        self.assertEqual(s['http://ex.org/b'].content, BINARY)
+        self.assertEqual(blob_store.refcounts, {BINARY_KEY: 1})
+        # Blob already stored need not be in archive
+        os.unlink(os.path.join(self.archive_dir, 'binaries', BINARY_KEY))
+        resources = read_archive(self.archive_dir, blob_store=blob_store, workers=1)
+        self.assertEqual(resources[2].blob, BINARY_KEY)
+
+    def test04_bad_archives(self):
+        """Test errors for malformed archives."""
+        self.write('binaries/' + BINARY_KEY, b'other content')
+        self.assertRaises(ArchiveError, read_archive, self.archive_dir, None, 1)
+        os.unlink(os.path.join(self.archive_dir, 'binaries', BINARY_KEY))
+        self.assertRaises(ArchiveError, read_archive, self.archive_dir, None, 1)
+        self.write('manifest.jsonl', b'{"class": "LDPRS"}\n')
+        self.assertRaises(ArchiveError, read_archive, self.archive_dir, None, 1)
+        self.write('manifest.jsonl', b'{"class": "LDPRS", "uri": "http://ex.org/r"}\n')
+        self.assertRaises(ArchiveError, read_archive, self.archive_dir, None, 1)
+        os.unlink(os.path.join(self.archive_dir, 'manifest.jsonl'))
+        self.assertRaises(ArchiveError, read_archive, self.archive_dir, None, 1)
+        self.write('not_a_tar', b'junk')
+        self.assertRaises(ArchiveError, read_archive, os.path.join(self.archive_dir, 'not_a_tar'), None, 1)
+
+    def test05_write_archive(self):
+        """Test export of a store and import of the archive into another."""
+        blob_store = BlobStore(os.path.join(self.tmpdir, 'blobs'))
+        s = Store('http://ex.org', blob_store=blob_store)
+        s.add_batch(read_archive(self.archive_dir, blob_store=blob_store, workers=1))
+        b2 = LDPNR(content=BINARY)
+        (b2.uri, b2.contained_in) = ('http://ex.org/b2', 'http://ex.org')
+        s.add_batch([b2, LDPRS(describes=b2.uri)])
+        acl = ACLR(acl_for='http://ex.org/r')
+        auth = acl.add_public_read()
+        s.add(acl, uri='http://ex.org/r.acl')
+        s['http://ex.org/r'].acl = 'http://ex.org/r.acl'
+        tm = s.add(LDPCv(original='http://ex.org/r'), uri='http://ex.org/r/fcr:versions')
+        s['http://ex.org/r'].timemap = tm
+        m = s.add_memento(LDPRS(), s['http://ex.org/r'].content, tm)
+        # Small parts, and uncompressed to check output is a valid tar stream
+        writer = ArchiveWriter(compress=False)
+        writer.part_size = 200
+        fh = io.BytesIO()
+        view = StoreView(s)
+        for entry in view.entries():
+            fh.write(b''.join(writer.add(entry)))
+        fh.write(b''.join(writer.close()))
+        view.close()
+        self.assertEqual(len(fh.getvalue()) % tarfile.RECORDSIZE, 0)
+        tar_path = os.path.join(self.tmpdir, 'export.tar')
+        with open(tar_path, 'wb') as out:
+            out.write(fh.getvalue())
+        with tarfile.open(tar_path) as tar:
+            names = tar.getnames()
+        self.assertEqual(names.count('binaries/' + BINARY_KEY), 1)
+        self.assertGreater(len([n for n in names if n.startswith('manifest/')]), 1)
+        # Gzipped and imported into a new store
+        tar_path = os.path.join(self.tmpdir, 'export.tar.gz')
+        with open(tar_path, 'wb') as out:
+            self.assertEqual(write_archive(s, out), len(s))
+        self.assertEqual(s.views, [])
+        s2 = Store('http://ex.org')
+        s2.add_batch(read_archive(tar_path, workers=1))
+        self.assertEqual(sorted(s2._resources), sorted(s._resources))
+        self.assertEqual(s2['http://ex.org/b2'].content, BINARY)
+        self.assertEqual(s2['http://ex.org/b'].describedby, s['http://ex.org/b'].describedby)
+        self.assertEqual(s2['http://ex.org/r'].acl, 'http://ex.org/r.acl')
+        self.assertIn((URIRef(urljoin('http://ex.org/r.acl', auth)), RDF.type, ACL.Authorization),
+                      s2['http://ex.org/r.acl'].content)
+        self.assertEqual(len(s2[m].content), 3)
+        self.assertEqual(s2[m].memento_datetime, s[m].memento_datetime)
+        self.assertIn(m, s2.mementos)
+        self.assertEqual(s2[tm].contains, s[tm].contains)
@@ -0,0 +1,60 @@
+"""Blob store tests."""
+import hashlib
+import os.path
+import shutil
+import tempfile
+import unittest
+from trilpy.blob_store import BlobStore
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def setUp(self):
+        """Create temporary blob directory."""
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove temporary blob directory."""
+        shutil.rmtree(self.tmpdir)
+
+    def test01_add_bytes(self):
+        """Test addition of bytes and deduplication."""
+        bs = BlobStore(self.tmpdir)
+        key = bs.add_bytes(b'hello')
+        self.assertEqual(key, hashlib.sha256(b'hello').hexdigest())
+        self.assertIn(key, bs)
+        self.assertEqual(bs.path(key), os.path.join(self.tmpdir, key[0:2], key[2:4], key))
+        self.assertEqual(bs.add_bytes(b'hello'), key)
+        self.assertEqual(os.listdir(bs.tmp_dir), [])
+
+    def test02_add_file(self):
+        """Test addition of file which is moved into store."""
+        bs = BlobStore(self.tmpdir)
+        path = os.path.join(bs.tmp_dir, 'upload')
+        with open(path, 'wb') as fh:
+            fh.write(b'hello')
+        key = bs.add_file(path)
+        self.assertFalse(os.path.exists(path))
+        with open(bs.path(key), 'rb') as fh:
+            self.assertEqual(fh.read(), b'hello')
+        # duplicate is removed
+        with open(path, 'wb') as fh:
+            fh.write(b'hello')
+        self.assertEqual(bs.add_file(path, sha256=key), key)
+        self.assertFalse(os.path.exists(path))
+
+    def test03_refcounts(self):
+        """Test reference counting and removal."""
+        bs = BlobStore(self.tmpdir)
+        key = bs.add_bytes(b'hello')
+        bs.incref(key)
+        bs.incref(key)
+        bs.decref(key)
+        self.assertIn(key, bs)
+        self.assertEqual(bs.refcounts[key], 1)
+        bs.decref(key)
+        self.assertNotIn(key, bs)
+        self.assertNotIn(key, bs.refcounts)
+        # extra decref just logs
+        bs.decref(key)
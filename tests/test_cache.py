@@ -0,0 +1,64 @@
+"""Representation cache tests."""
+import unittest
+from trilpy.cache import RepresentationCache
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def test01_key(self):
+        """Test key generation."""
+        k1 = RepresentationCache.key('uri:a', '"e1"', 'text/turtle', ['minimal'])
+        k2 = RepresentationCache.key('uri:a', '"e1"', 'text/turtle', set(['minimal']))
+        self.assertEqual(k1, k2)
+        self.assertNotEqual(k1, RepresentationCache.key('uri:a', '"e2"', 'text/turtle', []))
+
+    def test02_get_put(self):
+        """Test get and put."""
+        c = RepresentationCache(max_bytes=10)
+        k = c.key('uri:a', '"e"', 'text/turtle', [])
+        self.assertEqual(c.get(k), None)
+        c.put(k, b'abc')
+        self.assertEqual(c.get(k), b'abc')
+        self.assertEqual(c.size, 3)
+        self.assertEqual((c.hits, c.misses), (1, 1))
+        # replace
+        c.put(k, b'abcd')
+        self.assertEqual(c.size, 4)
+        self.assertEqual(len(c), 1)
+        # too big
+        c.put(c.key('uri:b', '"e"', 'text/turtle', []), b'x' * 11)
+        self.assertEqual(len(c), 1)
+
+    def test03_lru_eviction(self):
+        """Test least recently used entries are evicted."""
+        c = RepresentationCache(max_bytes=10)
+        ka = c.key('uri:a', '"e"', 'text/turtle', [])
+        kb = c.key('uri:b', '"e"', 'text/turtle', [])
+        kc = c.key('uri:c', '"e"', 'text/turtle', [])
+        c.put(ka, b'aaaa')
+        c.put(kb, b'bbbb')
+        c.get(ka)
+        c.put(kc, b'cccc')  # evicts b
+        self.assertEqual(c.get(kb), None)
+        self.assertEqual(c.get(ka), b'aaaa')
+        self.assertEqual(c.get(kc), b'cccc')
+        self.assertEqual(c.size, 8)
+
+    def test04_invalidate(self):
+        """Test invalidation by URI and clear."""
+        c = RepresentationCache()
+        k1 = c.key('uri:a', '"e"', 'text/turtle', [])
+        k2 = c.key('uri:a', '"e"', 'application/ld+json', [])
+        k3 = c.key('uri:b', '"e"', 'text/turtle', [])
+        c.put(k1, b'1')
+        c.put(k2, b'2')
+        c.put(k3, b'3')
+        c.invalidate('uri:a')
+        self.assertEqual(c.get(k1), None)
+        self.assertEqual(c.get(k2), None)
+        self.assertEqual(c.get(k3), b'3')
+        c.invalidate('uri:not-there')
+        c.clear()
+        self.assertEqual(len(c), 0)
+        self.assertEqual(c.size, 0)
@@ -0,0 +1,88 @@
+"""Containment index tests."""
+import random
+import unittest
+from trilpy.containment_index import SortedStrings, ContainmentIndex
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def test01_sorted_strings(self):
+        """Test SortedStrings against a sorted set."""
+        ss = SortedStrings()
+        ss.chunk_size = 4
+        expected = set()
+        rnd = random.Random(1)
+        for n in range(500):
+            v = str(rnd.randrange(100))
+            if (rnd.random() < 0.6):
+                ss.add(v)
+                expected.add(v)
+            else:
+                self.assertEqual(ss.discard(v), v in expected)
+                expected.discard(v)
+            self.assertEqual(len(ss), len(expected))
+        self.assertGreater(len(ss._chunks), 1)
+        self.assertEqual(list(ss), sorted(expected))
+        for v in ('0', '5', '50', '99', '999', ''):
+            self.assertEqual(v in ss, v in expected)
+            self.assertEqual(list(ss.iter_after(v)),
+                             sorted(x for x in expected if x > v))
+            self.assertEqual(list(ss.iter_before(v)),
+                             sorted((x for x in expected if x < v), reverse=True))
+        self.assertEqual(list(ss.iter_before()), sorted(expected, reverse=True))
+
+    def test02_set_behavior(self):
+        """Test ContainmentIndex acts as a set."""
+        ci = ContainmentIndex()
+        self.assertEqual(len(ci), 0)
+        self.assertEqual(list(ci), [])
+        ci.add('http://ex.org/c/b')
+        ci.add('http://ex.org/c/a')
+        ci.add('http://ex.org/c/a')
+        ci.add('http://other.org/z')
+        self.assertEqual(ci.prefix, 'http://ex.org/c/')
+        self.assertEqual(list(ci._suffixes), ['a', 'b'])
+        self.assertEqual(len(ci), 3)
+        self.assertIn('http://ex.org/c/a', ci)
+        self.assertNotIn('http://ex.org/c/c', ci)
+        self.assertIn('http://other.org/z', ci)
+        self.assertEqual(ci, set(['http://ex.org/c/a', 'http://ex.org/c/b', 'http://other.org/z']))
+        self.assertEqual(list(ci), ['http://ex.org/c/a', 'http://ex.org/c/b', 'http://other.org/z'])
+        ci.remove('http://other.org/z')
+        self.assertRaises(KeyError, ci.remove, 'http://other.org/z')
+        ci.discard('http://ex.org/c/b')
+        self.assertEqual(ci, set(['http://ex.org/c/a']))
+        self.assertEqual(ContainmentIndex(['uri:b', 'uri:a']), set(['uri:a', 'uri:b']))
+
+    def test03_page(self):
+        """Test paging with prefixed and other URIs."""
+        uris = ['http://ex.org/c/' + str(n) for n in range(10)]
+        uris += ['http://a.org/x', 'http://ex.org/c', 'http://ex.org/d', 'http://z.org/']
+        ci = ContainmentIndex(uris)
+        expected = sorted(uris)
+        self.assertEqual(list(ci), expected)
+        # walk forwards and backwards
+        pages = []
+        after = None
+        while True:
+            (page, has_prev, has_next) = ci.page(3, after=after)
+            self.assertEqual(has_prev, after is not None)
+            pages.append(page)
+            if not has_next:
+                break
+            after = page[-1]
+        self.assertEqual(sum(pages, []), expected)
+        before = pages[-1][0]
+        for page in reversed(pages[:-1]):
+            (p, has_prev, has_next) = ci.page(3, before=before)
+            self.assertEqual(p, page)
+            self.assertTrue(has_next)
+            before = p[0]
+        self.assertFalse(has_prev)
+        # bounds not in index
+        self.assertEqual(ci.page(2, after='http://ex.org/c/55'),
+                         (['http://ex.org/c/6', 'http://ex.org/c/7'], True, True))
+        self.assertEqual(ci.page(2, after='http://zz.org/'), ([], True, False))
+        self.assertEqual(ci.page(2, before='http://a.org/'), ([], False, True))
+        self.assertEqual(ContainmentIndex().page(2), ([], False, False))
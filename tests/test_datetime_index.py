@@ -0,0 +1,53 @@
+"""Datetime index tests."""
+from datetime import datetime, timedelta, timezone
+import random
+import unittest
+from trilpy.datetime_index import DatetimeIndex
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def test01_add_discard(self):
+        """Test order is maintained as mementos are added and removed."""
+        di = DatetimeIndex()
+        base = datetime(2018, 1, 1, tzinfo=timezone.utc)
+        expected = {}
+        rnd = random.Random(1)
+        for n in range(300):
+            uri = 'info:m%d' % (rnd.randrange(50))
+            if (rnd.random() < 0.7):
+                dt = base + timedelta(days=rnd.randrange(20))
+                di.add(uri, dt)
+                expected[uri] = dt
+            else:
+                di.discard(uri)
+                expected.pop(uri, None)
+            self.assertEqual(len(di), len(expected))
+        entries = sorted((dt, uri) for (uri, dt) in expected.items())
+        self.assertEqual(list(di), entries)
+        self.assertEqual(di.first, entries[0])
+        self.assertEqual(di.last, entries[-1])
+        for (uri, dt) in expected.items():
+            self.assertIn(uri, di)
+            self.assertEqual(di.datetime(uri), dt)
+        self.assertEqual(di.link_format.count('rel="memento"'), len(expected))
+
+    def test02_at(self):
+        """Test choice of memento for a datetime."""
+        di = DatetimeIndex()
+        self.assertEqual(di.at(datetime(2018, 1, 1, tzinfo=timezone.utc)), None)
+        self.assertEqual(di.first, None)
+        self.assertEqual(di.link_format, '')
+        for day in (3, 5, 7):
+            di.add('info:d%d' % (day), datetime(2018, 1, day, tzinfo=timezone.utc))
+        for (day, uri) in ((1, 'info:d3'), (3, 'info:d3'), (4, 'info:d3'),
+                           (5, 'info:d5'), (6, 'info:d5'), (9, 'info:d7')):
+            self.assertEqual(di.at(datetime(2018, 1, day, tzinfo=timezone.utc)), uri)
+        self.assertIn('<info:d5>\n  ;rel="memento"\n  ;datetime="Fri, 05 Jan 2018 00:00:00 GMT"',
+                      di.link_format)
+        # Move a memento, cached link-format is updated
+        di.add('info:d5', datetime(2018, 1, 8, tzinfo=timezone.utc))
+        self.assertEqual(di.last, (datetime(2018, 1, 8, tzinfo=timezone.utc), 'info:d5'))
+        self.assertIn('Mon, 08 Jan 2018', di.link_format)
+        self.assertNotIn('Fri, 05 Jan 2018', di.link_format)
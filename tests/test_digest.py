@@ -1,6 +1,8 @@
 """Digest tests."""
+import os
+import tempfile
 import unittest
-from trilpy.digest import Digest, UnsupportedDigest, BadDigest
+from trilpy.digest import Digest, MultiDigest, UnsupportedDigest, BadDigest
 
 
 class TestAll(unittest.TestCase):
@@ -70,3 +72,27 @@ class TestAll(unittest.TestCase):
         d = Digest()
         d.want_digest = 'md5'
         self.assertEqual(d.digest_value(b'hello'), 'md5=XUFAKrxLKna5cZ2REBfFkg==')
+
+    def test06_multi_digest(self):
+        """Test MultiDigest single pass calculation."""
+        md = MultiDigest(['md5', 'sha'])
+        md.update(b'hel')
+        md.update(b'lo')
+        self.assertEqual(md.digests, {'md5': 'XUFAKrxLKna5cZ2REBfFkg==',
+                                      'sha': 'qvTGHdzF6KLavt4PO0gs2a6pQ00='})
+        # threaded update
+        md = MultiDigest(['md5', 'sha'])
+        md.threaded_min_size = 2
+        md.update(b'hello')
+        self.assertEqual(md.digests, {'md5': 'XUFAKrxLKna5cZ2REBfFkg==',
+                                      'sha': 'qvTGHdzF6KLavt4PO0gs2a6pQ00='})
+        # from file
+        fd, path = tempfile.mkstemp()
+        os.write(fd, b'hello')
+        os.close(fd)
+        md = MultiDigest(['md5'])
+        md.read_chunk_size = 2
+        md.update_from_file(path)
+        self.assertEqual(md.digests, {'md5': 'XUFAKrxLKna5cZ2REBfFkg=='})
+        os.unlink(path)
+        self.assertRaises(UnsupportedDigest, MultiDigest, ['md99'])
@@ -24,27 +24,31 @@ class TestAll(unittest.TestCase):
         # Bad type
         self.assertRaises(UnsupportedContainerType, LDPC, container_type=LDP.UNKNOWNContainer)
 
-    def test02_patch_result_prune_check(self):
-        """Test patch_result_check used by LDPRS.patch."""
+    def test02_patch_delta_prune_check(self):
+        """Test patch_delta_prune_check used by LDPRS.patch."""
         g1 = Graph()
         g1.add((EX.self, EX.whatever, EX.a))
         r = LDPC(uri=str(EX.self), content=g1)
         r.add_contained(EX.b)
         r.add_contained(EX.c)
-        # Legal -- empty result -> no containment triples in result
-        g2 = Graph()
-        self.assertEqual(r.patch_result_prune_check(g2), None)
-        # Legal -- included same contains triples, others triples may differ
-        g2 = Graph()
-        g2.add((EX.self, LDP.contains, EX.b))
-        g2.add((EX.self, LDP.contains, EX.c))
-        g2.add((EX.self, EX.whatevs, EX.d))
-        self.assertEqual(r.patch_result_prune_check(g2), None)
-        # Illegal - extra containment triple in result
-        g2 = Graph()
-        g2.add((EX.self, LDP.contains, EX.c))  # same
-        g2.add((EX.self, LDP.contains, EX.d))  # new -- BAD
-        self.assertRaises(PatchIllegal, r.patch_result_prune_check, g2)
+        # Legal -- nothing added, removing triples
+        added = set()
+        removed = set([(EX.self, EX.whatever, EX.a)])
+        self.assertEqual(r.patch_delta_prune_check(added, removed), None)
+        self.assertEqual(len(removed), 1)
+        # Legal -- added same contains triples (pruned), others triples may differ
+        added = set([(EX.self, LDP.contains, EX.b),
+                     (EX.self, LDP.contains, EX.c),
+                     (EX.self, EX.whatevs, EX.d)])
+        self.assertEqual(r.patch_delta_prune_check(added, set()), None)
+        self.assertEqual(added, set([(EX.self, EX.whatevs, EX.d)]))
+        # Illegal - extra containment triple added
+        added = set([(EX.self, LDP.contains, EX.c),  # same
+                     (EX.self, LDP.contains, EX.d)])  # new -- BAD
+        self.assertRaises(PatchIllegal, r.patch_delta_prune_check, added, set())
+        # Illegal - containment triple for another container
+        added = set([(EX.other, LDP.contains, EX.c)])
+        self.assertRaises(PatchIllegal, r.patch_delta_prune_check, added, set())
 
     def test03_extract_containement_triples(self):
         """Test extraction of containment triples."""
@@ -133,6 +137,30 @@ class TestAll(unittest.TestCase):
         self.assertIn((URIRef('uri:self-con'), LDP.contains, URIRef('uri:c1')), ct)
         self.assertIn((URIRef('uri:self-con'), LDP.contains, URIRef('uri:c3')), ct)
 
+    def test17_page(self):
+        """Test pages of containment triples."""
+        r = LDPC('uri:self-con')
+        for n in (5, 3, 1, 4, 2):
+            r.add_contained('uri:c' + str(n))
+        self.assertEqual(r.page(2), (['uri:c1', 'uri:c2'], False, True))
+        self.assertEqual(r.page(2, after='uri:c2'), (['uri:c3', 'uri:c4'], True, True))
+        self.assertEqual(r.page(2, after='uri:c4'), (['uri:c5'], True, False))
+        self.assertEqual(r.page(2, before='uri:c5'), (['uri:c3', 'uri:c4'], True, True))
+        self.assertEqual(r.page(2, before='uri:c2'), (['uri:c1'], False, True))
+        # removal of an entry doesn't change following pages
+        r.del_contained('uri:c1')
+        self.assertEqual(r.page(2, after='uri:c2'), (['uri:c3', 'uri:c4'], True, True))
+        self.assertEqual(r.page(10, omits=['containment']), ([], False, False))
+        self.assertEqual(r.paged_entries(['containment']), None)
+        # graph with just one page
+        g = r.graph(omits=[], page=['uri:c3'])
+        self.assertEqual(len(list(g.triples((None, LDP.contains, None)))), 1)
+        # members are paged for a direct container
+        r = LDPC('uri:self-mem', container_type=LDP.DirectContainer)
+        r.add_member('uri:m1')
+        r.add_contained('uri:c1')
+        self.assertEqual(r.page(2), (['uri:m1'], False, False))
+
     def test20_add_del_member(self):
         """Test addition and deletion of member triples."""
         r = LDPC('uri:self-mem')
@@ -1,4 +1,5 @@
 """LDPCv tests."""
+from datetime import datetime, timezone
 import unittest
 from rdflib import Graph, URIRef, Literal
 from rdflib.namespace import RDF
@@ -16,6 +17,10 @@ class TestAll(unittest.TestCase):
         tm = r.timemap_object
         self.assertEqual(tm.timegate, 'info:orig')
         self.assertEqual(tm.timemap, 'info:ldpcv')
+        r.add_contained('info:m1')
+        r.add_memento('info:m1', datetime(2018, 1, 2, tzinfo=timezone.utc))
+        self.assertEqual(r.timemap_object.mementos,
+                         {datetime(2018, 1, 2, tzinfo=timezone.utc): 'info:m1'})
 
     def test06_serialize(self):
         """Test some simple serialization cases."""
@@ -38,3 +43,20 @@ class TestAll(unittest.TestCase):
         tm = r.serialize(content_type='application/link-format')
         self.assertIn('<http://ex.org/an_ldpcv>', tm)
         self.assertIn('<info:the_orig', tm)
+        r.add_contained('http://ex.org/m1')
+        r.add_memento('http://ex.org/m1', datetime(2018, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        tm = r.serialize(content_type='application/link-format')
+        self.assertIn('<http://ex.org/m1>\n  ;rel="memento"\n  ;datetime="Tue, 02 Jan 2018 03:04:05 GMT"', tm)
+        self.assertIn('<http://ex.org/an_ldpcv>\n  ;rel="self"\n  ;from="Tue, 02 Jan 2018 03:04:05 GMT"', tm)
+
+    def test07_memento_at(self):
+        """Test memento_at() and removal with del_contained()."""
+        r = LDPCv('info:ldpcv', original='info:orig')
+        self.assertEqual(r.memento_at(datetime(2018, 1, 1, tzinfo=timezone.utc)), None)
+        for day in (2, 4):
+            r.add_contained('info:m%d' % (day))
+            r.add_memento('info:m%d' % (day), datetime(2018, 1, day, tzinfo=timezone.utc))
+        self.assertEqual(r.memento_at(datetime(2018, 1, 3, tzinfo=timezone.utc)), 'info:m2')
+        self.assertEqual(r.memento_at(datetime(2018, 1, 5, tzinfo=timezone.utc)), 'info:m4')
+        r.del_contained('info:m4')
+        self.assertEqual(r.memento_at(datetime(2018, 1, 5, tzinfo=timezone.utc)), 'info:m2')
@@ -0,0 +1,68 @@
+"""LDPNR tests."""
+import os
+import tempfile
+import unittest
+from trilpy.ldpnr import LDPNR
+from trilpy.namespace import LDP
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def test01_create(self):
+        """Test creation with in-memory content."""
+        r = LDPNR(content=b'hello', content_type='text/plain')
+        self.assertEqual(r.content, b'hello')
+        self.assertEqual(r.content_length, 5)
+        self.assertEqual(r.content_path, None)
+        self.assertEqual(r.rdf_types, [LDP.NonRDFSource])
+
+    def test02_content_path(self):
+        """Test content held in a file."""
+        fd, path = tempfile.mkstemp()
+        os.write(fd, b'hello')
+        os.close(fd)
+        r = LDPNR(content_path=path, content_type='text/plain')
+        self.assertEqual(r.content, b'hello')
+        self.assertEqual(r.content_length, 5)
+        r.read_chunk_size = 2
+        self.assertEqual(r.etag, '"5d41402abc4b2a76b9719d911017c592"')
+        # replacement from another LDPNR
+        r2 = LDPNR(content=b'bye', content_type='a/b')
+        r2.replace_content(r)
+        self.assertEqual(r2.content_path, path)
+        self.assertEqual(r2.content_type, 'text/plain')
+        self.assertEqual(r2.etag, '"5d41402abc4b2a76b9719d911017c592"')
+        # setting content drops file
+        r2.content = b'new'
+        self.assertEqual(r2.content_path, None)
+        self.assertEqual(r2.content_length, 3)
+        os.unlink(path)
+
+    def test03_content_digest(self):
+        """Test content_digest for in-memory and file content."""
+        r = LDPNR(content=b'hello')
+        self.assertEqual(r.content_digest('md5'), 'XUFAKrxLKna5cZ2REBfFkg==')
+        fd, path = tempfile.mkstemp()
+        os.write(fd, b'hello')
+        os.close(fd)
+        r = LDPNR(content_path=path)
+        r.read_chunk_size = 2
+        self.assertEqual(r.content_digest('md5'), 'XUFAKrxLKna5cZ2REBfFkg==')
+        os.unlink(path)
+
+    def test04_digests_cache(self):
+        """Test caching of digests and invalidation on replace."""
+        r = LDPNR(content=b'hello')
+        r.digests['sha-256'] = 'precomputed'
+        self.assertEqual(r.content_digest('sha-256'), 'precomputed')
+        r.content_digest('md5')
+        self.assertEqual(set(r.digests), set(['md5', 'sha-256']))
+        # replace from another LDPNR copies its digests
+        r2 = LDPNR(content=b'bye')
+        r2.content_digest('md5')
+        r.replace_content(r2)
+        self.assertEqual(r.digests, {'md5': 'v6md8zsTe8j7X1QH1+WNqA=='})
+        # setting content discards them
+        r.content = b'new'
+        self.assertEqual(r.digests, {})
@@ -70,3 +70,14 @@ class TestAll(unittest.TestCase):
         self.assertEqual(r._compute_etag(), '"d41d8cd98f00b204e9800998ecf8427e"')
         r.content = b'hello world, be nice to me!'
         self.assertEqual(r._compute_etag(), '"87bdb247e70d648d5782a4dd943cea76"')
+
+    def test22_changed(self):
+        """Test changed clears cached etag and notifies store."""
+        r = LDPR(content=b'abc')
+        self.assertEqual(r.etag, '"900150983cd24fb0d6963f7d28e17f72"')
+        r.content = b'def'
+        r.changed()
+        self.assertEqual(r.etag, '"4ed9407630eb1000c0f6b63842defa7d"')
+        r.store = MagicMock()
+        r.changed()
+        r.store.changed.assert_called_with(r, None, None)
@@ -75,6 +75,20 @@ class TestAll(unittest.TestCase):
         self.assertEqual(len(list(r.content.triples((None, URIRef('http://example.org/has'), None)))), 0)
         self.assertEqual(len(list(r.content.triples((None, URIRef('http://example.org/ate'), None)))), 1)
         self.assertEqual(len(list(r.content.triples((None, URIRef('http://example.org/was_eaten_by'), None)))), 1)
+        # delta only, graph hash kept up to date
+        (added, removed) = r.patch_delta('PREFIX x: <http://example.org/> '
+                                         'DELETE DATA { x:pizza x:was_eaten_by x:simeon . } ; '
+                                         'INSERT DATA { x:pizza x:was_eaten_by x:simeon . x:a x:b x:c . }',
+                                         'application/sparql-update')
+        self.assertEqual(added, set([(URIRef('http://example.org/a'), URIRef('http://example.org/b'),
+                                      URIRef('http://example.org/c'))]))
+        self.assertEqual(removed, set())
+        self.assertEqual(len(r.content), 2)
+        h = r.graph_hash
+        r.apply_delta(added, removed)
+        self.assertEqual(len(r.content), 3)
+        self.assertNotEqual(r.graph_hash, h)
+        self.assertEqual(r.graph_hash, LDPRS(content=r.content).graph_hash)
         # bad type
         self.assertRaises(PatchFailed, r.patch, sparql_update, 'bad/type')
         # bad update command
@@ -143,6 +157,24 @@ class TestAll(unittest.TestCase):
         s = r.serialize(extra=eg)
         self.assertIn('Wombat', s)
 
+    def test22_serialize_chunks(self):
+        """Test streamed serialization."""
+        uri = URIRef('http://ex.org/ldprs')
+        g = Graph()
+        g.add((uri, RDF.type, URIRef('http://ex.org/some_type')))
+        for n in range(100):
+            g.add((uri, EX.p, Literal('line\n"' + str(n) + '"')))
+        r = LDPRS(uri=uri, content=g)
+        chunks = list(r.serialize_chunks(chunk_size=1000))
+        self.assertGreater(len(chunks), 1)
+        g2 = Graph()
+        g2.parse(data=b''.join(chunks), format='turtle')
+        self.assertEqual(len(g2), 103)
+        g2 = Graph()
+        g2.parse(data=b''.join(r.serialize_chunks('application/n-triples', omits=['minimal'])), format='nt')
+        self.assertEqual(len(g2), 0)
+        self.assertRaises(Exception, r.serialize_chunks, 'application/ld+json')
+
     def test30_add_server_managed_triples(self):
         """Test addition of server manages triples to graph."""
         # CURRENTLY SAME AS JUST ADDING TYPE TRIPLES
@@ -192,23 +224,55 @@ class TestAll(unittest.TestCase):
     def test40_compute_etag(self):
         """Test computation of etag."""
         r = LDPRS()
-        self.assertEqual(r._compute_etag(), '"d41d8cd98f00b204e9800998ecf8427e"')
+        self.assertEqual(r._compute_etag(), '"00000000000000000000000000000000"')
         r.parse(b'<http://ex.org/a> <http://ex.org/b> <http://ex.org/c>.')
         self.assertEqual(r._compute_etag(), '"d06b10aa24d65ebf1fc913ce2e8d23ff"')
         r.parse(b'<http://ex.org/a> <http://ex.org/b> "hello".')
-        self.assertEqual(r._compute_etag(), '"5777dd3a4bc5065c7ed42bb86655c83f"')
+        self.assertEqual(r._compute_etag(), '"39f91c38a8631464c6f5d93b4007bc61"')
         r = LDPRS()
         r.parse(b'<http://ex.org/d> <http://ex.org/e> [ <http://ex.org/f> "111"; <http://ex.org/g> "222"].')
-        self.assertEqual(r._compute_etag(), '"afe90adc3b4a1778ee5c4bb32083b061"')
+        self.assertEqual(r._compute_etag(), '"ec1b65438d56588ced9ee527d484b6a2"')
         # This graph is different from the previous one because
         # it has two BNodes instead of one, and ETag will differ
         r = LDPRS()
         r.parse(b'<http://ex.org/d> <http://ex.org/e1> [ <http://ex.org/f> "111" ].' +
                 b'<http://ex.org/d> <http://ex.org/e2> [ <http://ex.org/g> "222" ].')
-        self.assertEqual(r._compute_etag(), '"f1c12772ce8d7e485155601c2c095d2b"')
+        self.assertEqual(r._compute_etag(), '"d8eba9f1dd482c8cf72b18c7b96dedc8"')
         # FIXME - This graph is different from the previous one but
         # will end up with the same ETag because BNodes are conflated
         r = LDPRS()
         r.parse(b'<http://ex.org/d> <http://ex.org/e2> [ <http://ex.org/f> "111" ].' +
                 b'<http://ex.org/d> <http://ex.org/e1> [ <http://ex.org/g> "222" ].')
-        self.assertEqual(r._compute_etag(), '"f1c12772ce8d7e485155601c2c095d2b"')
+        self.assertEqual(r._compute_etag(), '"d8eba9f1dd482c8cf72b18c7b96dedc8"')
+
+    def test41_etag_maintenance(self):
+        """Test ETag is updated incrementally and invalidated on change."""
+        r = LDPRS()
+        r.parse(b'<http://ex.org/a> <http://ex.org/b> <http://ex.org/c>.')
+        etag1 = r.etag
+        # incremental update on parse into non-empty graph
+        r.parse(b'<http://ex.org/a> <http://ex.org/b> "hello".')
+        self.assertNotEqual(r.etag, etag1)
+        self.assertEqual(r.etag, '"39f91c38a8631464c6f5d93b4007bc61"')
+        # re-adding an existing triple makes no change
+        r.parse(b'<http://ex.org/a> <http://ex.org/b> "hello".')
+        self.assertEqual(r.etag, '"39f91c38a8631464c6f5d93b4007bc61"')
+        # order of addition does not matter
+        r2 = LDPRS()
+        r2.parse(b'<http://ex.org/a> <http://ex.org/b> "hello".')
+        r2.parse(b'<http://ex.org/a> <http://ex.org/b> <http://ex.org/c>.')
+        self.assertEqual(r2.etag, r.etag)
+        # explicit removal
+        triple = (URIRef('http://ex.org/a'), URIRef('http://ex.org/b'), Literal('hello'))
+        r.content.remove(triple)
+        r.changed(removed=[triple])
+        self.assertEqual(r.etag, etag1)
+        # patch
+        r.patch('INSERT DATA { <http://ex.org/a> <http://ex.org/b> "hello" . }',
+                'application/sparql-update')
+        self.assertEqual(r.etag, '"39f91c38a8631464c6f5d93b4007bc61"')
+        # replacement of content
+        g = Graph()
+        g.add((URIRef('http://ex.org/a'), URIRef('http://ex.org/b'), URIRef('http://ex.org/c')))
+        r.content = g
+        self.assertEqual(r.etag, etag1)
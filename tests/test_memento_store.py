@@ -0,0 +1,105 @@
+"""Memento store tests."""
+import unittest
+from rdflib import URIRef, Literal
+from trilpy.memento_store import MementoStore, MementoDelta
+
+S = URIRef('http://ex.org/s')
+P = URIRef('http://ex.org/p')
+
+
+def version(n, size=50):
+    """Set of triples for version n, differing from n-1 by two triples."""
+    return set((S, P, Literal(i)) for i in range(n, n + size))
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def test01_add_and_reconstruct(self):
+        """Test mementos stored as deltas and reconstructed."""
+        ms = MementoStore()
+        ms.checkpoint_interval = 5
+        ms.cache_size = 3
+        for n in range(12):
+            ms.add('tm', 'm' + str(n), version(n))
+        self.assertEqual(len(ms), 12)
+        self.assertIn('m3', ms)
+        self.assertNotIn('m12', ms)
+        # checkpoints at 0, 5, 10
+        self.assertEqual(ms.delta('m0').base, None)
+        self.assertEqual(ms.delta('m1'), MementoDelta('tm', 'm0', 1, frozenset([(S, P, Literal(50))]),
+                                                      frozenset([(S, P, Literal(0))])))
+        self.assertEqual(ms.delta('m5').base, None)
+        self.assertEqual(ms.delta('m11').depth, 1)
+        self.assertEqual(ms.num_triples, 3 * 50 + 9 * 2)
+        for n in (11, 3, 0, 7, 3):
+            self.assertEqual(set(ms.graph('m' + str(n))), version(n))
+        self.assertEqual(len(ms._cache), 3)
+        self.assertRaises(KeyError, ms.graph, 'm99')
+
+    def test02_content_copied(self):
+        """Test later changes to content do not affect memento."""
+        ms = MementoStore()
+        content = version(0)
+        ms.add('tm', 'm0', content)
+        content.add((S, P, Literal('new')))
+        self.assertEqual(len(ms.graph('m0')), 50)
+
+    def test03_remove(self):
+        """Test removal re-encodes following memento."""
+        ms = MementoStore()
+        ms.checkpoint_interval = 4
+        for n in range(6):
+            ms.add('tm', 'm' + str(n), version(n))
+        ms.remove('m2')
+        self.assertEqual(ms.delta('m3').base, 'm1')
+        ms.remove('m0')
+        self.assertEqual(ms.delta('m1').base, None)
+        ms.remove('m5')
+        ms.remove('m99')
+        for n in (1, 3, 4):
+            self.assertEqual(set(ms.graph('m' + str(n))), version(n))
+        self.assertEqual(ms._chains['tm'], ['m1', 'm3', 'm4'])
+        for n in (1, 3, 4):
+            ms.remove('m' + str(n))
+        self.assertEqual(len(ms), 0)
+        self.assertEqual(ms._chains, {})
+
+    def test05_remove_timemap(self):
+        """Test removal of all mementos in a timemap."""
+        ms = MementoStore()
+        for n in range(3):
+            ms.add('tm1', 'a' + str(n), version(n))
+            ms.add('tm2', 'b' + str(n), version(n))
+        ms.graph('a2')
+        ms.remove_timemap('tm1')
+        ms.remove_timemap('tm99')
+        self.assertEqual(len(ms), 3)
+        self.assertNotIn('a2', ms)
+        self.assertNotIn('a2', ms._cache)
+        self.assertEqual(set(ms.graph('b2')), version(2))
+
+    def test04_restore(self):
+        """Test restore from deltas."""
+        ms = MementoStore()
+        for n in range(3):
+            ms.add('tm', 'm' + str(n), version(n))
+        ms2 = MementoStore()
+        for n in range(3):
+            ms2.restore('m' + str(n), ms.delta('m' + str(n)))
+        ms2.restore('m1', ms.delta('m1'))
+        self.assertEqual(ms2._chains['tm'], ['m0', 'm1', 'm2'])
+        self.assertEqual(set(ms2.graph('m2')), version(2))
+
+    def test06_copy(self):
+        """Test copy is not affected by later changes."""
+        ms = MementoStore()
+        for n in range(3):
+            ms.add('tm', 'm' + str(n), version(n))
+        ms2 = ms.copy()
+        ms.remove('m0')
+        ms.add('tm', 'm3', version(3))
+        self.assertEqual(len(ms2), 3)
+        self.assertNotIn('m3', ms2)
+        self.assertEqual(set(ms2.triples('m0')), version(0))
+        self.assertEqual(set(ms2.triples('m2')), version(2))
@@ -0,0 +1,41 @@
+"""N-Triples output tests."""
+import unittest
+from rdflib import Graph, URIRef, Literal, BNode
+from rdflib.namespace import XSD
+from trilpy.ntriples import nt_term, nt_line, nq_line, nt_chunks
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def test01_nt_term(self):
+        """Test N-Triples for terms."""
+        self.assertEqual(nt_term(URIRef('http://ex.org/a')), '<http://ex.org/a>')
+        self.assertEqual(nt_term(BNode('b1')), '_:b1')
+        self.assertEqual(nt_term(Literal('a "b"\nc\\')), '"a \\"b\\"\\nc\\\\"')
+        self.assertEqual(nt_term(Literal('chat', lang='fr')), '"chat"@fr')
+        self.assertEqual(nt_term(Literal(1)), '"1"^^<http://www.w3.org/2001/XMLSchema#integer>')
+
+    def test02_nt_line(self):
+        """Test N-Triples line."""
+        self.assertEqual(nt_line((URIRef('a:s'), URIRef('a:p'), Literal('o'))),
+                         '<a:s> <a:p> "o" .\n')
+        self.assertEqual(nq_line((URIRef('a:s'), URIRef('a:p'), Literal('o')), 'a:g'),
+                         '<a:s> <a:p> "o" <a:g> .\n')
+
+    def test03_nt_chunks(self):
+        """Test chunks of N-Triples parse back to the same graph."""
+        g = Graph()
+        for n in range(50):
+            g.add((URIRef('http://ex.org/s'), URIRef('http://ex.org/p'), Literal(n)))
+            g.add((BNode(), URIRef('http://ex.org/q'), Literal('été ' + str(n), lang='fr')))
+            g.add((URIRef('http://ex.org/s'), URIRef('http://ex.org/r'), Literal('x', datatype=XSD.token)))
+        chunks = list(nt_chunks(g, chunk_size=500))
+        self.assertGreater(len(chunks), 5)
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(len(chunk), 500)
+            self.assertTrue(chunk.endswith(b' .\n'))
+        g2 = Graph()
+        g2.parse(data=b''.join(chunks), format='nt')
+        self.assertEqual(len(g2), len(g))
+        self.assertEqual(list(nt_chunks([])), [])
@@ -0,0 +1,53 @@
+"""Overlay graph tests."""
+import unittest
+from rdflib import Graph, URIRef, Literal
+from trilpy.overlay_graph import OverlayStore
+
+EX = 'http://ex.org/'
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def setUp(self):
+        """Base graph with a few triples."""
+        self.base = Graph()
+        self.base.bind('ex', EX)
+        for n in range(5):
+            self.base.add((URIRef(EX + 's'), URIRef(EX + 'p'), Literal(n)))
+
+    def test01_add_remove(self):
+        """Test changes are recorded as a delta and base is not modified."""
+        overlay = OverlayStore(self.base)
+        g = overlay.graph()
+        t0 = (URIRef(EX + 's'), URIRef(EX + 'p'), Literal(0))
+        t9 = (URIRef(EX + 's'), URIRef(EX + 'p'), Literal(9))
+        g.add(t0)  # already in base
+        g.add(t9)
+        g.remove(t0)
+        self.assertEqual(overlay.added, set([t9]))
+        self.assertEqual(overlay.removed, set([t0]))
+        self.assertEqual(len(g), 5)
+        self.assertNotIn(t0, g)
+        self.assertIn(t9, g)
+        self.assertEqual(len(list(g.triples((None, URIRef(EX + 'p'), None)))), 5)
+        # undo both changes
+        g.add(t0)
+        g.remove(t9)
+        self.assertEqual(overlay.added, set())
+        self.assertEqual(overlay.removed, set())
+        # remove by pattern
+        g.remove((None, None, None))
+        self.assertEqual(len(g), 0)
+        self.assertEqual(len(overlay.removed), 5)
+        self.assertEqual(len(self.base), 5)
+
+    def test02_sparql_update(self):
+        """Test SPARQL Update with prefix from base."""
+        overlay = OverlayStore(self.base)
+        overlay.graph().update('DELETE { ?s ex:p 1 } INSERT { ?s ex:q 1 } WHERE { ?s ex:p 1 }',
+                               initNs={'ex': EX})
+        self.assertEqual(overlay.added, set([(URIRef(EX + 's'), URIRef(EX + 'q'), Literal(1))]))
+        self.assertEqual(overlay.removed, set([(URIRef(EX + 's'), URIRef(EX + 'p'), Literal(1))]))
+        self.assertEqual(len(self.base), 5)
+        self.assertIn(('ex', URIRef(EX)), list(overlay.graph().namespaces()))
@@ -0,0 +1,391 @@
+"""Persistent store tests."""
+from datetime import datetime, timezone
+import fcntl
+import json
+import os.path
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock
+from rdflib import URIRef, Literal
+from trilpy.blob_store import BlobStore
+from trilpy.cache import RepresentationCache
+from trilpy.persistent_store import PersistentStore, resource_to_record, resource_from_record
+from trilpy.store import KeyDeleted, ResourceConflict
+from trilpy import LDPR, LDPRS, LDPC, ACLR
+from trilpy.ldpcv import LDPCv
+from trilpy.ldpnr import LDPNR
+from trilpy.namespace import LDP
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def setUp(self):
+        """Create temporary store directory."""
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove temporary store directory."""
+        shutil.rmtree(self.tmpdir)
+
+    def test01_records(self):
+        """Test conversion of resources to and from records."""
+        r = LDPRS(uri='http://ex.org/r')
+        r.parse(b'<http://ex.org/a> <http://ex.org/b> [ <http://ex.org/c> "d" ].')
+        r.acl = 'http://ex.org/r.acl'
+        r2 = resource_from_record(resource_to_record(r))
+        self.assertTrue(isinstance(r2, LDPRS))
+        self.assertEqual(r2.uri, 'http://ex.org/r')
+        self.assertEqual(r2.acl, 'http://ex.org/r.acl')
+        self.assertEqual(len(r2), 2)
+        c = LDPC(uri='http://ex.org/c', container_type=LDP.DirectContainer)
+        c.add_member('http://ex.org/m')
+        c2 = resource_from_record(resource_to_record(c))
+        self.assertEqual(c2.container_type, LDP.DirectContainer)
+        self.assertEqual(c2.members, set(['http://ex.org/m']))
+        nr = LDPNR(uri='http://ex.org/nr', content=b'\x00\x01', content_type='a/b')
+        nr2 = resource_from_record(resource_to_record(nr))
+        self.assertEqual(nr2.content, b'\x00\x01')
+        self.assertEqual(nr2.content_type, 'a/b')
+        tm = LDPCv(uri='http://ex.org/tm', original='http://ex.org/nr')
+        self.assertEqual(resource_from_record(resource_to_record(tm)).original, 'http://ex.org/nr')
+        a = ACLR(acl_for='http://ex.org/c')
+        a.add_public_read()
+        a2 = resource_from_record(resource_to_record(a))
+        self.assertEqual(a2._acl_for, 'http://ex.org/c')
+        self.assertEqual(len(list(a2.authorizations)), 1)
+        self.assertRaises(Exception, resource_to_record, Exception())
+
+    def test02_replay_wal(self):
+        """Test restart replays WAL."""
+        s = PersistentStore('http://x.o', self.tmpdir)
+        c_uri = s.add(LDPC(), uri='http://x.o/c')
+        r_uri = s.add(LDPRS(), context=c_uri)
+        s[r_uri].parse(b'<http://ex.org/a> <http://ex.org/b> <http://ex.org/c>.')
+        d_uri = s.add(LDPNR(content=b'data', content_type='text/plain'), context=c_uri)
+        s.delete(d_uri)
+        s.close()
+        self.assertFalse(os.path.exists(s.snapshot_path))
+        s2 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(s2.seq, s.seq)
+        self.assertEqual(len(s2), 2)
+        self.assertEqual(s2[c_uri].contains, set([r_uri]))
+        self.assertEqual(len(s2[r_uri]), 1)
+        self.assertEqual(len(s2.object_references('http://ex.org/c')), 1)
+        self.assertRaises(KeyDeleted, s2.__getitem__, d_uri)
+        s2.close()
+
+    def test03_snapshot(self):
+        """Test snapshot and replay of tail."""
+        s = PersistentStore('http://x.o', self.tmpdir, snapshot_interval=3)
+        c_uri = s.add(LDPC(), uri='http://x.o/c')
+        r1 = s.add(LDPRS(), context=c_uri)
+        r2 = s.add(LDPRS(), context=c_uri)  # 3rd op -> snapshot
+        self.assertTrue(os.path.exists(s.snapshot_path))
+        self.assertEqual(os.path.getsize(s.wal_path), 0)
+        s.delete(r1)
+        s.close()
+        s2 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(s2.seq - s2.snapshot_seq, 1)
+        self.assertEqual(s2[c_uri].contains, set([r2]))
+        self.assertEqual(s2[r2].contained_in, c_uri)
+        self.assertRaises(KeyDeleted, s2.__getitem__, r1)
+        # further changes after restart are persisted too
+        s2.update(LDPRS(uri=r2))
+        s2.snapshot()
+        s2.close()
+        s3 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(s3.seq, 5)
+        self.assertEqual(s3[c_uri].contains, set([r2]))
+        # URI counter is restored from snapshot
+        self.assertEqual(s3._next_id, 3)
+        self.assertEqual(s3.add(LDPRS()), 'http://x.o/3')
+        # subtree delete is replayed
+        s3.delete_subtree(c_uri)
+        s3.close()
+        s4 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(list(s4), ['http://x.o/3'])
+        self.assertRaises(KeyDeleted, s4.__getitem__, r2)
+        s4.close()
+
+    def test04_blob_store(self):
+        """Test LDPNRs in blob store are restored with reference counts."""
+        bs = BlobStore(os.path.join(self.tmpdir, 'blobs'))
+        s = PersistentStore('http://x.o', self.tmpdir, blob_store=bs)
+        uri1 = s.add(LDPNR(content=b'hello', content_type='text/plain'))
+        uri2 = s.add(LDPNR(content=b'hello', content_type='text/plain'))
+        key = s[uri1].blob
+        s.snapshot()
+        uri3 = s.add(LDPNR(content=b'hello', content_type='text/plain'))
+        s.close()
+        bs2 = BlobStore(os.path.join(self.tmpdir, 'blobs'))
+        s2 = PersistentStore('http://x.o', self.tmpdir, blob_store=bs2)
+        self.assertEqual(bs2.refcounts, {key: 3})
+        self.assertEqual(s2[uri3].content, b'hello')
+        s2.delete(uri1)
+        s2.delete(uri2)
+        s2.delete(uri3)
+        self.assertNotIn(key, bs2)
+        s2.close()
+
+    def test05_partial_wal_entry(self):
+        """Test that an interrupted final WAL write is ignored."""
+        s = PersistentStore('http://x.o', self.tmpdir)
+        s.add(LDPRS(), uri='http://x.o/a')
+        s.close()
+        with open(s.wal_path, 'a') as fh:
+            fh.write('{"op": "add", "ur')
+        s2 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(len(s2), 1)
+        s2.close()
+
+    def test06_shared(self):
+        """Test store shared between two instances, as in two processes."""
+        s1 = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        s2 = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        s2.representation_cache = RepresentationCache()
+        r = LDPRS()
+        r.parse(b'<http://ex.org/a> <http://ex.org/b> "c".')
+        uri = s1.add(r, uri='http://x.o/r')
+        self.assertNotIn(uri, s2)
+        s2.sync()
+        self.assertEqual(len(s2[uri]), 1)
+        # changes in s2 seen in s1, cache in s2 invalidated by changes from s1
+        key = s2.representation_cache.key(uri, s2[uri].etag, 'text/turtle', [])
+        s2.representation_cache.put(key, b'cached')
+        s2[uri].parse(b'<http://ex.org/a> <http://ex.org/b> "d".')
+        s1.sync()
+        self.assertEqual(len(s1[uri]), 2)
+        self.assertEqual(s1[uri].etag, s2[uri].etag)
+        s1.delete(uri)
+        s2.sync()
+        self.assertRaises(KeyDeleted, s2.__getitem__, uri)
+        self.assertEqual(len(s2.representation_cache), 0)
+        # new URIs allocated after catching up so do not clash
+        uri1 = s1.add(LDPR())
+        uri2 = s2.add(LDPR())
+        self.assertNotEqual(uri1, uri2)
+        s1.sync()
+        self.assertIn(uri2, s1)
+        self.assertEqual(s1.seq, s2.seq)
+        # URIs allocated but not yet used are not allocated again
+        uri1 = s1.new_uri()
+        uri2 = s2.new_uri()
+        self.assertNotEqual(uri1, uri2)
+        s2.add_new(LDPR(), uri2)
+        s1.add_new(LDPR(), uri1)
+        self.assertRaises(KeyError, s1.add_new, LDPR(), uri2)
+        # snapshot by s2 then more changes, s1 follows new WAL
+        s2.snapshot()
+        uri3 = s2.add(LDPR())
+        s1.sync()
+        self.assertIn(uri3, s1)
+        # two snapshots by s1, s2 must reload
+        s1.snapshot()
+        uri4 = s1.add(LDPR())
+        s1.snapshot()
+        s2.sync()
+        self.assertIn(uri4, s2)
+        self.assertEqual(set(s1), set(s2))
+        self.assertEqual(s1.seq, s2.seq)
+        s1.close()
+        s2.close()
+
+    def test07_shared_blobs(self):
+        """Test blobs are not removed when replaying operations."""
+        s1 = PersistentStore('http://x.o', self.tmpdir, shared=True,
+                             blob_store=BlobStore(os.path.join(self.tmpdir, 'blobs')))
+        bs2 = BlobStore(os.path.join(self.tmpdir, 'blobs'))
+        s2 = PersistentStore('http://x.o', self.tmpdir, shared=True, blob_store=bs2)
+        uri1 = s1.add(LDPNR(content=b'hello'))
+        key = s1[uri1].blob
+        s1.delete(uri1)
+        self.assertNotIn(key, s1.blob_store)
+        uri2 = s1.add(LDPNR(content=b'hello'))
+        s2.sync()
+        self.assertIn(key, bs2)
+        self.assertEqual(bs2.refcounts, {key: 1})
+        self.assertEqual(s2[uri2].content, b'hello')
+        s1.close()
+        s2.close()
+
+    def test08_mementos(self):
+        """Test delta-encoded mementos survive WAL replay and snapshot."""
+        s = PersistentStore('http://x.o', self.tmpdir)
+        r_uri = s.add(LDPRS(), uri='http://x.o/r')
+        tm_uri = s.add(LDPCv(original=r_uri), uri='http://x.o/r/fcr:versions')
+        m_uris = []
+        for n in range(4):
+            s[r_uri].parse(b'<http://ex.org/a> <http://ex.org/b> %d .' % (n))
+            m_uris.append(s.add_memento(LDPRS(), s[r_uri].content, tm_uri,
+                                        datetime=datetime(2018, 1, 2 + n, tzinfo=timezone.utc)))
+        s.delete(m_uris[1])
+        s.close()
+        s2 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(len(s2.mementos), 3)
+        self.assertEqual(s2[tm_uri].memento_at(datetime(2018, 1, 3, 12, tzinfo=timezone.utc)), m_uris[0])
+        self.assertEqual(s2[m_uris[3]].memento_datetime, datetime(2018, 1, 5, tzinfo=timezone.utc))
+        self.assertEqual(s2.mementos.delta(m_uris[2]).base, m_uris[0])
+        for n in (0, 2, 3):
+            self.assertEqual(len(s2[m_uris[n]]), n + 1)
+            self.assertTrue(s2[m_uris[n]].is_ldprm)
+        s2.snapshot()
+        s2.close()
+        s3 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(len(s3[m_uris[3]]), 4)
+        self.assertEqual([u for (dt, u) in s3[tm_uri].datetime_index], [m_uris[0], m_uris[2], m_uris[3]])
+        self.assertEqual(s3[m_uris[3]].etag, s2[m_uris[3]].etag)
+        s3.close()
+
+    def test09_add_batch(self):
+        """Test batch add is committed by a snapshot."""
+        s = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        s.add(LDPC(), uri='http://x.o')
+        s2 = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        resources = []
+        for n in range(3):
+            r = LDPRS(uri='http://x.o/%d' % n)
+            r.contained_in = 'http://x.o'
+            resources.append(r)
+        s.add_batch(resources)
+        self.assertEqual(s.seq, 2)
+        self.assertEqual(s.snapshot_seq, 2)
+        self.assertEqual(os.path.getsize(s.wal_path), 0)
+        # Other process reloads from the snapshot
+        s2.sync()
+        self.assertEqual(len(s2), 4)
+        self.assertEqual(len(s2['http://x.o'].contains), 3)
+        s.close()
+        s2.close()
+        s3 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(len(s3['http://x.o'].contains), 3)
+        s3.close()
+
+    def test10_delta(self):
+        """Test in-place change with known delta is logged as just the delta."""
+        s = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        s2 = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        r = LDPRS()
+        r.parse(b'<http://ex.org/a> <http://ex.org/b> "c", "d".')
+        uri = s.add(r, uri='http://x.o/r')
+        s2.sync()
+        r2 = s2[uri]
+        s[uri].apply_delta([(URIRef('http://ex.org/a'), URIRef('http://ex.org/b'), Literal('e'))],
+                           [(URIRef('http://ex.org/a'), URIRef('http://ex.org/b'), Literal('c'))])
+        with open(s.wal_path, 'r') as fh:
+            op = json.loads(fh.readlines()[-1])
+        self.assertEqual(op['op'], 'delta')
+        self.assertNotIn('record', op)
+        self.assertEqual(op['added'], [['<http://ex.org/a>', '<http://ex.org/b>', '"e"']])
+        # Other process applies delta in place
+        s2.sync()
+        self.assertIs(s2[uri], r2)
+        self.assertEqual(set(o for o in r2.content.objects()), set([Literal('d'), Literal('e')]))
+        self.assertEqual(r2.etag, s[uri].etag)
+        # Other in-place changes are logged as updates
+        s[uri].parse(b'<http://ex.org/a> <http://ex.org/b> "f".')
+        s[uri].content.add((URIRef('http://ex.org/a'), URIRef('http://ex.org/b'), Literal('g')))
+        s[uri].changed()
+        with open(s.wal_path, 'r') as fh:
+            ops = [json.loads(line)['op'] for line in fh]
+        self.assertEqual(ops[-2:], ['delta', 'update'])
+        s.close()
+        s2.close()
+        s3 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(len(s3[uri]), 4)
+        self.assertEqual(s3[uri].etag, s[uri].etag)
+        s3.close()
+
+    def test11_shared_conflict(self):
+        """Test change to resource changed by another process is not lost silently."""
+        s = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        s2 = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        a = (URIRef('http://ex.org/a'), URIRef('http://ex.org/b'), Literal('a'))
+        b = (URIRef('http://ex.org/a'), URIRef('http://ex.org/b'), Literal('b'))
+        r = LDPRS()
+        r.content.add(a)
+        uri = s.add(r, uri='http://x.o/r')
+        s2.sync()
+        etag = s2[uri].etag
+        # Delta computed against old content is refused after catching up
+        s.apply_delta(uri, [b], [])
+        self.assertRaises(ResourceConflict, s2.apply_delta, uri, [], [a], etag)
+        self.assertEqual(set(s2[uri].content), set([a, b]))
+        s2.apply_delta(uri, [], [a], s2[uri].etag)
+        s.sync()
+        self.assertEqual(set(s[uri].content), set([b]))
+        # In-place change to resource replaced by another process
+        r2 = s2[uri]
+        s.update(LDPRS(uri=uri))
+        r2.changing()
+        r2.content.add(a)
+        self.assertRaises(ResourceConflict, r2.changed)
+        self.assertEqual(len(s2[uri]), 0)
+        # Replace of content checks ETag after catching up
+        etag = s2[uri].etag
+        new = LDPRS()
+        new.content.add(a)
+        s.replace_content(uri, new)
+        self.assertRaises(ResourceConflict, s2.replace_content, uri, LDPRS(), etag)
+        self.assertEqual(len(s2[uri]), 1)
+        # Catching up needs only a shared lock
+        s.apply_delta(uri, [b], [])
+        with open(os.path.join(self.tmpdir, 'lock'), 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_SH)
+            t = threading.Thread(target=s2.sync)
+            t.start()
+            t.join(5)
+            self.assertFalse(t.is_alive())
+            fcntl.flock(fh, fcntl.LOCK_UN)
+        self.assertEqual(len(s2[uri]), 2)
+        seq = s2.seq
+        s.close()
+        s2.close()
+        s3 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(s3.seq, seq)
+        self.assertEqual(len(s3[uri]), 0)
+        s3.close()
+
+    def test12_delete_subtree(self):
+        """Test subtree delete is logged first and done a batch at a time."""
+        s = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        s.progress_interval = 2
+        s.add(LDPC(), uri='http://x.o')
+        c = s.add(LDPC(), context='http://x.o', slug='c')
+        uris = [c] + [s.add(LDPRS(), context=c) for n in range(4)]
+        added = []
+
+        def crash_after_snapshot(n, total):
+            # Lock not held between batches, another thread can add and snapshot
+            t = threading.Thread(target=lambda: (added.append(s.add(LDPRS(), context='http://x.o')),
+                                                 s.snapshot()))
+            t.start()
+            t.join(5)
+            raise RuntimeError
+        self.assertRaises(RuntimeError, s.delete_subtree, c, crash_after_snapshot)
+        self.assertEqual(len(added), 1)
+        self.assertEqual(s._deleting, {})
+        self.assertEqual(len([uri for uri in uris if uri in s]), 3)
+        s.close()
+        # Snapshot taken part way through has the whole subtree deleted
+        s2 = PersistentStore('http://x.o', self.tmpdir)
+        self.assertEqual(set(s2), set(['http://x.o', added[0]]))
+        for uri in uris:
+            self.assertRaises(KeyDeleted, s2.__getitem__, uri)
+        s2.close()
+        # Replay of logged operation completes delete
+        s3 = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        s3.progress_interval = 2
+        s4 = PersistentStore('http://x.o', self.tmpdir, shared=True)
+        d = s3.add(LDPC(), context='http://x.o', slug='d')
+        d_uris = [d] + [s3.add(LDPRS(), context=d) for n in range(3)]
+        s4.sync()
+        self.assertRaises(RuntimeError, s3.delete_subtree, d, Mock(side_effect=RuntimeError))
+        self.assertEqual(len([uri for uri in d_uris if uri in s3]), 2)
+        s4.sync()
+        for uri in d_uris:
+            self.assertRaises(KeyDeleted, s4.__getitem__, uri)
+        s3.close()
+        s4.close()
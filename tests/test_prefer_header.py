@@ -1,6 +1,6 @@
 """prefer_header tests."""
 import unittest
-from trilpy.prefer_header import parse_prefer_header, find_preference, find_return_representation, parse_prefer_return_representation
+from trilpy.prefer_header import parse_prefer_header, find_preference, find_return_representation, parse_prefer_return_representation, find_max_member_count
 
 
 class TestAll(unittest.TestCase):
@@ -97,3 +97,20 @@ class TestAll(unittest.TestCase):
         omits, includes = parse_prefer_return_representation(1)
         self.assertEqual(omits, set())
         self.assertEqual(includes, set())
+
+    def test06_find_max_member_count(self):
+        """Test find_max_member_count."""
+        self.assertEqual(find_max_member_count([]), None)
+        self.assertEqual(find_max_member_count(
+            ['return=representation; max-member-count="10"']), 10)
+        self.assertEqual(find_max_member_count(
+            ['return=representation; include="http://www.w3.org/ns/ldp#PreferMinimalContainer"; max-member-count=5']), 5)
+        self.assertEqual(find_max_member_count(
+            ['return=representation; max-member-count="0"']), None)
+        self.assertEqual(find_max_member_count(
+            ['return=representation; max-member-count="lots"']), None)
+        # does not upset return=representation include/omit
+        (ptype, uris) = find_return_representation(
+            ['return=representation; omit="a"; max-member-count="10"'])
+        self.assertEqual(ptype, 'omit')
+        self.assertEqual(uris, ['a'])
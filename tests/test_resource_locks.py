@@ -0,0 +1,52 @@
+"""Resource locks tests."""
+import unittest
+from tornado import gen
+from tornado.ioloop import IOLoop
+from trilpy.resource_locks import ResourceLocks
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def test01_lock(self):
+        """Test locks held and released."""
+        locks = ResourceLocks()
+
+        async def check():
+            async with locks.lock(['uri:a', 'uri:b', None]):
+                self.assertTrue(locks.locked('uri:a'))
+                self.assertTrue(locks.locked('uri:b'))
+                self.assertFalse(locks.locked('uri:c'))
+            self.assertFalse(locks.locked('uri:a'))
+            self.assertEqual(len(locks), 0)
+        IOLoop.current().run_sync(check)
+
+    def test02_exclusion(self):
+        """Test requests for the same URI are serialized, others are not."""
+        locks = ResourceLocks()
+        events = []
+
+        async def worker(name, uris):
+            async with locks.lock(uris):
+                events.append(name + ' start')
+                await gen.sleep(0.01)
+                events.append(name + ' end')
+
+        async def check():
+            await gen.multi([worker('1', ['uri:a']),
+                             worker('2', ['uri:b', 'uri:a']),
+                             worker('3', ['uri:c'])])
+        IOLoop.current().run_sync(check)
+        self.assertGreater(events.index('2 start'), events.index('1 end'))
+        self.assertLess(events.index('3 start'), events.index('1 end'))
+        self.assertEqual(len(locks), 0)
+
+    def test03_release_on_exception(self):
+        """Test locks released if an exception is raised."""
+        locks = ResourceLocks()
+
+        async def check():
+            async with locks.lock(['uri:a']):
+                raise ValueError('oops')
+        self.assertRaises(ValueError, IOLoop.current().run_sync, check)
+        self.assertEqual(len(locks), 0)
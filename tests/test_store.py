@@ -1,7 +1,17 @@
 """tirlpy store tests."""
+from datetime import datetime, timezone
+import os
+import shutil
+import tempfile
+import threading
 import unittest
-from rdflib import URIRef
-from trilpy.store import Store, KeyDeleted
+from unittest.mock import Mock
+from rdflib import Graph, URIRef, Literal
+from trilpy.blob_store import BlobStore
+from trilpy.cache import RepresentationCache
+from trilpy.ldpcv import LDPCv
+from trilpy.ldpnr import LDPNR
+from trilpy.store import Store, KeyDeleted, ResourceConflict
 from trilpy import LDPR, LDPRS, LDPC, ACLR
 
 
@@ -13,6 +23,9 @@ class TestAll(unittest.TestCase):
         s = Store('http://ex.org/')
         self.assertEqual(s.base_uri, 'http://ex.org/')
         self.assertRaises(TypeError, Store)
+        # sync() and close() are no-ops for in-memory store
+        s.sync()
+        s.close()
 
     def test02_add(self):
         """Test addition of resource."""
@@ -73,6 +86,23 @@ class TestAll(unittest.TestCase):
         uri2 = s._get_uri()
         self.assertRegex(uri2, r'''\/(\d+)$''')
         self.assertNotEqual(uri1, uri2)
+        # Numbers taken otherwise are skipped, deleted ones not reused
+        s = Store('http://x.o')
+        s.add(LDPR(), uri='http://x.o/2')
+        self.assertEqual(s.add(LDPR()), 'http://x.o/1')
+        self.assertEqual(s.add(LDPR()), 'http://x.o/3')
+        s.delete('http://x.o/3')
+        self.assertEqual(s.add(LDPR()), 'http://x.o/4')
+        # URI allocated before the resource is added
+        uri = s.new_uri('http://x.o', 'new')
+        self.assertEqual(uri, 'http://x.o/new')
+        self.assertNotIn(uri, s)
+        self.assertEqual(s.add_new(LDPR(), uri), uri)
+        self.assertRaises(KeyError, s.add_new, LDPR(), uri)
+        uri = s.new_uri()
+        self.assertEqual(uri, 'http://x.o/5')
+        s.add(LDPR(), uri=uri)
+        self.assertRaises(KeyError, s.add_new, LDPR(), uri)
 
     def test07_individual_acl(self):
         """Test access to individual resource ACL."""
@@ -124,3 +154,344 @@ class TestAll(unittest.TestCase):
         self.assertRaises(Exception, s.acl, uri3)
         s.acl_inheritance_limit = 2
         self.assertEqual(s.acl(uri3), acl)
+
+    def test10_object_references_index(self):
+        """Test object_references() index is maintained through changes."""
+        s = Store('http://x.o/')
+        c1 = URIRef('http://ex.org/c1')
+        r1 = LDPRS()
+        r1.parse(b'<http://ex.org/a1> <http://ex.org/b> <http://ex.org/c1>.')
+        s.add(r1, uri='http://ex.org/r1')
+        self.assertEqual(len(s.object_references(str(c1))), 1)
+        # parse into stored resource
+        r1.parse(b'<http://ex.org/a2> <http://ex.org/b> <http://ex.org/c1>.')
+        self.assertEqual(len(s.object_references(str(c1))), 2)
+        # patch stored resource
+        r1.patch('DELETE DATA { <http://ex.org/a1> <http://ex.org/b> <http://ex.org/c1> . }',
+                 'application/sparql-update')
+        self.assertEqual(set(s.object_references(str(c1))),
+                         set([(URIRef('http://ex.org/a2'), URIRef('http://ex.org/b'), c1)]))
+        # replace via update
+        r2 = LDPRS(uri='http://ex.org/r1')
+        r2.parse(b'<http://ex.org/a3> <http://ex.org/b> <http://ex.org/c1>.')
+        s.update(r2)
+        self.assertEqual(set(s.object_references(str(c1))),
+                         set([(URIRef('http://ex.org/a3'), URIRef('http://ex.org/b'), c1)]))
+        # old object no longer in store so changes are ignored
+        r1.parse(b'<http://ex.org/a4> <http://ex.org/b> <http://ex.org/c1>.')
+        self.assertEqual(len(s.object_references(str(c1))), 1)
+        # delete
+        s.delete('http://ex.org/r1')
+        self.assertEqual(len(s.object_references(str(c1))), 0)
+        self.assertEqual(s._references, {})
+        self.assertEqual(s._referenced_by, {})
+
+    def test11_object_references_containment(self):
+        """Test object_references() includes containment triples."""
+        s = Store('http://x.o/')
+        c_uri = s.add(LDPC(), uri='http://x.o/c')
+        r_uri = s.add(LDPRS(), context=c_uri)
+        self.assertEqual(set(s.object_references(r_uri)),
+                         set([(URIRef(c_uri), URIRef('http://www.w3.org/ns/ldp#contains'), URIRef(r_uri))]))
+        s.delete(r_uri)
+        self.assertEqual(len(s.object_references(r_uri)), 0)
+
+    def test12_representation_cache_invalidation(self):
+        """Test store invalidates cached representations."""
+        s = Store('http://x.o/')
+        s.representation_cache = RepresentationCache()
+        c_uri = s.add(LDPC(), uri='http://x.o/c')
+        r_uri = s.add(LDPRS(), uri='http://x.o/r')
+        ck = s.representation_cache.key(c_uri, '"e"', 'text/turtle', [])
+        rk = s.representation_cache.key(r_uri, '"e"', 'text/turtle', [])
+        # add to container
+        s.representation_cache.put(ck, b'c')
+        s.add(LDPRS(), context=c_uri)
+        self.assertEqual(s.representation_cache.get(ck), None)
+        # in-place change
+        s.representation_cache.put(rk, b'r')
+        s[r_uri].parse(b'<http://ex.org/a> <http://ex.org/b> "c".')
+        self.assertEqual(s.representation_cache.get(rk), None)
+        # update
+        s.representation_cache.put(rk, b'r')
+        s.update(s[r_uri])
+        self.assertEqual(s.representation_cache.get(rk), None)
+        # delete of contained resource
+        s.representation_cache.put(ck, b'c')
+        s.delete(list(s[c_uri].contains)[0])
+        self.assertEqual(s.representation_cache.get(ck), None)
+
+    def test13_blob_store(self):
+        """Test LDPNR content moved to blob store and reference counted."""
+        tmpdir = tempfile.mkdtemp()
+        bs = BlobStore(tmpdir)
+        s = Store('http://x.o/', blob_store=bs)
+        uri1 = s.add(LDPNR(content=b'hello', content_type='text/plain'))
+        r1 = s[uri1]
+        key = r1.blob
+        self.assertEqual(key, bs.add_bytes(b'hello'))
+        self.assertEqual(r1.content_path, bs.path(key))
+        self.assertEqual(r1.content, b'hello')
+        # copy with same content shares blob
+        r2 = LDPNR()
+        r2.replace_content(r1)
+        uri2 = s.add(r2)
+        self.assertEqual(bs.refcounts[key], 2)
+        # identical content added separately is deduplicated
+        uri3 = s.add(LDPNR(content=b'hello'))
+        self.assertEqual(s[uri3].blob, key)
+        self.assertEqual(bs.refcounts[key], 3)
+        # replacement releases old blob
+        r1.replace_content(LDPNR(content=b'bye'))
+        s.update(r1)
+        self.assertNotEqual(r1.blob, key)
+        self.assertEqual(bs.refcounts[key], 2)
+        s.delete(uri2)
+        s.delete(uri3)
+        self.assertNotIn(key, bs)
+        s.delete(uri1)
+        self.assertEqual(bs.refcounts, {})
+        # precomputed sha-256 digest used as key without reading file
+        path = os.path.join(bs.tmp_dir, 'upload')
+        with open(path, 'wb') as fh:
+            fh.write(b'hello')
+        r4 = LDPNR(content_path=path)
+        r4.digests['sha-256'] = 'LPJNul+wow4m6DsqxbninhsWHlwfp0JecwQzYpOLmCQ='
+        bs.sha256_file = Mock(side_effect=Exception('should not be called'))
+        s.add(r4)
+        self.assertEqual(r4.blob, key)
+        shutil.rmtree(tmpdir)
+
+    def test14_acl_memo(self):
+        """Test memoization of inherited ACLs and invalidation."""
+        s = Store('http://x.o/')
+        acl = s.add(ACLR(uri='http://x.o/c.acl', acl_for='http://x.o/c'))
+        c = s.add(LDPC(acl=acl), uri='http://x.o/c')
+        c1 = s.add(LDPC(), context=c)
+        r1 = s.add(LDPR(), context=c1)
+        r2 = s.add(LDPR(), context=c1)
+        self.assertEqual(s.acl(r1), acl)
+        self.assertEqual(s._inherited_acls, {c: (acl, 0), c1: (acl, 1)})
+        self.assertEqual(s.acl(r2), acl)
+        # new ACL link on c1, with heritable authorization
+        acl1 = s.add(ACLR(uri='http://x.o/c1.acl', acl_for=c1))
+        s[acl1].add_public_read(inherit=True)
+        s[c1].acl = acl1
+        self.assertEqual(s.acl(r1), acl1)
+        # acl1 no longer heritable
+        s[acl1].content = ACLR().content
+        s[acl1].changed()
+        self.assertEqual(s.acl(r1), acl)
+        # deletion of container on path
+        s.delete(c1)
+        self.assertEqual(s._inherited_acls, {})
+
+    def test15_authorized(self):
+        """Test WAC authorization checks."""
+        s = Store('http://x.o/')
+        c = s.add(LDPC(), uri='http://x.o/c')
+        acl = ACLR(acl_for=c)
+        acl.parse(b'@prefix acl: <http://www.w3.org/ns/auth/acl#>.'
+                  b'<#1> a acl:Authorization; acl:agentGroup <http://x.o/g#staff>;'
+                  b'  acl:mode acl:Read, acl:Control; acl:accessTo <http://x.o/c>; acl:default <http://x.o/c>.',
+                  context='http://x.o/c.acl')
+        s[c].acl = s.add(acl, uri='http://x.o/c.acl')
+        r = s.add(LDPR(), context=c)
+        read = 'http://www.w3.org/ns/auth/acl#Read'
+        self.assertFalse(s.authorized('http://x.o/bob', read, r))
+        g = LDPRS()
+        g.parse(b'<http://x.o/g#staff> <http://www.w3.org/2006/vcard/ns#hasMember> <http://x.o/bob>.')
+        s.add(g, uri='http://x.o/g')
+        self.assertTrue(s.authorized('http://x.o/bob', read, r))
+        self.assertTrue(s.authorized('http://x.o/bob', read, c))
+        self.assertFalse(s.authorized('http://x.o/bob', 'http://www.w3.org/ns/auth/acl#Write', r))
+        # access to ACL requires control of container
+        self.assertTrue(s.authorized('http://x.o/bob', read, 'http://x.o/c.acl'))
+        self.assertFalse(s.authorized('http://x.o/alice', read, 'http://x.o/c.acl'))
+        # dangling ACL links are ignored, ACL inherited from container
+        c1 = s.add(LDPC(acl='http://x.o/missing.acl'), context=c)
+        c2 = s.add(LDPC(acl=r), context=c1)
+        r2 = s.add(LDPR(), context=c2)
+        self.assertEqual(s.acl(c1), 'http://x.o/c.acl')
+        self.assertEqual(s.acl(r2), 'http://x.o/c.acl')
+        self.assertTrue(s.authorized('http://x.o/bob', read, r2))
+        self.assertFalse(s.authorized('http://x.o/alice', read, r2))
+        s2 = Store('http://x.o/')
+        c = s2.add(LDPC(acl='http://x.o/missing.acl'), uri='http://x.o/c')
+        self.assertEqual(s2.acl(s2.add(LDPR(), context=c)), s2.acl_default)
+
+    def test16_contained_triples(self):
+        """Test descriptions of contained resources."""
+        s = Store('http://x.o/')
+        c = s.add(LDPC(), uri='http://x.o/c')
+        for n in range(3):
+            r = LDPRS()
+            r.content.add((URIRef('http://x.o/c/' + str(n)), URIRef('http://x.o/p'), Literal(n)))
+            s.add(r, uri='http://x.o/c/' + str(n), context=c)
+        s.add(LDPNR(content=b'x'), uri='http://x.o/c/bin', context=c)
+        triples = list(s.contained_triples(c, omits=[]))
+        self.assertEqual(len(triples), 9)  # 1 + 2 types each
+        triples = list(s.contained_triples(c, omits=['minimal']))
+        self.assertEqual(len(triples), 0)
+        g = s.contained_graph(c, omits=[], contained=['http://x.o/c/1', 'http://x.o/c/bin'])
+        self.assertEqual(len(g), 3)
+        self.assertIn((URIRef('http://x.o/c/1'), URIRef('http://x.o/p'), Literal(1)), g)
+
+    def test17_add_memento(self):
+        """Test memento content held as deltas."""
+        s = Store('http://x.o/')
+        r = s.add(LDPRS(), uri='http://x.o/r')
+        tm = s.add(LDPCv(original=r), uri='http://x.o/r/fcr:versions')
+        s[r].parse(b'<http://x.o/a> <http://x.o/b> "1".')
+        m1 = s.add_memento(LDPRS(), s[r].content, tm)
+        s[r].parse(b'<http://x.o/a> <http://x.o/b> "2".')
+        m2 = s.add_memento(LDPRS(), s[r].content, tm)
+        self.assertIn(m1, s[tm].contains)
+        self.assertTrue(s[m2].is_ldprm)
+        self.assertEqual(s[m2].original, r)
+        self.assertEqual(len(s[m1]), 1)
+        self.assertEqual(len(s[m2]), 2)
+        self.assertEqual(s.mementos.num_triples, 2)
+        # history not changed by change to original
+        s[r].content = Graph()
+        self.assertEqual(len(s[m2]), 2)
+        s.delete(m1)
+        self.assertNotIn(m1, s.mementos)
+        self.assertEqual(len(s[m2]), 2)
+
+    def test18_delete_subtree(self):
+        """Test delete of container and everything it contains."""
+        s = Store('http://x.o')
+        s.add(LDPC(), uri='http://x.o')
+        c = s.add(LDPC(), context='http://x.o', slug='c')
+        d = s.add(LDPC(), context=c, slug='d')
+        uris = [c, d]
+        for n in range(5):
+            r = LDPRS()
+            r.content.add((URIRef('http://x.o/s'), URIRef('http://x.o/p'), URIRef('http://x.o/o%d' % n)))
+            uris.append(s.add(r, context=(c if n < 2 else d)))
+        acl = s.add(ACLR(acl_for=d), context=d, slug='.acl')
+        s[d].acl = acl
+        uris.append(acl)
+        tm = s.add(LDPCv(original=d), context=c, slug='v')
+        uris.append(tm)
+        uris.append(s.add_memento(LDPRS(), Graph(), tm))
+        other = s.add(LDPRS(), context='http://x.o', slug='other')
+        self.assertEqual(set(s.subtree(c)), set(uris))
+        self.assertEqual(len(s.object_references('http://x.o/o4')), 1)
+        progress = Mock()
+        s.progress_interval = 4
+        self.assertEqual(s.delete_subtree(c, progress), 'http://x.o')
+        self.assertEqual(progress.call_count, 3)
+        progress.assert_called_with(len(uris), len(uris))
+        self.assertEqual(set(s), set(['http://x.o', other]))
+        self.assertEqual(s['http://x.o'].contains, set([other]))
+        for uri in uris:
+            self.assertRaises(KeyDeleted, s.__getitem__, uri)
+        self.assertEqual(len(s.object_references('http://x.o/o4')), 0)
+        self.assertEqual(s._acls, {})
+        self.assertEqual(len(s.mementos), 0)
+        self.assertEqual(s.delete_subtree(c), None)
+        # Lock is not held between batches, so another thread can add
+        # and resources already removed have tombstones
+        c = s.add(LDPC(), context='http://x.o', slug='c2')
+        uris = [c] + [s.add(LDPRS(), context=c) for n in range(8)]
+        added = []
+        tombstones = []
+
+        def add_from_thread(n, total):
+            tombstones.append(len([uri for uri in uris if s.is_deleted(uri)]))
+            t = threading.Thread(target=lambda: added.append(s.add(LDPRS(), context='http://x.o')))
+            t.start()
+            t.join(5)
+        s.delete_subtree(c, add_from_thread)
+        self.assertEqual(tombstones, [4, 8, 9])
+        self.assertEqual(len(added), 3)
+        self.assertEqual(s['http://x.o'].contains, set([other] + added))
+
+    def test19_add_batch(self):
+        """Test add of many resources in one batch."""
+        s = Store('http://x.o')
+        s.add(LDPC(), uri='http://x.o')
+        old = s.add(LDPRS(), context='http://x.o', slug='old')
+        s.delete(old)
+        c = LDPC(uri='http://x.o/c')
+        c.contained_in = 'http://x.o'
+        r = LDPRS(uri=old)
+        r.contained_in = 'http://x.o/c'
+        r.content.add((URIRef('http://x.o/s'), URIRef('http://x.o/p'), URIRef('http://x.o/o')))
+        b = LDPNR(uri='http://x.o/c/b', content=b'abc')
+        b.contained_in = 'http://x.o/c'
+        d = LDPRS(describes='http://x.o/c/b')
+        tm = LDPCv(uri='http://x.o/c/b/v', original=old)
+        mementos = []
+        for n in (2, 1):
+            m = LDPRS(uri='http://x.o/c/b/v/m%d' % n)
+            m.contained_in = tm.uri
+            m.timemap = tm.uri
+            m.original = old
+            m.memento_datetime = datetime(2018, 1, n, tzinfo=timezone.utc)
+            m.content.add((URIRef('http://x.o/s'), URIRef('http://x.o/p'), Literal(n)))
+            mementos.append(m)
+        # Contained resources before their container, root replaced
+        root = LDPC(uri='http://x.o')
+        uris = s.add_batch([r, b, d, c, tm] + mementos + [root])
+        self.assertEqual(uris[0], old)
+        self.assertEqual(uris[2], 'http://x.o/1')
+        self.assertEqual(len(s), 8)
+        self.assertNotIn(old, s.deleted)
+        self.assertEqual(s['http://x.o'].contains, set(['http://x.o/c']))
+        self.assertEqual(s['http://x.o/c'].contains, set([old, 'http://x.o/c/b']))
+        self.assertEqual(s['http://x.o/c/b'].describedby, 'http://x.o/1')
+        self.assertEqual(len(s.object_references('http://x.o/o')), 1)
+        # Mementos stored as deltas in datetime order
+        self.assertEqual(len(s.mementos), 2)
+        self.assertEqual(s.mementos.delta('http://x.o/c/b/v/m2').base, 'http://x.o/c/b/v/m1')
+        self.assertEqual(len(s['http://x.o/c/b/v/m2']), 1)
+        self.assertEqual(s[tm.uri].memento_at(datetime(2018, 1, 3, tzinfo=timezone.utc)),
+                         'http://x.o/c/b/v/m2')
+
+    def test20_apply_delta(self):
+        """Test apply_delta to stored LDPRS."""
+        s = Store('http://x.o')
+        r = LDPRS()
+        r.content.add((URIRef('http://x.o/s'), URIRef('http://x.o/p'), Literal('a')))
+        uri = s.add(r, uri='http://x.o/r')
+        etag = r.etag
+        added = [(URIRef('http://x.o/s'), URIRef('http://x.o/p'), Literal('b'))]
+        removed = [(URIRef('http://x.o/s'), URIRef('http://x.o/p'), Literal('a'))]
+        self.assertIs(s.apply_delta(uri, added, removed, etag), r)
+        self.assertEqual(set(r.content), set(added))
+        # Changed since etag, or not an LDPRS
+        self.assertRaises(ResourceConflict, s.apply_delta, uri, removed, added, etag)
+        self.assertEqual(set(r.content), set(added))
+        s.apply_delta(uri, removed, added)
+        self.assertEqual(set(r.content), set(removed))
+        b = s.add(LDPNR(content=b'abc'), uri='http://x.o/b')
+        self.assertRaises(ResourceConflict, s.apply_delta, b, added, [])
+        self.assertRaises(ResourceConflict, s.apply_delta, 'http://x.o/none', added, [])
+
+    def test21_replace_content(self):
+        """Test replace_content of stored resource."""
+        s = Store('http://x.o')
+        c = s.add(LDPC(), uri='http://x.o/c')
+        r = LDPRS()
+        r.content.add((URIRef('http://x.o/s'), URIRef('http://x.o/p'), URIRef('http://x.o/a')))
+        uri = s.add(r, uri='http://x.o/r', context=c)
+        r.acl = 'http://x.o/r.acl'
+        etag = r.etag
+        new = LDPRS()
+        new.content.add((URIRef('http://x.o/s'), URIRef('http://x.o/p'), URIRef('http://x.o/b')))
+        self.assertIs(s.replace_content(uri, new, etag), r)
+        self.assertEqual(set(r.content), set(new.content))
+        self.assertEqual(r.acl, 'http://x.o/r.acl')
+        self.assertEqual(r.contained_in, c)
+        self.assertEqual(len(s.object_references('http://x.o/a')), 0)
+        self.assertEqual(len(s.object_references('http://x.o/b')), 1)
+        # Changed since etag, wrong kind of content, or not there
+        self.assertRaises(ResourceConflict, s.replace_content, uri, LDPRS(), etag)
+        self.assertEqual(set(r.content), set(new.content))
+        self.assertRaises(ResourceConflict, s.replace_content, uri, LDPNR(content=b'abc'))
+        self.assertRaises(ResourceConflict, s.replace_content, 'http://x.o/none', LDPRS())
+        s.replace_content(uri, LDPRS())
+        self.assertEqual(len(r), 0)
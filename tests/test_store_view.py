@@ -0,0 +1,80 @@
+"""Store view tests."""
+import os
+import shutil
+import tempfile
+import unittest
+from rdflib import URIRef, Literal
+from trilpy.blob_store import BlobStore
+from trilpy.ldpc import LDPC
+from trilpy.ldpnr import LDPNR
+from trilpy.ldprs import LDPRS
+from trilpy.store import Store
+from trilpy.store_view import StoreView
+
+P = URIRef('http://x.o/p')
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def setUp(self):
+        """Create store with a container, an LDPRS and a binary."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.s = Store('http://x.o/', blob_store=BlobStore(os.path.join(self.tmpdir, 'blobs')))
+        self.c = self.s.add(LDPC(), uri='http://x.o/c')
+        r = LDPRS()
+        r.content.add((URIRef('http://x.o/c/r'), P, Literal('old')))
+        self.r = self.s.add(r, uri='http://x.o/c/r', context=self.c)
+        self.b = self.s.add(LDPNR(content=b'old binary'), uri='http://x.o/c/b', context=self.c)
+
+    def tearDown(self):
+        """Remove temporary directory."""
+        shutil.rmtree(self.tmpdir)
+
+    def entries(self, view):
+        """Dict of entries in view by URI."""
+        return dict((e.record['uri'], e) for e in view.entries())
+
+    def test01_unchanged(self):
+        """Test view of a store that does not change."""
+        view = StoreView(self.s)
+        self.assertEqual(len(view), 3)
+        self.assertEqual(self.s.views, [view])
+        entries = self.entries(view)
+        self.assertEqual(len(view), 0)
+        self.assertEqual(entries[self.r].record['contained_in'], self.c)
+        self.assertEqual(len(entries[self.r].triples), 1)
+        self.assertNotIn('triples', entries[self.r].record)
+        b = entries[self.b]
+        self.assertEqual(b.record['blob'], self.s[self.b].blob)
+        self.assertEqual(b.binary, self.s.blob_store.path(self.s[self.b].blob))
+        self.assertFalse(b.temporary)
+        view.close()
+        self.assertEqual(self.s.views, [])
+
+    def test02_changes(self):
+        """Test view is not affected by changes to the store."""
+        view = StoreView(self.s)
+        self.s[self.r].apply_delta([(URIRef(self.r), P, Literal('new'))], [])
+        self.s[self.r].apply_delta([(URIRef(self.r), P, Literal('newer'))], [])
+        self.s.add(LDPNR(content=b'new binary'), uri=self.b, context=self.c)
+        self.s.add(LDPRS(), uri='http://x.o/c/new', context=self.c)
+        self.s.delete_subtree(self.c)
+        self.assertEqual(len(self.s), 0)
+        self.assertEqual(len(view), 3)
+        entries = self.entries(view)
+        self.assertEqual(set(entries), set([self.c, self.r, self.b]))
+        self.assertEqual(set(entries[self.r].triples), set([(URIRef(self.r), P, Literal('old'))]))
+        b = entries[self.b]
+        self.assertTrue(b.temporary)
+        with open(b.binary, 'rb') as fh:
+            self.assertEqual(fh.read(), b'old binary')
+        view.close()
+        os.unlink(b.binary)
+        # Copy of blob that has not been read is removed on close
+        b2 = self.s.add(LDPNR(content=b'other'), uri='http://x.o/b2')
+        view = StoreView(self.s)
+        self.s.delete(b2)
+        self.assertEqual(len(os.listdir(self.s.blob_store.tmp_dir)), 1)
+        view.close()
+        self.assertEqual(os.listdir(self.s.blob_store.tmp_dir), [])
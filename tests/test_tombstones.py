@@ -0,0 +1,71 @@
+"""Tombstones tests."""
+import json
+import random
+import unittest
+from trilpy.tombstones import BloomFilter, Tombstones, encode_block, decode_block
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def test01_blocks(self):
+        """Test front coding round trip."""
+        uris = sorted(['http://ex.org/a', 'http://ex.org/a/1', 'http://ex.org/ab',
+                       'http://ex.org/été', 'http://ex.org/' + 'x' * 300])
+        data = encode_block(uris)
+        self.assertEqual(decode_block(data), uris)
+        self.assertLess(len(data), len(''.join(uris)))
+        self.assertEqual(decode_block(encode_block([])), [])
+
+    def test02_bloom_filter(self):
+        """Test Bloom filter has no false negatives and few false positives."""
+        bf = BloomFilter(1000)
+        for n in range(1000):
+            bf.add('uri:%d' % (n))
+        for n in range(1000):
+            self.assertIn('uri:%d' % (n), bf)
+        false_positives = sum(1 for n in range(1000, 11000) if 'uri:%d' % (n) in bf)
+        self.assertLess(false_positives, 200)
+
+    def test03_set_behavior(self):
+        """Test Tombstones against a set."""
+        ts = Tombstones()
+        ts.block_size = 4
+        ts.merge_size = 16
+        expected = set()
+        rnd = random.Random(1)
+        for n in range(3000):
+            uri = 'http://ex.org/c/%d' % (rnd.randrange(2000))
+            if (rnd.random() < 0.8):
+                ts.add(uri)
+                expected.add(uri)
+            else:
+                self.assertEqual(ts.discard(uri), uri in expected)
+                expected.discard(uri)
+            self.assertEqual(len(ts), len(expected))
+        self.assertGreater(len(ts._blocks), 1)
+        self.assertEqual(list(ts), sorted(expected))
+        for n in range(2000):
+            uri = 'http://ex.org/c/%d' % (n)
+            self.assertEqual(uri in ts, uri in expected)
+        self.assertNotIn('', ts)
+        self.assertNotIn('http://a.org/', ts)
+        self.assertEqual(set(Tombstones(['uri:b', 'uri:a'])), set(['uri:a', 'uri:b']))
+        # batch update
+        ts.update('http://ex.org/d/%d' % (n) for n in range(5000))
+        self.assertEqual(len(ts), len(expected) + 5000)
+        self.assertIn('http://ex.org/d/4999', ts)
+        ts.update(['http://ex.org/d/1', 'http://ex.org/d/2'])
+        self.assertEqual(len(ts), len(expected) + 5000)
+        self.assertEqual(len(list(ts)), len(ts))
+
+    def test04_record(self):
+        """Test round trip via JSON record."""
+        ts = Tombstones('http://ex.org/%d' % (n) for n in range(2000))
+        ts2 = Tombstones.from_record(json.loads(json.dumps(ts.to_record())))
+        self.assertEqual(len(ts2), 2000)
+        self.assertEqual(list(ts2), list(ts))
+        self.assertIn('http://ex.org/1999', ts2)
+        self.assertNotIn('http://ex.org/2000', ts2)
+        ts2.add('http://ex.org/2000')
+        self.assertIn('http://ex.org/2000', ts2)
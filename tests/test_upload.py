@@ -0,0 +1,34 @@
+"""Spooled upload tests."""
+import os.path
+import tempfile
+import unittest
+from trilpy.upload import SpooledUpload
+
+
+class TestAll(unittest.TestCase):
+    """TestAll class to run tests."""
+
+    def test01_write_and_digests(self):
+        """Test writing chunks and incremental digests."""
+        u = SpooledUpload(digest_types=['md5', 'sha'])
+        u.write(b'hel')
+        u.write(b'lo')
+        u.close()
+        self.assertEqual(u.length, 5)
+        self.assertEqual(u.digests, {'md5': 'XUFAKrxLKna5cZ2REBfFkg==',
+                                     'sha': 'qvTGHdzF6KLavt4PO0gs2a6pQ00='})
+        with open(u.path, 'rb') as fh:
+            self.assertEqual(fh.read(), b'hello')
+        u.discard()
+        self.assertFalse(os.path.exists(u.path))
+        # discard again is harmless
+        u.discard()
+
+    def test02_spool_dir(self):
+        """Test use of specific spool directory."""
+        d = tempfile.mkdtemp()
+        u = SpooledUpload(spool_dir=d)
+        self.assertEqual(os.path.dirname(u.path), d)
+        self.assertEqual(u.digests, {})
+        u.discard()
+        os.rmdir(d)
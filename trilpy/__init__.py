@@ -4,6 +4,7 @@ Requires python 3.3 or greater.
 """
 import sys
 from .store import Store, KeyDeleted
+from .persistent_store import PersistentStore
 from .ldpr import LDPR
 from .ldprs import LDPRS
 from .ldpc import LDPC
@@ -4,6 +4,7 @@ Code to implement the Web Access Control (WAC)
 <https://github.com/solid/web-access-control-spec>
 in the context of the trilpy server.
 """
+from collections import namedtuple
 import hashlib
 from rdflib import URIRef, Literal
 from rdflib.namespace import RDF, FOAF
@@ -11,6 +12,17 @@ from .ldprs import LDPRS
 from .namespace import LDP, ACL
 
 
+# One authorization compiled from ACL triples, each field is a frozenset
+# of strings: agents, agent_classes, agent_groups, modes, access_to,
+# default (the containers for which it is inherited by contained resources)
+Authorization = namedtuple('Authorization',
+                           ['agents', 'agent_classes', 'agent_groups', 'modes',
+                            'access_to', 'default'])
+
+# Modes that grant each mode, acl:Write implies acl:Append
+GRANTING_MODES = {str(ACL.Append): (str(ACL.Append), str(ACL.Write))}
+
+
 class ACLR(LDPRS):
     """An ACL resource is an LDP RDF Source.
 
@@ -21,9 +33,14 @@ class ACLR(LDPRS):
     """
 
     type_label = 'ACLR'
+    max_decisions = 10000
 
     def __init__(self, uri=None, acl_for=None):
         """Initialize ACLR."""
+        self._compiled = None
+        self._compiled_content = None
+        self._index = None
+        self._permits = {}
         super(ACLR, self).__init__(uri)
         self._acl_for = acl_for
 
@@ -47,8 +64,105 @@ class ACLR(LDPRS):
         self.content.add((auth, ACL.accessTo, acl_for))
         if (inherit):
             self.content.add((auth, ACL.defaultForNew, acl_for))
+        self.changed()
         return(auth)
 
+    def changed(self, added=None, removed=None):
+        """Discard compiled authorizations, then handle change as LDPRS."""
+        self._compiled = None
+        super(ACLR, self).changed(added, removed)
+
+    @property
+    def compiled(self):
+        """Tuple of Authorization objects compiled from content.
+
+        Compiled when first needed and kept until the content is changed
+        or replaced. Both acl:default and the older acl:defaultForNew are
+        taken to indicate inheritance.
+
+        At the same time an index of authorizations by mode and then by
+        agent, agent class, or for any agent group, is built for permits().
+        """
+        if (self._compiled is None or self._compiled_content is not self.content):
+            g = self.content
+
+            def values(authz, *predicates):
+                return frozenset(str(o) for p in predicates for o in g.objects(authz, p))
+            auths = []
+            index = {}
+            for authz in self.authorizations:
+                auth = Authorization(
+                    agents=values(authz, ACL.agent),
+                    agent_classes=values(authz, ACL.agentClass),
+                    agent_groups=values(authz, ACL.agentGroup),
+                    modes=values(authz, ACL.mode),
+                    access_to=values(authz, ACL.accessTo),
+                    default=values(authz, ACL.default, ACL.defaultForNew))
+                auths.append(auth)
+                for mode in auth.modes:
+                    by_mode = index.setdefault(mode, {'agent': {}, 'agentClass': {}, 'agentGroup': []})
+                    for agent in auth.agents:
+                        by_mode['agent'].setdefault(agent, []).append(auth)
+                    for agent_class in auth.agent_classes:
+                        by_mode['agentClass'].setdefault(agent_class, []).append(auth)
+                    if (len(auth.agent_groups) > 0):
+                        by_mode['agentGroup'].append(auth)
+            self._compiled = tuple(auths)
+            self._compiled_content = g
+            self._index = index
+            self._permits = {}
+        return self._compiled
+
+    def permits(self, agent, mode, uri, inherited=False, in_group=None):
+        """True if this ACL grants agent access in mode to uri.
+
+        agent is the WebID (or username) of the user, None if not
+        authenticated. mode is an access mode URI string. If inherited is
+        True then this ACL is being applied to uri by inheritance and only
+        authorizations with acl:default are used, otherwise only those
+        with acl:accessTo uri.
+
+        Decisions based on agents and agent classes are cached until the
+        content changes. Agent groups are checked, only if access is not
+        otherwise granted, with in_group(group, agent) which should return
+        True if agent is a member of group.
+        """
+        self.compiled  # compile and index if necessary
+        key = (agent, mode, uri, inherited)
+        decision = self._permits.get(key)
+        if (decision is None):
+            if (len(self._permits) >= self.max_decisions):
+                self._permits = {}
+            decision = False
+            for by_mode in self._indexed(mode):
+                candidates = list(by_mode['agent'].get(agent, []))
+                candidates += by_mode['agentClass'].get(str(FOAF.Agent), [])
+                if (agent is not None):
+                    candidates += by_mode['agentClass'].get(str(ACL.AuthenticatedAgent), [])
+                if (any(self._applies(auth, uri, inherited) for auth in candidates)):
+                    decision = True
+                    break
+            self._permits[key] = decision
+        if (decision or in_group is None or agent is None):
+            return decision
+        for by_mode in self._indexed(mode):
+            for auth in by_mode['agentGroup']:
+                if (self._applies(auth, uri, inherited) and
+                        any(in_group(group, agent) for group in auth.agent_groups)):
+                    return True
+        return False
+
+    def _indexed(self, mode):
+        """List of index entries for modes that grant mode."""
+        return [self._index[m] for m in GRANTING_MODES.get(mode, (mode,)) if m in self._index]
+
+    @staticmethod
+    def _applies(auth, uri, inherited):
+        """True if Authorization auth applies to uri, directly or by inheritance."""
+        if (inherited):
+            return len(auth.default) > 0
+        return uri in auth.access_to
+
     @property
     def authorizations(self):
         """Iterator over authorizations in this ACL."""
@@ -63,8 +177,8 @@ class ACLR(LDPRS):
         ACL is found. This ACL is then checked for authorizations
         to inherit, as indicated by the ACL.default predicate.
         """
-        for authz in self.authorizations:
-            for s, p, o in self.content.triples((authz, ACL.default, None)):
+        for auth in self.compiled:
+            if (len(auth.default) > 0):
                 return(True)
         return(False)
 
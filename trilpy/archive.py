@@ -0,0 +1,463 @@
+"""Bulk export and import of resources as an archive.
+
+An archive is either a tar file (optionally compressed) or a directory
+containing:
+
+  manifest.jsonl     - one record per resource, as the resource records of
+                       PersistentStore but without content, in any order
+  rdf.nq             - content of all RDF sources as N-Quads, the graph
+                       name being the resource URI, with the triples of
+                       each graph together
+  binaries/<sha256>  - content of each binary, named by the SHA-256 hex
+                       digest given as blob in the manifest records
+
+The manifest and RDF may instead be split into parts manifest/*.jsonl
+and rdf/*.nq, as written by ArchiveWriter.
+
+Only class and uri are required in manifest records, other attributes
+take the same defaults as for resources created over HTTP. An LDPNR
+without a describedby link is given a new description, as on POST.
+
+On import the RDF is split into chunks at graph boundaries that are
+parsed in parallel by worker processes. Binaries are copied into the
+blob store (or memory) as they are read, checking their digests. The
+resulting resources are then added to the store in one batch with
+Store.add_batch().
+
+Export reads the store through a StoreView so that the archive is a
+consistent snapshot even though the store may change while it is
+written. N-Quads requires absolute URIs so relative URIs in content,
+as used for ACL authorizations, are resolved against the resource URI.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import json
+import os
+import os.path
+import posixpath
+import re
+import tarfile
+import time
+from urllib.parse import urljoin
+import zlib
+from base64 import b64decode
+from rdflib import URIRef
+from rdflib.plugins.parsers.nquads import NQuadsParser
+from rdflib.plugins.parsers.ntriples import ParseError
+
+from .digest import MultiDigest
+from .ldpc import LDPC, UnsupportedContainerType
+from .ldpnr import LDPNR
+from .ldprs import LDPRS
+from .namespace import LDP
+from .ntriples import nq_line
+from .persistent_store import RESOURCE_CLASSES, LDPR_ATTRIBUTES, resource_from_record
+from .store_view import StoreView
+from .upload import SpooledUpload
+
+MANIFEST_NAME = 'manifest.jsonl'
+MANIFEST_DIR = 'manifest'
+RDF_NAME = 'rdf.nq'
+RDF_DIR = 'rdf'
+BINARIES_DIR = 'binaries'
+
+# Attributes read from manifest records, with defaults for those
+# that may be omitted
+MANIFEST_DEFAULTS = dict([(attr, None) for attr in LDPR_ATTRIBUTES] + [
+    ('container_type', str(LDP.BasicContainer)),
+    ('members', []),
+    ('membership_predicate', str(LDP.member)),
+    ('content_type', 'application/octet-stream'),
+    ('digests', {}),
+    ('acl_for', None)])
+MANIFEST_OPTIONAL = ('memento_datetime', 'membership_constant', 'inserted_content_rel')
+
+_blob_key_regex = re.compile(r'[0-9a-f]{64}$')
+
+
+class ArchiveError(Exception):
+    """Archive is malformed or inconsistent."""
+
+    pass
+
+
+def nquads_chunks(fh, chunk_size=4 * 1024 * 1024):
+    """Iterator over chunks of N-Quads bytes read from fh.
+
+    Each chunk is just over chunk_size bytes, being extended to the end
+    of the current graph so that the triples of a graph (and so any
+    blank nodes they share) are parsed together.
+    """
+    lines = []
+    size = 0
+    for line in fh:
+        if (size >= chunk_size and _graph_label(line) != _graph_label(lines[-1])):
+            yield b''.join(lines)
+            lines = []
+            size = 0
+        lines.append(line)
+        size += len(line)
+    if (len(lines) > 0):
+        yield b''.join(lines)
+
+
+def _graph_label(line):
+    """Graph label of N-Quads line, the last term, compared as bytes."""
+    return line.rstrip().rsplit(b'<', 1)[-1]
+
+
+class _Triples(list):
+    """List of triples that may be added to like a Graph."""
+
+    add = list.append
+
+
+class _GraphsSink(object):
+    """Sink for NQuadsParser collecting triples in lists by graph URI.
+
+    Much cheaper than adding them to the store of a ConjunctiveGraph only
+    to take them out again.
+    """
+
+    identifier = None  # context of triples without a graph name
+
+    def __init__(self):
+        """Initialize with no graphs."""
+        self.graphs = {}
+
+    def get_context(self, identifier):
+        """List to add triples in graph identifier to."""
+        if (not isinstance(identifier, URIRef)):
+            raise ArchiveError("N-Quads triple not in a named graph")
+        return self.graphs.setdefault(str(identifier), _Triples())
+
+
+def parse_nquads(data):
+    """Dict of graph URI -> list of triples parsed from N-Quads bytes data.
+
+    Run in worker processes so everything returned must be picklable.
+    Uses the line parsing of rdflib's NQuadsParser, driven as by its
+    parse() but with a sink that simply collects the triples.
+    """
+    parser = NQuadsParser()
+    parser.sink = _GraphsSink()
+    parser.file = io.StringIO(data.decode('utf-8'))
+    parser.buffer = ''
+    while True:
+        parser.line = line = parser.readline()
+        if (parser.line is None):
+            break
+        try:
+            parser.parseline()
+        except ParseError as e:
+            raise ArchiveError("Bad N-Quads line %r: %s" % (line, str(e)))
+    return parser.sink.graphs
+
+
+def parse_nquads_parallel(chunks, executor=None, max_pending=2):
+    """Iterator over parse_nquads() results for each of chunks.
+
+    Chunks are parsed in executor, a pool of worker processes, if
+    given. At most max_pending chunks are read ahead so memory use is
+    bounded.
+    """
+    if (executor is None):
+        for chunk in chunks:
+            yield parse_nquads(chunk)
+        return
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(parse_nquads, chunk))
+        if (len(pending) >= max_pending):
+            yield pending.popleft().result()
+    while (len(pending) > 0):
+        yield pending.popleft().result()
+
+
+def _is_part(name, single_name, parts_dir, extension):
+    """True if archive member name is single_name or a part in parts_dir."""
+    return (name == single_name or
+            (posixpath.dirname(name) == parts_dir and name.endswith(extension)))
+
+
+def archive_members(path):
+    """Iterator over (name, file object) for the files in archive at path.
+
+    path may be a tar file or a directory. Names are relative to the top
+    of the archive. Each file object may only be read until the next is
+    returned.
+    """
+    if (os.path.isdir(path)):
+        names = [name for name in (MANIFEST_NAME, RDF_NAME)
+                 if os.path.exists(os.path.join(path, name))]
+        for dirname in (MANIFEST_DIR, RDF_DIR, BINARIES_DIR):
+            if (os.path.isdir(os.path.join(path, dirname))):
+                names.extend(posixpath.join(dirname, name)
+                             for name in sorted(os.listdir(os.path.join(path, dirname))))
+        for name in names:
+            with open(os.path.join(path, name), 'rb') as fh:
+                yield (name, fh)
+        return
+    try:
+        with tarfile.open(path, 'r:*') as tar:
+            for member in tar:
+                if (member.isfile()):
+                    yield (posixpath.normpath(member.name), tar.extractfile(member))
+    except tarfile.TarError as e:
+        raise ArchiveError("Bad tar file: %s" % (str(e)))
+
+
+def read_binary(fh, key, blob_store=None):
+    """Read binary with SHA-256 hex digest key from fh.
+
+    If blob_store is given then the binary is spooled into it (unless it
+    is already there) and (None, digests) is returned, else (content,
+    digests). digests has base64 encoded md5 and sha-256 digests, or is
+    empty if the blob was already stored and so not read.
+    """
+    if (blob_store is not None):
+        if (key in blob_store):
+            return (None, {})
+        upload = SpooledUpload(blob_store.tmp_dir, ['md5', 'sha-256'])
+        for chunk in iter(lambda: fh.read(blob_store.read_chunk_size), b''):
+            upload.write(chunk)
+        upload.close()
+        if (b64decode(upload.digests['sha-256']).hex() != key):
+            upload.discard()
+            raise ArchiveError("Binary %s does not match its digest" % (key))
+        blob_store.add_file(upload.path, key)
+        return (None, upload.digests)
+    content = fh.read()
+    digest = MultiDigest(['md5', 'sha-256'])
+    digest.update(content)
+    if (b64decode(digest.digests['sha-256']).hex() != key):
+        raise ArchiveError("Binary %s does not match its digest" % (key))
+    return (content, digest.digests)
+
+
+def manifest_resource(record):
+    """New resource without content from manifest record."""
+    if (record.get('class') not in RESOURCE_CLASSES or record.get('uri') is None):
+        raise ArchiveError("Manifest record without valid class and uri: %s" % (json.dumps(record)))
+    full = {'class': record['class'], 'triples': []}
+    for (attr, default) in MANIFEST_DEFAULTS.items():
+        full[attr] = record.get(attr, default)
+    for attr in MANIFEST_OPTIONAL:
+        if (attr in record):
+            full[attr] = record[attr]
+    try:
+        return resource_from_record(full)
+    except (ValueError, TypeError, UnsupportedContainerType) as e:
+        raise ArchiveError("Bad manifest record for %s: %s" % (record['uri'], str(e)))
+
+
+def read_archive(path, blob_store=None, workers=None):
+    """List of resources read from the archive at path.
+
+    Does not modify any store so may be run in another thread. Binaries
+    are added to blob_store, if given, but without references until the
+    resources are added to the store. workers is the number of worker
+    processes used to parse RDF, None for one per CPU.
+    """
+    if (workers is None):
+        workers = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    records = None
+    graphs = {}
+    binaries = {}  # key -> (content or None, digests)
+    try:
+        for (name, fh) in archive_members(path):
+            if (_is_part(name, MANIFEST_NAME, MANIFEST_DIR, '.jsonl')):
+                if (records is None):
+                    records = []
+                try:
+                    records.extend(json.loads(line) for line in fh if line.strip())
+                except ValueError as e:
+                    raise ArchiveError("Bad manifest: %s" % (str(e)))
+            elif (_is_part(name, RDF_NAME, RDF_DIR, '.nq')):
+                for chunk_graphs in parse_nquads_parallel(nquads_chunks(fh), executor, 2 * workers):
+                    for (uri, triples) in chunk_graphs.items():
+                        graphs.setdefault(uri, []).extend(triples)
+            elif (posixpath.dirname(name) == BINARIES_DIR):
+                key = posixpath.basename(name)
+                if (not _blob_key_regex.match(key)):
+                    raise ArchiveError("Bad binary name %s" % (name))
+                binaries[key] = read_binary(fh, key, blob_store)
+    finally:
+        if (executor is not None):
+            executor.shutdown()
+    if (records is None):
+        raise ArchiveError("No %s in archive" % (MANIFEST_NAME))
+    resources = []
+    descriptions = []
+    for record in records:
+        resource = manifest_resource(record)
+        if (isinstance(resource, LDPRS)):
+            resource.content.addN((s, p, o, resource.content) for (s, p, o) in graphs.pop(resource.uri, ()))
+            if (isinstance(resource, LDPC)):
+                resource.extract_containment_triples()
+        elif (isinstance(resource, LDPNR)):
+            key = record.get('blob')
+            if (key is None):
+                resource.content = b''
+            elif (key in binaries):
+                (content, digests) = binaries[key]
+                if (blob_store is None):
+                    resource.content = content
+                    resource.digests = dict(record.get('digests') or {})
+                else:
+                    resource.blob = key
+                resource.digests.update(digests)
+            elif (blob_store is not None and _blob_key_regex.match(key) and key in blob_store):
+                resource.blob = key
+            else:
+                raise ArchiveError("Missing binary %s for %s" % (key, resource.uri))
+            if (resource.describedby is None):
+                descriptions.append(LDPRS(describes=resource.uri))
+        resources.append(resource)
+    if (len(graphs) > 0):
+        raise ArchiveError("RDF for resource not in manifest: %s" % (sorted(graphs)[0]))
+    return resources + descriptions
+
+
+class ArchiveWriter(object):
+    """Writer of an archive as a gzip compressed tar stream.
+
+    Entries from a StoreView are added one at a time and each add()
+    returns an iterator over the compressed bytes to write. Manifest
+    records and RDF are collected into parts of about part_size bytes
+    and binaries are copied in chunks of read_chunk_size, so memory use
+    does not depend on the size of the store. Each binary is written
+    once however many resources use it.
+    """
+
+    part_size = 16 * 1024 * 1024
+    read_chunk_size = 1024 * 1024
+
+    def __init__(self, compress=True):
+        """Initialize writer, gzip compressed unless compress is False."""
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self.mtime = int(time.time())
+        self.num_resources = 0
+        self._offset = 0  # uncompressed bytes written
+        self._manifest = []
+        self._rdf = []
+        self._size = 0
+        self._parts = 0
+        self._keys = set()
+
+    def _output(self, data):
+        """Data compressed for output, may be empty."""
+        self._offset += len(data)
+        return data if self.compressor is None else self.compressor.compress(data)
+
+    def _member(self, name, size, chunks):
+        """Iterator over output for tar member name of size bytes from chunks."""
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mode = 0o644
+        info.mtime = self.mtime
+        yield self._output(info.tobuf(tarfile.GNU_FORMAT))
+        written = 0
+        for chunk in chunks:
+            written += len(chunk)
+            yield self._output(chunk)
+        if (written != size):
+            raise ArchiveError("Size of %s changed while writing" % (name))
+        if (size % tarfile.BLOCKSIZE):
+            yield self._output(tarfile.NUL * (tarfile.BLOCKSIZE - size % tarfile.BLOCKSIZE))
+
+    def _flush(self):
+        """Iterator over output for current manifest and RDF parts."""
+        if (len(self._manifest) == 0):
+            return
+        for (name, lines) in (('%s/%06d.jsonl' % (MANIFEST_DIR, self._parts), self._manifest),
+                              ('%s/%06d.nq' % (RDF_DIR, self._parts), self._rdf)):
+            data = b''.join(lines)
+            yield from self._member(name, len(data), [data])
+        self._manifest = []
+        self._rdf = []
+        self._size = 0
+        self._parts += 1
+
+    def add(self, entry):
+        """Add ExportEntry entry, returning iterator over output.
+
+        Everything taken from entry and any resource it depends on is
+        copied before returning so that the store may change while the
+        output is written. A binary file is opened, and a temporary one
+        removed, for the same reason.
+        """
+        record = dict(entry.record)
+        uri = record['uri']
+        if (entry.triples is not None):
+            rdf = ''.join(nq_line([urljoin(uri, t) if isinstance(t, URIRef) and ':' not in t else t
+                                   for t in triple], uri)
+                          for triple in entry.triples).encode('utf-8')
+        else:
+            rdf = b''
+        binary = entry.binary
+        if (isinstance(binary, str)):
+            binary = open(binary, 'rb')
+            if (entry.temporary):
+                os.unlink(entry.binary)
+        self.num_resources += 1
+        return self._add(record, rdf, binary)
+
+    def _add(self, record, rdf, binary):
+        """Iterator over output for resource record, its RDF and binary."""
+        if (isinstance(binary, bytes)):
+            if (record.get('blob') is None):
+                record['blob'] = hashlib.sha256(binary).hexdigest()
+            if (record['blob'] not in self._keys):
+                self._keys.add(record['blob'])
+                yield from self._member(posixpath.join(BINARIES_DIR, record['blob']),
+                                        len(binary), [binary])
+        elif (binary is not None):
+            with binary:
+                if (record.get('blob') is None):
+                    digest = hashlib.sha256()
+                    for chunk in iter(lambda: binary.read(self.read_chunk_size), b''):
+                        digest.update(chunk)
+                    record['blob'] = digest.hexdigest()
+                if (record['blob'] not in self._keys):
+                    self._keys.add(record['blob'])
+                    binary.seek(0)
+                    yield from self._member(posixpath.join(BINARIES_DIR, record['blob']),
+                                            os.fstat(binary.fileno()).st_size,
+                                            iter(lambda: binary.read(self.read_chunk_size), b''))
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        self._manifest.append(line)
+        self._rdf.append(rdf)
+        self._size += len(line) + len(rdf)
+        if (self._size >= self.part_size):
+            yield from self._flush()
+
+    def close(self):
+        """Iterator over the remaining output to end the archive."""
+        yield from self._flush()
+        end = tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+        end += tarfile.NUL * (-(self._offset + len(end)) % tarfile.RECORDSIZE)
+        yield self._output(end)
+        if (self.compressor is not None):
+            yield self.compressor.flush()
+
+
+def write_archive(store, fh, compress=True):
+    """Write archive of all resources in store to file handle fh.
+
+    Returns the number of resources written.
+    """
+    view = StoreView(store)
+    writer = ArchiveWriter(compress)
+    try:
+        for entry in view.entries():
+            for chunk in writer.add(entry):
+                fh.write(chunk)
+        for chunk in writer.close():
+            fh.write(chunk)
+    finally:
+        view.close()
+    return writer.num_resources
@@ -0,0 +1,97 @@
+"""Content-addressed store for binary content.
+
+Binary content of LDPNRs is stored in files named by the SHA-256 digest
+of the content so that identical content (for example, mementos of an
+unchanged binary or duplicate derivatives) is held only once on disk.
+The store keeps a reference count for each blob and removes the file
+when the last reference goes.
+"""
+import hashlib
+import logging
+import os
+import os.path
+import shutil
+import tempfile
+
+
+class BlobStore(object):
+    """Reference counted content-addressed blob store in blob_dir."""
+
+    read_chunk_size = 1024 * 1024
+
+    def __init__(self, blob_dir):
+        """Initialize blob store in blob_dir, created if necessary.
+
+        Reference counts are not persisted, they are rebuilt as resources
+        using blobs are added to the Store.
+        """
+        self.blob_dir = blob_dir
+        self.tmp_dir = os.path.join(blob_dir, 'tmp')
+        if (not os.path.isdir(self.tmp_dir)):
+            os.makedirs(self.tmp_dir)
+        self.refcounts = {}
+        self.remove_unused = True  # False to keep blobs with no references
+
+    def path(self, key):
+        """Path of file for blob with SHA-256 hex digest key."""
+        return os.path.join(self.blob_dir, key[0:2], key[2:4], key)
+
+    def add_file(self, path, sha256=None):
+        """Add content of file at path to the store and return key.
+
+        The file is moved into the store, or simply removed if a blob with
+        the same content already exists. If the SHA-256 hex digest of the
+        content is already known it may be given as sha256, else it will
+        be calculated. The reference count is not changed, see incref().
+        """
+        if (sha256 is None):
+            sha256 = self.sha256_file(path)
+        dest = self.path(sha256)
+        if (os.path.exists(dest)):
+            os.unlink(path)
+        else:
+            dest_dir = os.path.dirname(dest)
+            if (not os.path.isdir(dest_dir)):
+                os.makedirs(dest_dir)
+            shutil.move(path, dest)
+        return sha256
+
+    def add_bytes(self, content):
+        """Add bytes content to the store and return key."""
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(content)
+        return self.add_file(path, hashlib.sha256(content).hexdigest())
+
+    def incref(self, key):
+        """Increment reference count for blob key."""
+        self.refcounts[key] = self.refcounts.get(key, 0) + 1
+
+    def decref(self, key):
+        """Decrement reference count for blob key, remove blob if no longer used.
+
+        The blob is not removed if remove_unused is False.
+        """
+        n = self.refcounts.get(key, 0) - 1
+        if (n > 0):
+            self.refcounts[key] = n
+            return
+        self.refcounts.pop(key, None)
+        if (not self.remove_unused):
+            return
+        try:
+            os.unlink(self.path(key))
+        except OSError as e:
+            logging.warning("Failed to remove blob %s: %s" % (key, str(e)))
+
+    def __contains__(self, key):
+        """True if there is a blob for key."""
+        return os.path.exists(self.path(key))
+
+    def sha256_file(self, path):
+        """SHA-256 hex digest of file at path, read in chunks."""
+        h = hashlib.sha256()
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(self.read_chunk_size), b''):
+                h.update(chunk)
+        return h.hexdigest()
@@ -0,0 +1,84 @@
+"""Cache of serialized resource representations.
+
+Most requests are reads of unchanged resources so we keep an LRU cache
+of serialized bodies. Entries are keyed on resource URI, ETag, media type
+and omits, and the Store invalidates all entries for a URI whenever that
+resource (or its containment) changes. That may happen in another
+thread (see Store.delete_subtree()) so the cache has its own lock.
+"""
+from collections import OrderedDict
+import threading
+
+
+class RepresentationCache(object):
+    """LRU cache of serialized representations with a limit on total size."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """Initialize empty cache holding at most max_bytes of representations."""
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> representation, oldest first
+        self._keys_by_uri = {}  # uri -> set of keys
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(uri, etag, content_type, omits):
+        """Cache key for representation of uri with given etag, content_type and omits."""
+        return (uri, etag, content_type, frozenset(omits))
+
+    def get(self, key):
+        """Representation for key, or None if not cached."""
+        with self._lock:
+            try:
+                representation = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return representation
+
+    def put(self, key, representation):
+        """Add representation (bytes) for key, evicting least recently used entries as needed.
+
+        Representations larger than max_bytes are not cached.
+        """
+        n = len(representation)
+        if (n > self.max_bytes):
+            return
+        with self._lock:
+            self._discard(key)
+            while (self.size + n > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+            self._entries[key] = representation
+            self._keys_by_uri.setdefault(key[0], set()).add(key)
+            self.size += n
+
+    def invalidate(self, uri):
+        """Remove all cached representations of uri."""
+        with self._lock:
+            for key in list(self._keys_by_uri.get(uri, ())):
+                self._discard(key)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_uri.clear()
+            self.size = 0
+
+    def _discard(self, key):
+        """Remove entry for key if present, with lock held."""
+        representation = self._entries.pop(key, None)
+        if (representation is not None):
+            self.size -= len(representation)
+            keys = self._keys_by_uri[key[0]]
+            keys.discard(key)
+            if (len(keys) == 0):
+                del self._keys_by_uri[key[0]]
+
+    def __len__(self):
+        """Number of cached representations."""
+        return len(self._entries)
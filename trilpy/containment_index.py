@@ -0,0 +1,238 @@
+"""Ordered, compact index of the URIs contained in or members of an LDPC.
+
+Containers may have very many children, almost all with URIs that are
+the container URI plus a path segment. The index keeps just those
+suffixes, and anything else as full URIs, in sorted lists split into
+chunks so that insertion and deletion stay cheap however large the
+index grows. Iteration is in URI order, which gives the stable order
+used for paging.
+"""
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableSet
+from heapq import merge
+from itertools import islice
+
+
+class SortedStrings(object):
+    """Sorted list of unique strings stored as a list of chunks.
+
+    Each chunk is a sorted list of at most 2 * chunk_size strings and
+    _maxes holds the last string of each chunk, so locating a string is
+    a binary search over _maxes and then within one chunk. Insertion
+    and deletion shift at most one chunk.
+    """
+
+    chunk_size = 1000
+
+    def __init__(self):
+        """Initialize empty list."""
+        self._chunks = []
+        self._maxes = []
+        self._len = 0
+
+    def __len__(self):
+        """Number of strings."""
+        return self._len
+
+    def _locate(self, value):
+        """Index of the chunk that would hold value."""
+        n = bisect_left(self._maxes, value)
+        return n if n < len(self._maxes) else len(self._maxes) - 1
+
+    def __contains__(self, value):
+        """True if value is in the list."""
+        if self._len == 0:
+            return False
+        chunk = self._chunks[self._locate(value)]
+        n = bisect_left(chunk, value)
+        return n < len(chunk) and chunk[n] == value
+
+    def add(self, value):
+        """Add value, no change if already present."""
+        if self._len == 0:
+            self._chunks.append([value])
+            self._maxes.append(value)
+            self._len = 1
+            return
+        c = self._locate(value)
+        chunk = self._chunks[c]
+        n = bisect_left(chunk, value)
+        if n < len(chunk) and chunk[n] == value:
+            return
+        chunk.insert(n, value)
+        self._maxes[c] = chunk[-1]
+        self._len += 1
+        if len(chunk) > 2 * self.chunk_size:
+            self._chunks[c:c + 1] = [chunk[:self.chunk_size], chunk[self.chunk_size:]]
+            self._maxes[c:c + 1] = [chunk[self.chunk_size - 1], chunk[-1]]
+
+    def discard(self, value):
+        """Remove value if present, return True if it was removed."""
+        if self._len == 0:
+            return False
+        c = self._locate(value)
+        chunk = self._chunks[c]
+        n = bisect_left(chunk, value)
+        if n == len(chunk) or chunk[n] != value:
+            return False
+        del chunk[n]
+        self._len -= 1
+        if len(chunk) == 0:
+            del self._chunks[c]
+            del self._maxes[c]
+        else:
+            self._maxes[c] = chunk[-1]
+        return True
+
+    def __iter__(self):
+        """Iterator over strings in order."""
+        for chunk in self._chunks:
+            yield from chunk
+
+    def iter_after(self, value=None):
+        """Iterator in order over strings greater than value, all if value is None."""
+        if value is None:
+            yield from self
+            return
+        c = bisect_right(self._maxes, value)
+        if c == len(self._chunks):
+            return
+        chunk = self._chunks[c]
+        yield from islice(chunk, bisect_right(chunk, value), None)
+        for chunk in self._chunks[c + 1:]:
+            yield from chunk
+
+    def iter_before(self, value=None):
+        """Iterator in reverse order over strings less than value, all if value is None."""
+        c = len(self._chunks) if value is None else bisect_left(self._maxes, value)
+        if c < len(self._chunks):
+            chunk = self._chunks[c]
+            yield from reversed(chunk[:bisect_left(chunk, value)])
+        for chunk in reversed(self._chunks[:c]):
+            yield from reversed(chunk)
+
+
+class ContainmentIndex(MutableSet):
+    """Set of URIs with ordered iteration and paging.
+
+    The prefix is taken from the first URI added, up to and including
+    its last /, and all URIs with that prefix are stored as suffixes.
+    Others, for example members of a DirectContainer elsewhere, are
+    stored in full. Behaves as a set of URI strings otherwise.
+    """
+
+    def __init__(self, uris=()):
+        """Initialize index, optionally with an iterable of URIs."""
+        self.prefix = None
+        self._suffixes = SortedStrings()
+        self._others = SortedStrings()
+        for uri in uris:
+            self.add(uri)
+
+    def __len__(self):
+        """Number of URIs."""
+        return len(self._suffixes) + len(self._others)
+
+    def __contains__(self, uri):
+        """True if uri is in the index."""
+        if self.prefix is not None and uri.startswith(self.prefix):
+            return uri[len(self.prefix):] in self._suffixes
+        return uri in self._others
+
+    def __iter__(self):
+        """Iterator over URIs in order."""
+        return self.iter_after()
+
+    def __repr__(self):
+        """Representation listing URIs."""
+        return 'ContainmentIndex(%r)' % (list(self))
+
+    def add(self, uri):
+        """Add uri."""
+        if self.prefix is None:
+            self.prefix = uri[:uri.rfind('/') + 1]
+        if uri.startswith(self.prefix):
+            self._suffixes.add(uri[len(self.prefix):])
+        else:
+            self._others.add(uri)
+
+    def discard(self, uri):
+        """Remove uri if present."""
+        if self.prefix is not None and uri.startswith(self.prefix):
+            self._suffixes.discard(uri[len(self.prefix):])
+        else:
+            self._others.discard(uri)
+
+    def _suffix_bound(self, uri):
+        """Bound on suffixes equivalent to bound uri on full URIs.
+
+        Returns (suffix, None) where suffix is the bound to use, or
+        (None, cmp) if uri is below all (cmp < 0) or above all (cmp > 0)
+        URIs with prefix.
+        """
+        if uri.startswith(self.prefix):
+            return (uri[len(self.prefix):], None)
+        return (None, -1 if uri < self.prefix else 1)
+
+    def iter_after(self, uri=None):
+        """Iterator in order over URIs greater than uri, all if uri is None."""
+        if self.prefix is None:
+            return iter(())
+        prefix = self.prefix
+        suffixes = ()
+        (bound, cmp) = (None, -1) if uri is None else self._suffix_bound(uri)
+        if cmp is None:
+            suffixes = self._suffixes.iter_after(bound)
+        elif cmp < 0:
+            suffixes = self._suffixes.iter_after()
+        if len(self._others) == 0:
+            return (prefix + s for s in suffixes)
+        return merge((prefix + s for s in suffixes),
+                     self._others.iter_after(uri))
+
+    def iter_before(self, uri=None):
+        """Iterator in reverse order over URIs less than uri, all if uri is None."""
+        if self.prefix is None:
+            return iter(())
+        prefix = self.prefix
+        suffixes = ()
+        (bound, cmp) = (None, 1) if uri is None else self._suffix_bound(uri)
+        if cmp is None:
+            suffixes = self._suffixes.iter_before(bound)
+        elif cmp > 0:
+            suffixes = self._suffixes.iter_before()
+        if len(self._others) == 0:
+            return (prefix + s for s in suffixes)
+        return merge((prefix + s for s in suffixes),
+                     self._others.iter_before(uri), reverse=True)
+
+    def page(self, page_size, after=None, before=None):
+        """Page of at most page_size URIs, see LDPC.page().
+
+        Returns (uris, has_prev, has_next).
+        """
+        if before is not None and after is None:
+            entries = list(islice(self.iter_before(before), page_size + 1))
+            has_prev = len(entries) > page_size
+            uris = list(reversed(entries[:page_size]))
+            if len(uris) > 0:
+                has_next = self._any_after(uris[-1])
+            else:
+                has_next = before in self or self._any_after(before)
+            return (uris, has_prev, has_next)
+        entries = list(islice(self.iter_after(after), page_size + 1))
+        has_next = len(entries) > page_size
+        uris = entries[:page_size]
+        if len(uris) > 0:
+            has_prev = self._any_before(uris[0])
+        else:
+            has_prev = after is not None and (after in self or self._any_before(after))
+        return (uris, has_prev, has_next)
+
+    def _any_after(self, uri):
+        """True if there are URIs greater than uri."""
+        return next(self.iter_after(uri), None) is not None
+
+    def _any_before(self, uri):
+        """True if there are URIs less than uri."""
+        return next(self.iter_before(uri), None) is not None
@@ -0,0 +1,112 @@
+"""Index of the Mementos in a TimeMap (LDPCv) ordered by Memento-Datetime.
+
+TimeGate negotiation needs the Memento closest to a requested datetime,
+which is a binary search over the sorted datetimes. The application/link-format
+line for each Memento is kept alongside so that the TimeMap need not be
+regenerated in full when Mementos are added or removed.
+
+See <https://tools.ietf.org/html/rfc7089>.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from negotiator2.memento import links_line, memento_datetime_string
+
+
+def memento_now():
+    """Current time as a Memento-Datetime, a UTC datetime to the second."""
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+class DatetimeIndex(object):
+    """Memento URIs indexed by Memento-Datetime.
+
+    Entries are (datetime, uri) tuples sorted by datetime and then URI,
+    datetimes being timezone aware UTC datetime.datetime objects.
+    """
+
+    def __init__(self):
+        """Initialize empty index."""
+        self._datetimes = []  # sorted datetimes, parallel to _uris and _lines
+        self._uris = []
+        self._lines = []  # link-format line for each memento
+        self._by_uri = {}  # uri -> datetime
+        self._link_format = None  # cached join of _lines
+
+    def __len__(self):
+        """Number of mementos."""
+        return len(self._uris)
+
+    def __contains__(self, uri):
+        """True if memento uri is in the index."""
+        return uri in self._by_uri
+
+    def __iter__(self):
+        """Iterator over (datetime, uri) in datetime order."""
+        return zip(self._datetimes, self._uris)
+
+    def datetime(self, uri):
+        """Memento-Datetime of memento uri, KeyError if not in index."""
+        return self._by_uri[uri]
+
+    def _position(self, uri):
+        """Index of memento uri in the sorted lists."""
+        datetime = self._by_uri[uri]
+        n = bisect_left(self._datetimes, datetime)
+        while (self._uris[n] != uri):
+            n += 1
+        return n
+
+    def add(self, uri, datetime):
+        """Add or move memento uri to datetime."""
+        if (uri in self._by_uri):
+            if (self._by_uri[uri] == datetime):
+                return
+            self.discard(uri)
+        lo = bisect_left(self._datetimes, datetime)
+        hi = bisect_right(self._datetimes, datetime)
+        n = bisect_left(self._uris, uri, lo, hi)
+        self._datetimes.insert(n, datetime)
+        self._uris.insert(n, uri)
+        self._lines.insert(n, links_line(uri, ['memento'],
+                                         {'datetime': memento_datetime_string(datetime)}))
+        self._by_uri[uri] = datetime
+        self._link_format = None
+
+    def discard(self, uri):
+        """Remove memento uri if present."""
+        if (uri not in self._by_uri):
+            return
+        n = self._position(uri)
+        del self._datetimes[n]
+        del self._uris[n]
+        del self._lines[n]
+        del self._by_uri[uri]
+        self._link_format = None
+
+    def at(self, datetime):
+        """URI of memento for datetime, None if the index is empty.
+
+        This is the latest memento at or before datetime or, if datetime
+        is before all mementos, the first memento.
+        """
+        if (len(self._uris) == 0):
+            return None
+        n = bisect_right(self._datetimes, datetime)
+        return self._uris[n - 1 if n > 0 else 0]
+
+    @property
+    def first(self):
+        """(datetime, uri) of first memento, None if the index is empty."""
+        return (self._datetimes[0], self._uris[0]) if len(self._uris) > 0 else None
+
+    @property
+    def last(self):
+        """(datetime, uri) of last memento, None if the index is empty."""
+        return (self._datetimes[-1], self._uris[-1]) if len(self._uris) > 0 else None
+
+    @property
+    def link_format(self):
+        """The application/link-format lines for all mementos, in order."""
+        if (self._link_format is None):
+            self._link_format = ',\n'.join(self._lines)
+        return self._link_format
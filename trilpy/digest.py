@@ -5,6 +5,7 @@ https://www.iana.org/assignments/http-dig-alg/http-dig-alg.xhtml
 """
 from base64 import b64encode
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
 import re
 
@@ -95,9 +96,22 @@ class Digest(object):
         raise UnsupportedDigest("No supported digest type for q=%f (got %s)" % (highest_q, ','.join(digest_types)))
 
     def check(self, content):
-        """Check content against the stored digests, raise BadDigest if bad."""
+        """Check content against the stored digests, raise BadDigest if bad.
+
+        All digests are calculated in a single pass over content.
+        """
+        md = MultiDigest(self.digests.keys())
+        md.update(content)
+        self.check_values(md.digests)
+
+    def check_values(self, values):
+        """Check precomputed digest values against the stored digests, raise BadDigest if bad.
+
+        values is a dict of base64 encoded digest values keyed by digest type
+        and must include all types in self.digests.
+        """
         for (digest_type, digest) in self.digests.items():
-            cdigest = self._calculate_digest(digest_type, content)
+            cdigest = values[digest_type]
             if (cdigest != digest):
                 raise BadDigest("Digest type %s doesn't match: got %s, expected %s" % (digest_type, cdigest, digest))
 
@@ -107,8 +121,61 @@ class Digest(object):
 
     def _calculate_digest(self, digest_type, content):
         """Calculate digest string for given digest_type over byte content."""
-        try:
-            digest_func = self.supported_digests[digest_type]
-        except KeyError:
-            raise UnsupportedDigest("Unsupported digest type %s requested")
-        return(b64encode(digest_func(content).digest()).decode('utf-8'))
+        md = MultiDigest([digest_type])
+        md.update(content)
+        return(md.digests[digest_type])
+
+
+class MultiDigest(object):
+    """Calculate several digest types in a single pass over data.
+
+    Each chunk passed to update() is fed to the hash objects for all of
+    the requested digest types. hashlib releases the GIL while hashing
+    large buffers so, for chunks of at least threaded_min_size bytes and
+    more than one digest type, the hashes are updated in parallel using a
+    shared thread pool.
+    """
+
+    threaded_min_size = 1024 * 1024
+    max_workers = 4
+    read_chunk_size = 1024 * 1024
+    _executor = None  # shared ThreadPoolExecutor, created when first needed
+
+    def __init__(self, digest_types):
+        """Initialize with list of digest types (names in Digest.supported_digests)."""
+        self._hashes = OrderedDict()
+        for digest_type in digest_types:
+            try:
+                self._hashes[digest_type] = Digest.supported_digests[digest_type]()
+            except KeyError:
+                raise UnsupportedDigest("Unsupported digest type %s requested" % (digest_type))
+
+    @classmethod
+    def executor(cls):
+        """Shared thread pool used for hashing large chunks."""
+        if (MultiDigest._executor is None):
+            MultiDigest._executor = ThreadPoolExecutor(max_workers=cls.max_workers)
+        return MultiDigest._executor
+
+    def update(self, chunk):
+        """Update all digests with chunk of bytes."""
+        hashes = list(self._hashes.values())
+        if (len(hashes) > 1 and len(chunk) >= self.threaded_min_size):
+            # Views avoid copying the chunk for each hash
+            data = memoryview(chunk)
+            list(self.executor().map(lambda h: h.update(data), hashes))
+        else:
+            for h in hashes:
+                h.update(chunk)
+
+    def update_from_file(self, path):
+        """Update all digests with content of file at path, read in chunks."""
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(self.read_chunk_size), b''):
+                self.update(chunk)
+
+    @property
+    def digests(self):
+        """Dict of base64 encoded digest values keyed by digest type."""
+        return dict((digest_type, b64encode(h.digest()).decode('utf-8'))
+                    for digest_type, h in self._hashes.items())
@@ -1,6 +1,7 @@
 """An LDPC - LDP Container."""
 from rdflib import Graph, URIRef
 
+from .containment_index import ContainmentIndex
 from .ldprs import LDPRS, PatchIllegal
 from .namespace import LDP
 
@@ -34,9 +35,9 @@ class LDPC(LDPRS):
         if self.container_type not in (LDP.BasicContainer, LDP.DirectContainer, LDP.IndirectContainer):
             raise UnsupportedContainerType()
         super(LDPC, self).__init__(uri, **kwargs)
-        self.contains = set()
+        self.contains = ContainmentIndex()
         self.containment_predicate = LDP.contains
-        self.members = set()
+        self.members = ContainmentIndex()
         self.membership_predicate = LDP.member
         self._membership_constant = None
         self._inserted_content_rel = None
@@ -60,6 +61,7 @@ class LDPC(LDPRS):
         super(LDPC, self).parse(content, content_type=content_type, context=context)
         if self.container_type in (LDP.DirectContainer, LDP.IndirectContainer):
             self.extract_membership_config_triples()
+            self.changed()
 
     def _extract_property(self, predicate, remove=True):
         """Extract and return one property with the given predicate.
@@ -95,21 +97,22 @@ class LDPC(LDPRS):
             # ldp:insertedContentRelation
             self._inserted_content_rel = self._extract_property(LDP.insertedContentRelation)
 
-    def patch_result_prune_check(self, graph):
-        """Prune containment triples from result of PATCH graph and check for illegal modifications.
+    def patch_delta_prune_check(self, added, removed):
+        """Prune containment triples from triples added by PATCH and check for illegal modifications.
 
-        Check for attempt to modify containment triples. It is OK if the result of PATCH
-        doesn't include the containment triples because they will be preserved anyway.
-        However, it is illegal to add any new containment triples.
+        Check for attempt to modify containment triples. It is OK if the PATCH
+        adds containment triples that already exist because they are server
+        managed and will be preserved anyway. However, it is illegal to add
+        any new containment triples. Only the triples added need be checked,
+        not the whole result of the PATCH.
 
-        SIDE EFFECT - graph is modified to remove the containment triples
+        SIDE EFFECT - added is modified to remove the containment triples
         """
-        patch_ct = self.extract_containment_triples(graph, remove=True)
-        existing_ct = Graph()
-        for triple in self.containment_triples():
-            existing_ct.add(triple)
-        if (len(existing_ct + patch_ct) != len(existing_ct)):
-            raise PatchIllegal("Attempt to modify containment triples")
+        for triple in [t for t in added if t[1] == self.containment_predicate]:
+            (s, p, o) = triple
+            if (s != self.uriref or o not in self.contains):
+                raise PatchIllegal("Attempt to modify containment triples")
+            added.discard(triple)
 
     def extract_containment_triples(self, content=None, remove=True):
         """Extract graph of containment triples from content.
@@ -120,68 +123,114 @@ class LDPC(LDPRS):
         not want these duplicated in the content.
         """
         ctriples = Graph()
-        if content is None:
+        own_content = content is None
+        if own_content:
             content = self.content
         # FIXME - Should we test for s == self.uriref ? Or should any triple with
         # the containment_predicate be rejected? For now reject any as otherwise
         # we fail the FedoraAPITestSuite 3.7.1 test.
-        for (s, p, o) in content.triples((None, self.containment_predicate, None)):
+        for (s, p, o) in list(content.triples((None, self.containment_predicate, None))):
             ctriples.add((s, p, o))
             if remove:
                 content.remove((s, p, o))
+        if (own_content and remove and len(ctriples) > 0):
+            self.changed(removed=ctriples)
         return ctriples
 
-    def add_server_managed_triples(self, graph, omits):
-        """Add RDF triples from the server.
+    def iter_server_managed_triples(self, omits, page=None):
+        """Iterator over RDF triples from the server.
 
-        The includes the type triples of a generic LDPRS add_server_managed_triples
-        and also containement and membership triples.
+        The includes the type triples of a generic LDPRS and also
+        containement and membership triples.
+
+        If page is not None then it is the list of entries (see page())
+        for which to add containment or membership triples, instead of
+        all entries.
         """
-        self.add_type_triples(graph)
+        yield from self.type_triples()
         if self.container_type == LDP.BasicContainer:
             # For BasicContainers we have only ldp:contains triples
             if 'containment' not in omits:
-                self.add_containment_triples(graph)
+                yield from self.containment_triples(page)
         else:
             # Direct and Indirect containers have membership information and
             # we do not serialize the ldp:contains triples
             # FIXME - where in the specs does it say we don't serialize ldp:contains?
             if 'membership' not in omits:
-                self.add_membership_triples(graph)
-                graph.add((self.uriref,
-                           LDP.membershipResource,
-                           self.membership_constant))
-                graph.add((self.uriref,
-                           LDP.hasMemberRelation,
-                           self.membership_predicate))
-                graph.add((self.uriref,
-                           LDP.insertedContentRelation,
-                           self.inserted_content_rel))
-
-    def add_containment_triples(self, graph):
+                yield from self.membership_triples(page)
+                yield (self.uriref,
+                       LDP.membershipResource,
+                       self.membership_constant)
+                yield (self.uriref,
+                       LDP.hasMemberRelation,
+                       self.membership_predicate)
+                yield (self.uriref,
+                       LDP.insertedContentRelation,
+                       self.inserted_content_rel)
+
+    def add_containment_triples(self, graph, contained=None):
         """Add containment triples to graph."""
-        for triple in self.containment_triples():
+        for triple in self.containment_triples(contained):
             graph.add(triple)
 
-    def add_membership_triples(self, graph):
+    def add_membership_triples(self, graph, members=None):
         """Add member triples to graph."""
-        for triple in self.membership_triples():
+        for triple in self.membership_triples(members):
             graph.add(triple)
 
-    def containment_triples(self):
-        """Generator for containment triples (rdflib style tuples)."""
-        for contained in self.contains:
+    def containment_triples(self, contained=None):
+        """Generator for containment triples (rdflib style tuples).
+
+        Triples are for all contained resources unless a specific
+        list of contained URIs is given.
+        """
+        for uri in (self.contains if contained is None else contained):
             yield((self.uriref,
                    self.containment_predicate,
-                   URIRef(contained)))
+                   URIRef(uri)))
 
-    def membership_triples(self):
-        """Generator for membership triples (rdflib style tuples)."""
-        for member in self.members:
+    def membership_triples(self, members=None):
+        """Generator for membership triples (rdflib style tuples).
+
+        Triples are for all members unless a specific list of member
+        URIs is given.
+        """
+        for member in (self.members if members is None else members):
             yield((self.uriref,
                    self.membership_predicate,
                    URIRef(member)))
 
+    def paged_entries(self, omits=()):
+        """Set of URIs that are split over pages with given omits, else None.
+
+        This is the set of contained resources for a BasicContainer,
+        otherwise the set of members. None if that section is omitted
+        from the representation.
+        """
+        if self.container_type == LDP.BasicContainer:
+            return None if 'containment' in omits else self.contains
+        return None if 'membership' in omits else self.members
+
+    def page(self, page_size, omits=(), after=None, before=None):
+        """One page of at most page_size entries from paged_entries(omits).
+
+        Implements the ordering for LDP Paging
+        <https://www.w3.org/TR/ldp-paging/>. Entries are sorted by URI
+        and a page is identified by the entry it follows (after) or the
+        entry it precedes (before), the first page if neither is given.
+        Identifying pages by position in the sort order rather than by
+        offset means that pages stay stable while entries are added or
+        removed elsewhere in the container.
+
+        Returns (entries, has_prev, has_next) where entries is the list
+        of URIs on this page and has_prev and has_next indicate whether
+        there are entries before or after this page.
+        """
+        entries = self.paged_entries(omits)
+        if entries is None:
+            return ([], False, False)
+        return entries.page(page_size, after, before)
+
     @property
     def rdf_types(self):
         """List of RDF types for this container."""
@@ -192,7 +241,7 @@ class LDPC(LDPRS):
         self.contains.add(uri)
 
     def del_contained(self, uri):
-        """Delete uri as contained resource."""
+        """Delete uri as contained resource, KeyError if not contained."""
         self.contains.remove(uri)
 
     def add_member(self, uri):
@@ -200,5 +249,5 @@ class LDPC(LDPRS):
         self.members.add(uri)
 
     def del_member(self, uri):
-        """Delete uri as member resource."""
+        """Delete uri as member resource, KeyError if not a member."""
         self.members.remove(uri)
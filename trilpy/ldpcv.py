@@ -1,7 +1,9 @@
 """An LDPCv - LDP Version Container."""
 from rdflib import URIRef
-from negotiator2 import TimeMap
+from negotiator2 import TimeMap, BadTimeMap
+from negotiator2.memento import links_line, memento_datetime_string
 
+from .datetime_index import DatetimeIndex
 from .ldpc import LDPC
 from .namespace import LDP
 
@@ -17,6 +19,7 @@ class LDPCv(LDPC):
         """Initialize LDPCv as subclass of LDPC."""
         super(LDPCv, self).__init__(uri, **kwargs)
         self.original = original
+        self.datetime_index = DatetimeIndex()
         self.type_label = 'LDPCv'
 
     @property
@@ -24,22 +27,55 @@ class LDPCv(LDPC):
         """True, this object is an LDPCv."""
         return True
 
+    def add_memento(self, uri, datetime):
+        """Record contained memento uri as having Memento-Datetime datetime."""
+        self.datetime_index.add(uri, datetime)
+
+    def del_contained(self, uri):
+        """Delete uri as contained resource and memento, KeyError if not contained."""
+        super(LDPCv, self).del_contained(uri)
+        self.datetime_index.discard(uri)
+
+    def memento_at(self, datetime):
+        """URI of memento for TimeGate request for datetime, None if no mementos.
+
+        Uses the latest memento at or before datetime, else the first.
+        """
+        return self.datetime_index.at(datetime)
+
     @property
     def timemap_object(self):
         """TimeMap object for this LDPCv."""
         tm = TimeMap(original=self.original, timegate=self.original, timemap=self.uri)
-        for contained in self.contains:
-            datetime = 'Tue, 20 Jun 9999 10:11:12 GMT'  # FIXME - need datetime for Mementos
-            tm.add_memento(contained, datetime)
+        for (datetime, contained) in self.datetime_index:
+            tm.mementos[datetime] = contained
         return tm
 
-    def serialize(self, content_type='text/turtle', omits=None, extra=None):
+    def serialize_link_format(self):
+        """TimeMap in application/link-format.
+
+        Same form as timemap_object.serialize_link_format() but uses the
+        memento lines cached in datetime_index, and all mementos are
+        included even if some share a datetime.
+        """
+        if (self.original is None):
+            raise BadTimeMap('TimeMap MUST list the URI-R of the Original Resource')
+        lines = [links_line(self.original, ['original', 'timegate'])]
+        extra = None
+        if (len(self.datetime_index) > 0):
+            lines.append(self.datetime_index.link_format)
+            extra = {'from': memento_datetime_string(self.datetime_index.first[0]),
+                     'until': memento_datetime_string(self.datetime_index.last[0])}
+        lines.append(links_line(self.uri, ['self'], extra))
+        return ',\n'.join(lines)
+
+    def serialize(self, content_type='text/turtle', omits=None, extra=None, page=None):
         """Serialize this resource in given format.
 
         Adds understanding of content_type 'application/link-format'
         else passes superclass method.
         """
         if (content_type == 'application/link-format'):
-            return self.timemap_object.serialize_link_format()
+            return self.serialize_link_format()
         else:
-            return super(LDPCv, self).serialize(content_type, omits, extra)
+            return super(LDPCv, self).serialize(content_type, omits, extra, page)
@@ -1,4 +1,8 @@
 """An LDPNR - LDP Non-RDF Source."""
+from base64 import b64decode
+import os.path
+
+from .digest import MultiDigest
 from .ldpr import LDPR
 from .namespace import LDP
 
@@ -10,18 +14,102 @@ class LDPNR(LDPR):
     these can be binary or text documents that do not have useful
     RDF representations.
 
+    Content may either be held in memory as bytes or, for large
+    objects, in a file at content_path in which case it is read only
+    when needed. If the store has a BlobStore then content is moved
+    there and blob is set to the key of the blob, which may be shared
+    with other LDPNRs with the same content.
+
+    Digests of the content are cached in digests, keyed by digest type,
+    so that Want-Digest requests need not read the content again. Values
+    may be supplied when the content is ingested (see SpooledUpload) and
+    are discarded whenever the content is replaced.
+
     See <https://www.w3.org/TR/ldp/#ldpnr>.
     """
 
     type_label = 'LDPNR'
+    read_chunk_size = 1024 * 1024
 
-    def __init__(self, uri=None, content=None, content_type=None, describedby=None):
+    def __init__(self, uri=None, content=None, content_type=None, describedby=None,
+                 content_path=None):
         """Initialize LDPNR."""
         super(LDPNR, self).__init__(uri)
         self.content = content
+        self.content_path = content_path
         self.content_type = content_type
         self.describedby = describedby
 
+    @property
+    def content(self):
+        """Content bytes, read from content_path if held in a file."""
+        if (self._content is None and self.content_path is not None):
+            with open(self.content_path, 'rb') as fh:
+                return fh.read()
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self.content_path = None
+        self.blob = None
+        self._etag = None
+        self.digests = {}
+
+    def set_blob(self, key, path):
+        """Set content to be that in blob key with file at path."""
+        self._content = None
+        self.content_path = path
+        self.blob = key
+
+    @property
+    def content_length(self):
+        """Length of content in bytes."""
+        if (self._content is None and self.content_path is not None):
+            return os.path.getsize(self.content_path)
+        return len(self._content or b'')
+
+    def replace_content(self, resource):
+        """Replace content and content type with those of LDPNR resource."""
+        self.changing()
+        self.content = resource._content
+        self.content_path = resource.content_path
+        self.blob = resource.blob
+        self.content_type = resource.content_type
+        self.digests = dict(resource.digests)
+
+    def content_digest(self, digest_type):
+        """Base64 encoded digest of type digest_type over content.
+
+        Calculated only if not already in digests, see content_digests().
+        """
+        return self.content_digests([digest_type])[digest_type]
+
+    def content_digests(self, digest_types):
+        """Dict of base64 encoded digests of content for each of digest_types.
+
+        Any not already in digests are calculated together in a single
+        pass over the content. Content held in a file is read in chunks
+        rather than loaded into memory. Each digest type must be in
+        Digest.supported_digests.
+        """
+        missing = [t for t in digest_types if t not in self.digests]
+        if (len(missing) > 0):
+            md = MultiDigest(missing)
+            if (self._content is None and self.content_path is not None):
+                md.read_chunk_size = self.read_chunk_size
+                md.update_from_file(self.content_path)
+            else:
+                md.update(self._content or b'')
+            self.digests.update(md.digests)
+        return dict((t, self.digests[t]) for t in digest_types)
+
+    def _compute_etag(self):
+        """Compute ETag value from MD5 digest of content."""
+        if (self._content is None and self.content_path is not None):
+            return '"' + b64decode(self.content_digest('md5')).hex() + '"'
+        return super(LDPNR, self)._compute_etag()
+
     @property
     def rdf_types(self):
         """List of RDF types for this resource."""
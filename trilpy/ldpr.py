@@ -18,19 +18,23 @@ class LDPR(object):
 
         content is expected to be in bytes not unicode
         """
+        # Store holding this resource, set by Store.add() and Store.update()
+        self.store = None
+        # Cache values
+        self._etag = None
         # LDP properties
         self.uri = uri
         self.content = content
         self.contained_in = None
         self.member_of = None
-        self.acl = acl
+        self._acl = acl
         self.describes = None
         self.describedby = None
         # Fedora versioned resource properties
         self.timemap = None
         self.original = None
-        # Cache values
-        self._etag = None
+        # Memento-Datetime of an LDPRm, UTC datetime.datetime
+        self.memento_datetime = None
 
     @property
     def is_ldprv(self):
@@ -70,6 +74,29 @@ class LDPR(object):
         """List of RDF type URIs for this LDP Resource."""
         return([str(x) for x in self.rdf_types])
 
+    @property
+    def acl(self):
+        """URI of the individual ACL for this resource, None if there is none."""
+        return self._acl
+
+    @acl.setter
+    def acl(self, acl):
+        """Set ACL URI, notifying any store because access may have changed."""
+        if (acl != self._acl):
+            self.changing()
+            self._acl = acl
+            self.changed()
+
+    @property
+    def content(self):
+        """Content of this resource, cached values are cleared when it is replaced."""
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self._etag = None
+
     @property
     def etag(self):
         """ETag value, lazily computed."""
@@ -77,6 +104,31 @@ class LDPR(object):
             self._etag = self._compute_etag()
         return(self._etag)
 
+    def replace_content(self, resource):
+        """Replace content of this resource with that of resource."""
+        self.changing()
+        self.content = resource.content
+
+    def changing(self):
+        """Record that this resource is about to be changed in place.
+
+        If this resource is held in a store then tells the store so
+        that any StoreView can keep the current state.
+        """
+        if (self.store is not None):
+            self.store.preserve(self)
+
+    def changed(self, added=None, removed=None):
+        """Record that the content of this resource has changed.
+
+        Clears cached values and, if this resource is held in a store,
+        tells the store so that it can update any indexes. Any added
+        and removed triples, see LDPRS.changed(), are passed on too.
+        """
+        self._etag = None
+        if (self.store is not None):
+            self.store.changed(self, added, removed)
+
     def _compute_etag(self):
         """Compute ETag value."""
         return('"' + hashlib.md5(self.content).hexdigest() + '"')
@@ -10,6 +10,8 @@ import re
 
 from .ldpr import LDPR
 from .namespace import LDP
+from .ntriples import nt_chunks
+from .overlay_graph import OverlayStore
 
 
 class PatchFailed(Exception):
@@ -33,7 +35,9 @@ class LDPRS(LDPR):
     includes routines for parsing and output. The class properties
     expose types that can be handled:
 
-    rdf_types - Media types for RDF supported (content type)
+    rdf_media_types - Media types for RDF supported (content type)
+
+    streamable_media_types - Media types supported by serialize_chunks()
 
     rdf_patch_types - Media types for HTTP PATCH method
     """
@@ -42,11 +46,14 @@ class LDPRS(LDPR):
 
     media_to_rdflib_type = OrderedDict([
         ('text/turtle', 'turtle'),   # default - must be first
-        ('application/ld+json', 'json-ld')
+        ('application/ld+json', 'json-ld'),
+        ('application/n-triples', 'nt')
     ])
 
     rdf_media_types = list(media_to_rdflib_type.keys())
 
+    streamable_media_types = ['text/turtle', 'application/n-triples']
+
     rdf_patch_types = ['application/sparql-update']
 
     def __init__(self, uri=None, content=None, describes=None, **kwargs):
@@ -58,6 +65,7 @@ class LDPRS(LDPR):
         If this LDPRS describes and LDPNR then the URI of the LDPNR
         SHOULD be specified in the `describes` parameter.
         """
+        self._graph_hash = None
         super(LDPRS, self).__init__(uri, **kwargs)
         self.content = Graph() if (content is None) else content
         self.describes = describes
@@ -66,6 +74,43 @@ class LDPRS(LDPR):
         """Number of content triples."""
         return len(self.content)
 
+    @property
+    def content(self):
+        """RDF content of this resource as an rdflib.Graph.
+
+        Content of a memento added with Store.add_memento() is None
+        here and is materialized from the store's mementos instead.
+        """
+        if (self._content is None and self.store is not None):
+            return self.store.mementos.graph(self.uri)
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self._etag = None
+        self._graph_hash = None
+
+    def changed(self, added=None, removed=None):
+        """Record that the content of this resource has changed.
+
+        If the change is known to be exactly the triples in added and
+        removed (each an iterable of triples actually added to or removed
+        from content) then the graph hash is updated incrementally, else
+        it is cleared and will be recomputed when next needed.
+        """
+        if (self._graph_hash is not None and
+                (added is not None or removed is not None)):
+            h = self._graph_hash
+            for triple in (added or ()):
+                h += self._triple_hash(triple)
+            for triple in (removed or ()):
+                h -= self._triple_hash(triple)
+            self._graph_hash = h % self.graph_hash_modulus
+        else:
+            self._graph_hash = None
+        super(LDPRS, self).changed(added, removed)
+
     @property
     def uriref(self):
         """URIRef object for self.uri, safe if self.uri is None."""
@@ -82,9 +127,21 @@ class LDPRS(LDPR):
         if (context is not None and content_type == 'text/turtle'):
             base = (b'@base <%b> .\n' % (context.encode('utf-8')))
             content = base + content
-        self.content.parse(
-            format=self._media_to_rdflib_type(content_type),
-            data=content)
+        if (len(self.content) == 0):
+            self.content.parse(
+                format=self._media_to_rdflib_type(content_type),
+                data=content)
+            self.changed()
+        else:
+            # Parse separately so that the graph hash can be updated with
+            # just the new triples
+            g = Graph()
+            g.parse(format=self._media_to_rdflib_type(content_type),
+                    data=content)
+            added = [triple for triple in g if triple not in self.content]
+            for triple in added:
+                self.content.add(triple)
+            self.changed(added=added)
 
     def patch(self, patch, content_type):
         """Update this object with specifed patch that has given content_type.
@@ -98,25 +155,51 @@ class LDPRS(LDPR):
         Definition of 'application/sparql-update' at:
         https://www.w3.org/TR/sparql11-update/#mediaType
         """
+        (added, removed) = self.patch_delta(patch, content_type)
+        # success
+        self.apply_delta(added, removed)
+
+    def patch_delta(self, patch, content_type):
+        """Sets of triples (added, removed) by applying patch to this object's content.
+
+        Does not modify this object, see patch() for arguments and
+        exceptions raised. The patch is applied to a copy-on-write
+        overlay of the content (see OverlayStore) so the work done
+        depends on the size of the patch rather than of the content.
+        Separated from patch() so that the work of applying the patch
+        may be done away from where the result is stored.
+        """
         if (content_type != 'application/sparql-update'):
             raise PatchFailed("Unrecognized PATCH content type")
-        g = Graph() + self.content
+        overlay = OverlayStore(self.content)
         try:
-            g.update(patch)
+            overlay.graph().update(patch)
         except pyparsing.ParseException as e:
             raise PatchFailed("Failed to apply patch (bad patch data)")
         # check result and raise PatchIllegal if bad
-        self.patch_result_prune_check(g)
-        # success
-        self.content = g
+        self.patch_delta_prune_check(overlay.added, overlay.removed)
+        return (overlay.added, overlay.removed)
 
-    def patch_result_prune_check(self, g):
-        """Noop implementation of PATCH result pruning and check.
+    def patch_delta_prune_check(self, added, removed):
+        """Noop implementation of PATCH delta pruning and check.
 
         This method will be overriden in LDPC.
         """
         pass
 
+    def apply_delta(self, added, removed):
+        """Remove triples in removed from and add triples in added to content.
+
+        As from patch_delta(): triples in removed must be in the content
+        and those in added must not be.
+        """
+        self.changing()
+        for triple in removed:
+            self.content.remove(triple)
+        for triple in added:
+            self.content.add(triple)
+        self.changed(added=added, removed=removed)
+
     def get_container_type(self, context, default=None):
         """Find LDP container type from data supplied.
 
@@ -153,7 +236,7 @@ class LDPRS(LDPR):
             logging.debug("type: %s" % (str(o)))
         return types
 
-    def graph(self, omits, extra=None):
+    def graph(self, omits, extra=None, page=None):
         """RDF graph representation with given omits, extra.
 
         Adds in certain server managed triples required by LDP and/or Fedora.
@@ -164,6 +247,9 @@ class LDPRS(LDPR):
         The preferences don't make much sense for LDPRS as opposed to LDPC. There
         are no 'container' or 'membership' triples so 'minimal' in omits just turns
         off the whole server managed and content output.
+
+        If page is not None then it is passed on to add_server_managed_triples()
+        to select one page of a paged representation, see LDPC.page().
         """
         graph = Graph()
         graph.bind('ldp', LDP)
@@ -171,30 +257,70 @@ class LDPRS(LDPR):
             graph += self.content
         if extra is not None:
             graph += extra
-        self.add_server_managed_triples(graph, omits)
+        self.add_server_managed_triples(graph, omits, page)
         return graph
 
-    def serialize(self, content_type='text/turtle', omits=None, extra=None):
+    def serialize(self, content_type='text/turtle', omits=None, extra=None, page=None):
         """Serialize this resource in given format.
 
         Build graph and then serialize according to the requested content_type.
         """
         if omits is None:
             omits = set()
-        return self.graph(omits, extra).serialize(
+        return self.graph(omits, extra, page).serialize(
             format=self._media_to_rdflib_type(content_type),
             context="",
             indent=2).decode('utf-8')
 
-    def add_server_managed_triples(self, graph, omits):
-        """Add server managed RDF triples to graph."""
+    def serialize_chunks(self, content_type='text/turtle', omits=None, extra=None, page=None,
+                         chunk_size=64 * 1024):
+        """Iterator over bytes chunks of a streamed serialization of this resource.
+
+        Takes the same arguments as serialize() but writes N-Triples
+        (which is also Turtle) directly from the content, extra and
+        server managed triples without building a graph, so memory use
+        does not grow with the size of the representation. The content
+        must not be modified while the iterator is in use.
+        """
+        if content_type not in self.streamable_media_types:
+            raise Exception("Cannot stream RDF content type " + content_type)
+        if omits is None:
+            omits = set()
+        return nt_chunks(self.iter_triples(omits, extra, page), chunk_size)
+
+    def iter_triples(self, omits, extra=None, page=None):
+        """Iterator over triples of representation with given omits, extra, page.
+
+        The same triples as graph() but without removing duplicates.
+        """
         if 'minimal' not in omits:
-            self.add_type_triples(graph)
+            yield from self.content
+        if extra is not None:
+            yield from extra
+        yield from self.iter_server_managed_triples(omits, page)
+
+    def add_server_managed_triples(self, graph, omits, page=None):
+        """Add server managed RDF triples to graph.
+
+        Subclasses should override iter_server_managed_triples().
+        """
+        for triple in self.iter_server_managed_triples(omits, page):
+            graph.add(triple)
+
+    def iter_server_managed_triples(self, omits, page=None):
+        """Iterator over server managed RDF triples, page is ignored."""
+        if 'minimal' not in omits:
+            yield from self.type_triples()
 
     def add_type_triples(self, graph):
         """Add rdf:type triples to graph."""
+        for triple in self.type_triples():
+            graph.add(triple)
+
+    def type_triples(self):
+        """Generator for rdf:type triples (rdflib style tuples)."""
         for rdf_type in self.rdf_types:
-            graph.add((URIRef(self.uri), RDF.type, URIRef(rdf_type)))
+            yield (URIRef(self.uri), RDF.type, URIRef(rdf_type))
 
     def server_managed_triples(self):
         """Graph of RDF triples that would be added from the server."""
@@ -225,7 +351,7 @@ class LDPRS(LDPR):
     def _compute_etag(self):
         """Compute ETag value.
 
-        Make an ETag that is fixed for the graph. In order to use this tag for 
+        Make an ETag that is fixed for the graph. In order to use this tag for
         an If-Match pre-condition it must be a stong tag and thus suitable for
         the stong comparison per https://tools.ietf.org/html/rfc7232#section-2.3.2.
 
@@ -234,22 +360,38 @@ class LDPRS(LDPR):
         use with the If-Match header for PUT and PATCH we need "strong" only is the sense
         that the internal state of the resource is identical
 
-        FIXME - Even at the level or RDF-match this implementation doesn't work properly
-        because unless bnodes are serialized with a consistent labeling then the hashing
-        over them won't be consistent. Having said that, the test below with a bnode seems
-        to give consistent results... so maybe the serialization is consistent if the graph
-        isn't changed (though perhaps reading the same graph's triples in a different order
-        would mess things up?)
-        """
-        lines = []
-        for (s, p, o) in self.content:
-            # Change any bnodes to a fixed sting. This is wrong
-            # because it means non-isomorphic graphs will end up
-            # with the same etag. However, in practice it is very
-            # likely that the ETag will change with changes in graph.
-            lines.append(("_:BNODE" if isinstance(s, BNode) else s.n3()) +
-                         ' ' + p.n3() + ' ' +
-                         ("_:BNODE" if isinstance(o, BNode) else o.n3()))
-        s = '\n'.join(sorted(lines))
-        h = hashlib.md5(s.encode('utf-8')).hexdigest()
-        return '"' + h + '"'
+        The tag is the graph_hash, an order-independent sum of per-triple hashes
+        that is updated incrementally as triples are added and removed.
+        """
+        return '"%032x"' % (self.graph_hash)
+
+    graph_hash_modulus = 2 ** 128
+
+    @property
+    def graph_hash(self):
+        """Order-independent hash of content, sum of the per-triple hashes.
+
+        Lazily computed over all content triples if not already known, and
+        then kept up-to-date by changed() when changes are known.
+        """
+        if (self._graph_hash is None):
+            h = 0
+            for triple in self.content:
+                h += self._triple_hash(triple)
+            self._graph_hash = h % self.graph_hash_modulus
+        return self._graph_hash
+
+    @staticmethod
+    def _triple_hash(triple):
+        """Integer MD5 hash of one triple.
+
+        FIXME - Any bnodes are changed to a fixed sting. This is wrong
+        because it means non-isomorphic graphs will end up with the same
+        hash. However, in practice it is very likely that the ETag will
+        change with changes in graph.
+        """
+        (s, p, o) = triple
+        line = (("_:BNODE" if isinstance(s, BNode) else s.n3()) +
+                ' ' + p.n3() + ' ' +
+                ("_:BNODE" if isinstance(o, BNode) else o.n3()))
+        return int.from_bytes(hashlib.md5(line.encode('utf-8')).digest(), 'big')
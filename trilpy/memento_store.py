@@ -0,0 +1,164 @@
+"""Delta-encoded store of RDF memento content.
+
+Versions of a resource usually differ by just a few triples, so rather
+than keeping a full copy of the graph for each memento we keep the set
+of triples added and removed relative to the previous memento in the
+same TimeMap (LDPCv). Every checkpoint_interval versions the full set
+of triples is kept instead so that reconstructing a memento never needs
+more than that many deltas. Reconstructed graphs are kept in a small
+LRU cache because the same mementos tend to be requested repeatedly.
+"""
+from collections import namedtuple, OrderedDict
+from rdflib import Graph
+
+
+# Stored version of memento: the timemap it is in, the memento it is
+# a delta against (None for a checkpoint with all triples in added),
+# the number of deltas back to a checkpoint, and frozensets of triples
+# added and removed
+MementoDelta = namedtuple('MementoDelta', ['timemap', 'base', 'depth', 'added', 'removed'])
+
+
+class MementoStore(object):
+    """Content of RDF mementos stored as deltas, keyed by memento URI."""
+
+    checkpoint_interval = 20
+    cache_size = 32
+
+    def __init__(self):
+        """Initialize empty memento store."""
+        self._deltas = {}  # memento uri -> MementoDelta
+        self._chains = {}  # timemap uri -> list of memento uris, oldest first
+        self._cache = OrderedDict()  # memento uri -> Graph, least recently used first
+
+    def __len__(self):
+        """Number of mementos stored."""
+        return len(self._deltas)
+
+    def __contains__(self, uri):
+        """True if content of memento uri is stored."""
+        return uri in self._deltas
+
+    @property
+    def num_triples(self):
+        """Number of triples actually stored over all deltas."""
+        return sum(len(d.added) + len(d.removed) for d in self._deltas.values())
+
+    def add(self, timemap, uri, content):
+        """Add memento uri in timemap with content, an iterable of triples.
+
+        The new memento follows any others already in the timemap. The
+        triples are copied so later changes to content do not affect the
+        memento.
+        """
+        chain = self._chains.setdefault(timemap, [])
+        triples = frozenset(content)
+        base = chain[-1] if len(chain) > 0 else None
+        if (base is None or
+                self._deltas[base].depth + 1 >= self.checkpoint_interval):
+            delta = MementoDelta(timemap, None, 0, triples, frozenset())
+        else:
+            prev = self.triples(base)
+            delta = MementoDelta(timemap, base, self._deltas[base].depth + 1,
+                                 triples - prev, prev - triples)
+        self._deltas[uri] = delta
+        chain.append(uri)
+
+    def triples(self, uri):
+        """Frozenset of triples of memento uri, KeyError if not stored.
+
+        Applies deltas forward from the nearest cached version or
+        checkpoint.
+        """
+        path = []
+        base = uri
+        while (base is not None and base not in self._cache):
+            path.append(base)
+            base = self._deltas[base].base
+        triples = set() if base is None else set(self._cache[base])
+        for u in reversed(path):
+            delta = self._deltas[u]
+            triples -= delta.removed
+            triples |= delta.added
+        return frozenset(triples)
+
+    def graph(self, uri):
+        """Graph with content of memento uri, KeyError if not stored.
+
+        The graph is shared with other users of the same memento and
+        must not be modified.
+        """
+        graph = self._cache.get(uri)
+        if (graph is not None):
+            self._cache.move_to_end(uri)
+            return graph
+        graph = Graph()
+        for triple in self.triples(uri):
+            graph.add(triple)
+        self._cache[uri] = graph
+        while (len(self._cache) > self.cache_size):
+            self._cache.popitem(last=False)
+        return graph
+
+    def remove(self, uri):
+        """Remove memento uri, no-op if not stored.
+
+        The following memento, if a delta against this one, is
+        re-encoded as a delta against the memento before (or as a
+        checkpoint). This depends only on the stored state so
+        replaying a removal gives the same result.
+        """
+        delta = self._deltas.get(uri)
+        if (delta is None):
+            return
+        chain = self._chains[delta.timemap]
+        n = chain.index(uri)
+        if (n + 1 < len(chain) and self._deltas[chain[n + 1]].base == uri):
+            successor = chain[n + 1]
+            triples = self.triples(successor)
+            if (delta.base is None):
+                self._deltas[successor] = MementoDelta(delta.timemap, None, 0, triples, frozenset())
+            else:
+                prev = self.triples(delta.base)
+                self._deltas[successor] = MementoDelta(delta.timemap, delta.base, delta.depth,
+                                                       triples - prev, prev - triples)
+        del chain[n]
+        if (len(chain) == 0):
+            del self._chains[delta.timemap]
+        del self._deltas[uri]
+        self._cache.pop(uri, None)
+
+    def remove_timemap(self, timemap):
+        """Remove all mementos in timemap, no-op if there are none.
+
+        Cheaper than removing the mementos one by one because nothing
+        needs to be re-encoded.
+        """
+        for uri in self._chains.pop(timemap, ()):
+            del self._deltas[uri]
+            self._cache.pop(uri, None)
+
+    def copy(self):
+        """Copy for reading the content of the mementos as they are now.
+
+        Cheap because deltas are immutable and are replaced, never
+        modified, so only the dict of them is copied.
+        """
+        copy = MementoStore()
+        copy._deltas = dict(self._deltas)
+        return copy
+
+    def delta(self, uri):
+        """MementoDelta for memento uri as stored, KeyError if not stored."""
+        return self._deltas[uri]
+
+    def restore(self, uri, delta):
+        """Restore memento uri from its MementoDelta, as from delta().
+
+        A memento that is not already stored is added to the end of its
+        timemap, so mementos must be restored in order.
+        """
+        if (uri not in self._deltas):
+            self._chains.setdefault(delta.timemap, []).append(uri)
+        self._deltas[uri] = delta
+        self._cache.pop(uri, None)
@@ -4,6 +4,7 @@ from rdflib import Namespace
 
 LDP = Namespace('http://www.w3.org/ns/ldp#')
 ACL = Namespace('http://www.w3.org/ns/auth/acl#')
+VCARD = Namespace('http://www.w3.org/2006/vcard/ns#')
 EX = Namespace('http://example.org/')
 
 # class Graph(Graph_rdflib):
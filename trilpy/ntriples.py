@@ -0,0 +1,61 @@
+"""Streaming N-Triples output.
+
+N-Triples is a line based subset of Turtle, so the same output serves
+for both media types. Triples are written one per line as they are
+generated, without first collecting them in a Graph, and are grouped
+into chunks of roughly fixed size for writing to a response.
+
+See <https://www.w3.org/TR/n-triples/>.
+"""
+from rdflib import BNode, Literal
+
+
+_escapes = {ord('\\'): '\\\\', ord('"'): '\\"', ord('\n'): '\\n', ord('\r'): '\\r'}
+
+
+def nt_term(term):
+    """N-Triples string for an rdflib term."""
+    if isinstance(term, Literal):
+        s = '"' + str(term).translate(_escapes) + '"'
+        if term.language:
+            return s + '@' + term.language
+        if term.datatype:
+            return s + '^^<' + str(term.datatype) + '>'
+        return s
+    if isinstance(term, BNode):
+        return '_:' + str(term)
+    return '<' + str(term) + '>'
+
+
+def nt_line(triple):
+    """N-Triples line, with newline, for triple (s, p, o)."""
+    (s, p, o) = triple
+    return nt_term(s) + ' ' + nt_term(p) + ' ' + nt_term(o) + ' .\n'
+
+
+def nq_line(triple, graph):
+    """N-Quads line, with newline, for triple (s, p, o) in graph with URI graph."""
+    (s, p, o) = triple
+    return nt_term(s) + ' ' + nt_term(p) + ' ' + nt_term(o) + ' <' + graph + '> .\n'
+
+
+def nt_chunks(triples, chunk_size=64 * 1024):
+    """Iterator over UTF-8 bytes chunks of N-Triples for triples.
+
+    Each chunk is just over chunk_size bytes, except the last which
+    may be shorter. Nothing is yielded if there are no triples.
+    Duplicate triples are not removed, which does not change the
+    meaning of the output.
+    """
+    lines = []
+    size = 0
+    for triple in triples:
+        line = nt_line(triple).encode('utf-8')
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b''.join(lines)
+            lines = []
+            size = 0
+    if len(lines) > 0:
+        yield b''.join(lines)
@@ -0,0 +1,105 @@
+"""Copy-on-write overlay of an rdflib Graph.
+
+Applying a SPARQL Update to a copy of a resource's content costs time
+and memory proportional to the size of the resource even if the update
+touches one triple. Instead the update is applied to a Graph backed by
+an OverlayStore, which reads through to the unchanged base graph and
+records just the triples added and removed. The change can then be
+checked and committed (or discarded) using only those sets.
+"""
+from rdflib import Graph
+from rdflib.store import Store
+
+
+def _matches(pattern, triple):
+    """True if triple matches pattern (s, p, o) where None matches anything."""
+    for (p, t) in zip(pattern, triple):
+        if p is not None and p != t:
+            return False
+    return True
+
+
+class OverlayStore(Store):
+    """rdflib Store presenting base graph with recorded changes.
+
+    added holds triples added that are not in base, removed holds
+    triples of base that have been removed. The base graph is never
+    modified. Namespace bindings are read through to base as with
+    the copy made by Graph() + base.
+    """
+
+    def __init__(self, base):
+        """Initialize overlay of base, an rdflib Graph, with no changes."""
+        super(OverlayStore, self).__init__()
+        self.base = base
+        self.added = set()
+        self.removed = set()
+        self._namespaces = {}
+
+    def graph(self):
+        """New Graph using this overlay as its store."""
+        return Graph(store=self)
+
+    def add(self, triple, context, quoted=False):
+        """Add triple."""
+        if (triple in self.removed):
+            self.removed.discard(triple)
+        elif (triple not in self.base):
+            self.added.add(triple)
+
+    def addN(self, quads):
+        """Add triples from iterable of (s, p, o, context) quads."""
+        for (s, p, o, c) in quads:
+            self.add((s, p, o), c)
+
+    def remove(self, pattern, context=None):
+        """Remove all triples matching pattern."""
+        for (triple, contexts) in list(self.triples(pattern)):
+            if (triple in self.added):
+                self.added.discard(triple)
+            else:
+                self.removed.add(triple)
+
+    def triples(self, pattern, context=None):
+        """Iterator over (triple, contexts) for triples matching pattern."""
+        for triple in self.base.triples(pattern):
+            if (triple not in self.removed):
+                yield (triple, iter(()))
+        if (None in pattern):
+            added = [triple for triple in self.added if _matches(pattern, triple)]
+        else:
+            added = [pattern] if pattern in self.added else []
+        for triple in added:
+            yield (triple, iter(()))
+
+    def __len__(self, context=None):
+        """Number of triples."""
+        return len(self.base) - len(self.removed) + len(self.added)
+
+    def contexts(self, triple=None):
+        """No contexts, this store holds a single graph."""
+        return iter(())
+
+    def bind(self, prefix, namespace):
+        """Bind prefix to namespace in this overlay only."""
+        self._namespaces[prefix] = namespace
+
+    def namespace(self, prefix):
+        """Namespace for prefix, None if not bound."""
+        if (prefix in self._namespaces):
+            return self._namespaces[prefix]
+        return self.base.store.namespace(prefix)
+
+    def prefix(self, namespace):
+        """Prefix for namespace, None if not bound."""
+        for (prefix, ns) in self.namespaces():
+            if (ns == namespace):
+                return prefix
+        return None
+
+    def namespaces(self):
+        """Iterator over (prefix, namespace) bindings."""
+        for (prefix, ns) in self.base.store.namespaces():
+            if (prefix not in self._namespaces):
+                yield (prefix, ns)
+        yield from self._namespaces.items()
@@ -0,0 +1,605 @@
+"""Trilpy persistent store with write-ahead log and snapshots.
+
+The PersistentStore keeps the same in-memory dictionary-like model as
+Store but records every mutation in an append-only write-ahead log (WAL)
+in a store directory. Periodically the whole store is written out as a
+snapshot and the WAL is truncated, so that a restart loads the latest
+snapshot and replays only the tail of the log.
+
+Files in the store directory:
+
+  snapshot.jsonl - header line, including the encoded tombstones of
+                   deleted resources, then one resource record per line
+  wal.jsonl      - one operation per line, each with a sequence number
+
+Resource records are JSON objects, RDF content is held as a list of
+triples with each term in N3 form (which, unlike N-Triples, allows the
+relative URIs used for ACL authorizations).
+
+A store directory may be shared by several processes (for example the
+workers of a pre-forked server) if each opens it with shared=True.
+Every process keeps its own in-memory copy. Mutations are made holding
+an exclusive flock on the lock file, after first applying any new WAL
+entries written by other processes, and sync() brings a process up to
+date between requests. Applying those entries goes through the normal
+Store operations so any representation cache is invalidated too. The
+last write to a resource wins.
+
+  lock           - lock file used when shared
+"""
+
+from base64 import b64encode, b64decode
+from contextlib import contextmanager
+import fcntl
+from itertools import chain
+import json
+import logging
+import os
+import os.path
+from rdflib import URIRef
+from rdflib.util import from_n3
+from negotiator2 import memento_datetime_string, memento_parse_datetime
+
+from .acl import ACLR
+from .containment_index import ContainmentIndex
+from .ldpc import LDPC
+from .ldpcv import LDPCv
+from .ldpnr import LDPNR
+from .ldpr import LDPR
+from .ldprs import LDPRS
+from .memento_store import MementoStore, MementoDelta
+from .store import Store, ResourceConflict
+from .tombstones import Tombstones
+
+# Classes that may be stored, keyed by the name used in records
+RESOURCE_CLASSES = {
+    'LDPR': LDPR,
+    'LDPRS': LDPRS,
+    'LDPC': LDPC,
+    'LDPCv': LDPCv,
+    'LDPNR': LDPNR,
+    'ACLR': ACLR
+}
+
+# Simple attributes common to all LDPRs
+LDPR_ATTRIBUTES = ('uri', 'contained_in', 'member_of', 'acl',
+                   'describes', 'describedby', 'timemap', 'original')
+
+
+def resource_to_record(resource, content=True):
+    """Dict record describing resource that can be written as JSON.
+
+    Containment (LDPC.contains) is not included because it can be
+    rebuilt from the contained_in links of the contained resources.
+    If content is False then the RDF or binary content is not included
+    either.
+    """
+    record = {'class': type(resource).__name__}
+    if (record['class'] not in RESOURCE_CLASSES):
+        raise Exception("Cannot store resource of type %s" % (record['class']))
+    for attr in LDPR_ATTRIBUTES:
+        record[attr] = getattr(resource, attr)
+    if (resource.memento_datetime is not None):
+        record['memento_datetime'] = memento_datetime_string(resource.memento_datetime)
+    if (content):
+        if (isinstance(resource, LDPRS) and resource._content is None and
+                resource.store is not None and resource.uri in resource.store.mementos):
+            record['memento'] = memento_to_record(resource.store.mementos.delta(resource.uri))
+        elif (isinstance(resource, LDPRS)):
+            record['triples'] = [[s.n3(), p.n3(), o.n3()] for (s, p, o) in resource.content]
+        elif (isinstance(resource, LDPNR) and resource.blob is not None):
+            record['blob'] = resource.blob
+        elif (isinstance(resource, LDPNR) and resource.content_path is not None):
+            record['content_path'] = resource.content_path
+        elif (isinstance(resource.content, bytes)):
+            record['content_b64'] = b64encode(resource.content).decode('ascii')
+    if (isinstance(resource, LDPNR)):
+        record['content_type'] = resource.content_type
+        record['digests'] = resource.digests
+    if (isinstance(resource, LDPC)):
+        record['container_type'] = str(resource.container_type)
+        record['members'] = list(resource.members)
+        record['membership_predicate'] = str(resource.membership_predicate)
+        if (resource._membership_constant is not None):
+            record['membership_constant'] = str(resource._membership_constant)
+        if (resource._inserted_content_rel is not None):
+            record['inserted_content_rel'] = str(resource._inserted_content_rel)
+    if (isinstance(resource, ACLR)):
+        record['acl_for'] = resource._acl_for
+    return record
+
+
+def resource_from_record(record):
+    """New resource object built from dict record."""
+    cls = RESOURCE_CLASSES[record['class']]
+    if (issubclass(cls, LDPC)):
+        resource = cls(container_type=record['container_type'])
+        resource.members = ContainmentIndex(record['members'])
+        resource.membership_predicate = URIRef(record['membership_predicate'])
+        if ('membership_constant' in record):
+            resource._membership_constant = URIRef(record['membership_constant'])
+        if ('inserted_content_rel' in record):
+            resource._inserted_content_rel = URIRef(record['inserted_content_rel'])
+    elif (cls is ACLR):
+        resource = cls(acl_for=record['acl_for'])
+    else:
+        resource = cls()
+    for attr in LDPR_ATTRIBUTES:
+        setattr(resource, attr, record[attr])
+    if ('memento_datetime' in record):
+        resource.memento_datetime = memento_parse_datetime(record['memento_datetime'])
+    if ('memento' in record):
+        # Content is restored to the store's mementos separately
+        resource.content = None
+    elif (isinstance(resource, LDPRS)):
+        for (s, p, o) in record['triples']:
+            resource.content.add((from_n3(s), from_n3(p), from_n3(o)))
+    elif ('blob' in record):
+        resource.blob = record['blob']
+    elif ('content_path' in record):
+        resource.content_path = record['content_path']
+    elif ('content_b64' in record):
+        resource.content = b64decode(record['content_b64'])
+    if (isinstance(resource, LDPNR)):
+        resource.content_type = record['content_type']
+        resource.digests = dict(record.get('digests', {}))
+    return resource
+
+
+def triples_to_record(triples):
+    """List of triples, each a list of terms in N3 form, that can be written as JSON."""
+    return [[s.n3(), p.n3(), o.n3()] for (s, p, o) in triples]
+
+
+def triples_from_record(record):
+    """List of triples from record written by triples_to_record()."""
+    return [(from_n3(s), from_n3(p), from_n3(o)) for (s, p, o) in record]
+
+
+def memento_to_record(delta):
+    """Dict record describing MementoDelta that can be written as JSON."""
+    return {'timemap': delta.timemap, 'base': delta.base, 'depth': delta.depth,
+            'added': [[s.n3(), p.n3(), o.n3()] for (s, p, o) in delta.added],
+            'removed': [[s.n3(), p.n3(), o.n3()] for (s, p, o) in delta.removed]}
+
+
+def memento_from_record(record):
+    """MementoDelta built from dict record."""
+    return MementoDelta(record['timemap'], record['base'], record['depth'],
+                        frozenset((from_n3(s), from_n3(p), from_n3(o)) for (s, p, o) in record['added']),
+                        frozenset((from_n3(s), from_n3(p), from_n3(o)) for (s, p, o) in record['removed']))
+
+
+class PersistentStore(Store):
+    """Resource store persisted to disk with a write-ahead log.
+
+    Behaves exactly like Store but every add(), update(), delete() and
+    in-place change notified via changed() is appended to the WAL before
+    returning. After snapshot_interval operations a new snapshot is
+    written and the WAL is started afresh.
+    """
+
+    snapshot_name = 'snapshot.jsonl'
+    wal_name = 'wal.jsonl'
+    lock_name = 'lock'
+
+    def __init__(self, base_uri, store_dir, snapshot_interval=10000, fsync=False,
+                 blob_store=None, shared=False):
+        """Initialize store with base_uri, loading any existing data from store_dir.
+
+        If fsync is True then the WAL is fsync'd after every write, otherwise
+        writes are only flushed to the operating system.
+
+        LDPNRs with content in blob_store are recorded by blob key, the
+        blob reference counts are rebuilt on load.
+
+        If shared is True then store_dir may be used by other processes at
+        the same time, see sync(). A shared store must be opened separately
+        in each process, not inherited across a fork.
+        """
+        super(PersistentStore, self).__init__(base_uri, blob_store=blob_store)
+        self.store_dir = store_dir
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.shared = shared
+        self.seq = 0  # sequence number of last operation applied
+        self.snapshot_seq = 0  # sequence number covered by last snapshot
+        self._wal = None
+        self._wal_in = None  # handle on WAL used to read new entries when shared
+        self._lock_fh = None
+        self._lock_depth = 0
+        self._replaying = False
+        self._deleting = {}  # URIs in each subtree being deleted, see delete_subtree()
+        if (not os.path.isdir(store_dir)):
+            os.makedirs(store_dir)
+        if (shared):
+            self._lock_fh = open(os.path.join(store_dir, self.lock_name), 'a')
+        with self._exclusive():
+            self._wal = open(self.wal_path, 'a', encoding='utf-8')
+            self.load()
+
+    @property
+    def snapshot_path(self):
+        """Path of snapshot file."""
+        return os.path.join(self.store_dir, self.snapshot_name)
+
+    @property
+    def wal_path(self):
+        """Path of write-ahead log file."""
+        return os.path.join(self.store_dir, self.wal_name)
+
+    def add(self, resource, uri=None, context=None, slug=None):
+        """Add resource as Store.add() and log operation."""
+        with self._exclusive():
+            uri = super(PersistentStore, self).add(resource, uri, context, slug)
+            self._log({'op': 'add', 'uri': uri, 'context': context,
+                       'record': resource_to_record(resource)})
+        return uri
+
+    def new_uri(self, context=None, slug=None):
+        """New URI as Store.new_uri().
+
+        If the store is shared then the counter used to mint URIs is
+        logged so that other processes do not mint the same URI.
+        """
+        with self._exclusive():
+            uri = super(PersistentStore, self).new_uri(context, slug)
+            if (self.shared):
+                self._log({'op': 'next_id', 'next_id': self._next_id})
+        return uri
+
+    def add_new(self, resource, uri, context=None):
+        """Add resource as Store.add_new(), checking uri after catching up."""
+        with self._exclusive():
+            return super(PersistentStore, self).add_new(resource, uri, context)
+
+    def add_memento(self, resource, content, context, slug=None, datetime=None):
+        """Add memento as Store.add_memento(), logged as an add."""
+        with self._exclusive():
+            return super(PersistentStore, self).add_memento(resource, content, context, slug, datetime)
+
+    def add_batch(self, resources):
+        """Add resources as Store.add_batch() and write a snapshot.
+
+        Rather than logging each resource the batch is committed by
+        writing a new snapshot, which costs about the same as logging
+        them all and leaves nothing to replay on load.
+        """
+        with self._exclusive():
+            uris = super(PersistentStore, self).add_batch(resources)
+            self.seq += 1
+            self._snapshot()
+        return uris
+
+    def update(self, resource):
+        """Update resource as Store.update() and log operation."""
+        with self._exclusive():
+            super(PersistentStore, self).update(resource)
+            self._log({'op': 'update', 'uri': resource.uri,
+                       'record': resource_to_record(resource)})
+
+    def replace_content(self, uri, resource, etag=None):
+        """Replace content as Store.replace_content(), checking etag after catching up."""
+        with self._exclusive():
+            return super(PersistentStore, self).replace_content(uri, resource, etag)
+
+    def changed(self, resource, added=None, removed=None):
+        """Handle in-place change as Store.changed() and log operation.
+
+        If the change is known to be exactly the triples in added and
+        removed, as for a PATCH, then just those are logged as a delta,
+        otherwise the whole resource is logged as an update.
+
+        If the store is shared and another process has since replaced or
+        deleted the resource then the change cannot be kept and
+        ResourceConflict is raised, see apply_delta() for a change that
+        avoids this.
+        """
+        with self._exclusive():
+            if (self._resources.get(resource.uri) is resource):
+                super(PersistentStore, self).changed(resource, added, removed)
+                if (isinstance(resource, LDPRS) and (added is not None or removed is not None)):
+                    self._log({'op': 'delta', 'uri': resource.uri,
+                               'added': triples_to_record(added or ()),
+                               'removed': triples_to_record(removed or ())})
+                else:
+                    self._log({'op': 'update', 'uri': resource.uri,
+                               'record': resource_to_record(resource)})
+            elif (self.shared):
+                raise ResourceConflict("Resource %s was replaced or deleted by another process" %
+                                       (resource.uri))
+
+    def apply_delta(self, uri, added, removed, etag=None):
+        """Apply delta as Store.apply_delta(), checking etag after catching up.
+
+        If the store is shared then other processes may have changed the
+        resource since etag was read, the lock is held from checking
+        through to logging the change.
+        """
+        with self._exclusive():
+            return super(PersistentStore, self).apply_delta(uri, added, removed, etag)
+
+    def delete(self, uri):
+        """Delete resource as Store.delete() and log operation."""
+        with self._exclusive():
+            context = super(PersistentStore, self).delete(uri)
+            self._log({'op': 'delete', 'uri': uri})
+        return context
+
+    def delete_subtree(self, uri, progress=None):
+        """Delete subtree as Store.delete_subtree() and log as one operation.
+
+        The operation is logged first and the subtree is then removed a
+        batch at a time as for Store, so that other changes can be made
+        in between. Replay of the operation completes the delete after a
+        crash, and until the delete is finished any snapshot records the
+        whole subtree as deleted.
+        """
+        with self._exclusive():
+            if (uri not in self._resources):
+                return None
+            self._deleting[uri] = list(self.subtree(uri))
+            self._log({'op': 'delete_subtree', 'uri': uri})
+        try:
+            return super(PersistentStore, self).delete_subtree(uri, progress)
+        finally:
+            with self.lock:
+                del self._deleting[uri]
+
+    def sync(self):
+        """Apply any operations logged by other processes sharing the store.
+
+        Only a shared lock is taken, so that processes reading the store
+        can catch up at the same time.
+        """
+        if (self.shared):
+            with self._flock(fcntl.LOCK_SH):
+                pass
+
+    def _exclusive(self):
+        """Context in which this process has exclusive use of a shared store.
+
+        On first entry takes the lock and catches up with operations
+        logged by other processes. Re-entrant. Also holds the store's
+        thread lock throughout, so that an operation run in another
+        thread (see Store.delete_subtree()) is logged in the same order
+        as it is applied, but otherwise does nothing if the store is not
+        shared.
+        """
+        return self._flock(fcntl.LOCK_EX)
+
+    @contextmanager
+    def _flock(self, operation):
+        """Context holding flock operation on the lock file, see _exclusive().
+
+        A nested context keeps the lock taken on first entry, so an
+        exclusive lock must not be asked for inside a shared one.
+        """
+        with self.lock:
+            if (not self.shared):
+                yield
+                return
+            if (self._lock_depth == 0):
+                fcntl.flock(self._lock_fh, operation)
+            self._lock_depth += 1
+            try:
+                if (self._lock_depth == 1 and self._wal_in is not None):
+                    self._catch_up()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if (self._lock_depth == 0):
+                    fcntl.flock(self._lock_fh, fcntl.LOCK_UN)
+
+    def _log(self, op):
+        """Append operation op to the WAL, snapshot if interval reached."""
+        if (self._replaying):
+            return
+        self.seq += 1
+        op['seq'] = self.seq
+        self._wal.write(json.dumps(op) + '\n')
+        self._wal.flush()
+        if (self.fsync):
+            os.fsync(self._wal.fileno())
+        if (self._wal_in is not None):
+            # Skip over our own entry when catching up
+            self._wal_in.seek(0, os.SEEK_END)
+        if (self.snapshot_interval and
+                self.seq - self.snapshot_seq >= self.snapshot_interval):
+            self.snapshot()
+
+    def _apply(self, op):
+        """Apply operation op read from the WAL without logging it again."""
+        if ('record' in op and 'memento' in op['record']):
+            self.mementos.restore(op['uri'], memento_from_record(op['record']['memento']))
+        if (op['op'] == 'add'):
+            resource = resource_from_record(op['record'])
+            Store.add(self, resource, uri=op['uri'], context=op['context'])
+        elif (op['op'] == 'update'):
+            resource = resource_from_record(op['record'])
+            old_resource = self._resources.get(op['uri'])
+            if (isinstance(old_resource, LDPC) and isinstance(resource, LDPC)):
+                resource.contains = old_resource.contains
+            if (isinstance(old_resource, LDPCv) and isinstance(resource, LDPCv)):
+                resource.datetime_index = old_resource.datetime_index
+            Store.update(self, resource)
+        elif (op['op'] == 'delta'):
+            resource = self._resources[op['uri']]
+            removed = [t for t in triples_from_record(op['removed']) if t in resource.content]
+            added = [t for t in triples_from_record(op['added']) if t not in resource.content]
+            resource.apply_delta(added, removed)
+        elif (op['op'] == 'delete'):
+            Store.delete(self, op['uri'])
+        elif (op['op'] == 'delete_subtree'):
+            Store.delete_subtree(self, op['uri'])
+        elif (op['op'] == 'next_id'):
+            self._next_id = max(self._next_id, op['next_id'])
+        else:
+            raise Exception("Unknown WAL operation %s" % (op['op']))
+
+    def snapshot(self):
+        """Write snapshot of the whole store and start a new WAL.
+
+        The snapshot is written to a temporary file and then renamed into
+        place so that there is always a complete snapshot on disk. Any WAL
+        entries with sequence numbers covered by the snapshot are ignored
+        on load, so a crash before the WAL is replaced is harmless. The
+        new WAL is a new file so that other processes sharing the store
+        can tell that a snapshot has been taken.
+        """
+        with self._exclusive():
+            self._snapshot()
+
+    def _snapshot(self):
+        """Write snapshot, see snapshot()."""
+        tmp_path = self.snapshot_path + '.tmp'
+        deleting = set(chain.from_iterable(self._deleting.values()))
+        deleted = self.deleted
+        if (len(deleting) > 0):
+            # Subtree deletes in progress are recorded as done
+            deleted = Tombstones.from_record(deleted.to_record())
+            deleted.update(deleting)
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            header = {'base_uri': self.base_uri, 'seq': self.seq,
+                      'tombstones': deleted.to_record(), 'next_id': self._next_id}
+            fh.write(json.dumps(header) + '\n')
+            for uri, resource in self.items():
+                if (uri not in deleting):
+                    fh.write(json.dumps(resource_to_record(resource)) + '\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.snapshot_seq = self.seq
+        open(self.wal_path + '.tmp', 'w').close()
+        os.replace(self.wal_path + '.tmp', self.wal_path)
+        if (self._wal is not None):
+            self._wal.close()
+        self._wal = open(self.wal_path, 'a', encoding='utf-8')
+        if (self._wal_in is not None):
+            self._wal_in.close()
+            self._wal_in = open(self.wal_path, 'r', encoding='utf-8')
+        logging.info("Wrote snapshot of %d resources at seq %d" % (len(self), self.seq))
+
+    def load(self):
+        """Load latest snapshot and then replay the WAL tail."""
+        if (os.path.exists(self.snapshot_path)):
+            self._load_snapshot()
+        n = 0
+        if (os.path.exists(self.wal_path)):
+            fh = open(self.wal_path, 'r', encoding='utf-8')
+            n = self._replay(fh)
+            if (self.shared):
+                self._wal_in = fh
+            else:
+                fh.close()
+        logging.info("Loaded %d resources, replayed %d WAL operations" % (len(self), n))
+
+    def _replay(self, fh):
+        """Apply WAL entries read from fh after self.seq, return number applied.
+
+        Blobs are never removed while replaying, a blob that is unused at
+        some point in the log may be used again by a later entry.
+        """
+        n = 0
+        self._replaying = True
+        if (self.blob_store is not None):
+            self.blob_store.remove_unused = False
+        try:
+            for line in fh:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # Partial last line from interrupted write
+                    logging.warning("Ignoring bad WAL entry at seq %d" % (self.seq))
+                    break
+                if (op['seq'] <= self.seq):
+                    continue
+                self._apply(op)
+                self.seq = op['seq']
+                n += 1
+        finally:
+            self._replaying = False
+            if (self.blob_store is not None):
+                self.blob_store.remove_unused = True
+        return n
+
+    def _catch_up(self):
+        """Apply new entries logged by other processes, with lock held.
+
+        Reads the rest of the WAL we have open, then if another process
+        has since taken a snapshot reads the new WAL. If entries have
+        been missed because there was more than one intervening snapshot
+        then the store is reloaded.
+        """
+        self._replay(self._wal_in)
+        if (os.stat(self.wal_path).st_ino != os.fstat(self._wal_in.fileno()).st_ino):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as fh:
+                snapshot_seq = json.loads(fh.readline())['seq']
+            self._wal.close()
+            self._wal = open(self.wal_path, 'a', encoding='utf-8')
+            self._wal_in.close()
+            self._wal_in = None
+            if (snapshot_seq > self.seq):
+                self._reload()
+            else:
+                self.snapshot_seq = snapshot_seq
+                self._wal_in = open(self.wal_path, 'r', encoding='utf-8')
+                self._replay(self._wal_in)
+
+    def _reload(self):
+        """Discard in-memory state and load again from disk."""
+        logging.info("Reloading store from %s" % (self.store_dir))
+        self._resources = {}
+        self.deleted = Tombstones()
+        self._blobs = {}
+        self._references = {}
+        self._referenced_by = {}
+        self._acls = {}
+        self._inherited_acls = {}
+        self.mementos = MementoStore()
+        self._next_id = 1
+        if (self.blob_store is not None):
+            self.blob_store.refcounts = {}
+        if (self.representation_cache is not None):
+            self.representation_cache.clear()
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.load()
+
+    def _load_snapshot(self):
+        """Load snapshot file into the in-memory store."""
+        with open(self.snapshot_path, 'r', encoding='utf-8') as fh:
+            header = json.loads(fh.readline())
+            self.seq = header['seq']
+            self.snapshot_seq = self.seq
+            if ('tombstones' in header):
+                self.deleted = Tombstones.from_record(header['tombstones'])
+            else:
+                self.deleted = Tombstones(header['deleted'])
+            self._next_id = header.get('next_id', 1)
+            for line in fh:
+                record = json.loads(line)
+                if ('memento' in record):
+                    self.mementos.restore(record['uri'], memento_from_record(record['memento']))
+                resource = resource_from_record(record)
+                resource.store = self
+                self._resources[resource.uri] = resource
+        # Rebuild containment and indexes
+        for uri, resource in self.items():
+            if (resource.contained_in is not None):
+                container = self._resources.get(resource.contained_in)
+                if (isinstance(container, LDPC)):
+                    container.add_contained(uri)
+            self._index_references(resource)
+            self._index_blob(resource)
+            self._index_acl(resource)
+            self._index_memento(resource)
+
+    def close(self):
+        """Close the WAL and any lock file."""
+        for fh in (self._wal, self._wal_in, self._lock_fh):
+            if (fh is not None):
+                fh.close()
+        self._wal = None
+        self._wal_in = None
+        self._lock_fh = None
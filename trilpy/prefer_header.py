@@ -44,7 +44,8 @@ def find_return_representation(prefer_headers):
     Returns type ('omit' or 'include') and list of URIs, else
     (None, []).
     """
-    params = find_preference(prefer_headers, 'return=representation')
+    params = [p for p in find_preference(prefer_headers, 'return=representation')
+              if not p.startswith(_page_size_params)]
     if (len(params) > 1):
         raise Exception("Bad paramaters for return=representation preference")
     elif (len(params) == 0):
@@ -56,6 +57,26 @@ def find_return_representation(prefer_headers):
     return(ptype, uris)
 
 
+_page_size_params = ('max-triple-count=', 'max-kbyte-count=', 'max-member-count=')
+
+
+def find_max_member_count(prefer_headers):
+    """Look for max-member-count parameter of return=representation.
+
+    This is the LDP Paging client preference for page size, see
+    https://www.w3.org/TR/ldp-paging/#ldpp-client-paging-hints .
+    Returns the positive integer value, else None.
+    """
+    for param in find_preference(prefer_headers, 'return=representation'):
+        if (param.startswith('max-member-count=')):
+            try:
+                count = int(param.split('=', 1)[1].strip('"'))
+            except ValueError:
+                return None
+            return count if count > 0 else None
+    return None
+
+
 _uri_to_name_map = {
     'http://www.w3.org/ns/ldp#PreferContainment': 'containment',
     'http://www.w3.org/ns/ldp#PreferMembership': 'membership',
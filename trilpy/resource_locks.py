@@ -0,0 +1,62 @@
+"""Per-resource locks for coroutine request handlers.
+
+Handlers may wait on work run in an executor (parsing, serialization,
+patching) part way through a request. Holding the locks for the URIs
+a request reads or modifies across those waits keeps concurrent
+requests for the same resources from interleaving, while requests for
+other resources proceed.
+"""
+from contextlib import asynccontextmanager
+from tornado.locks import Lock
+
+
+class ResourceLocks(object):
+    """Table of locks keyed by resource URI.
+
+    Locks are created when first needed and dropped again when no
+    request holds or is waiting for them, so the table only has entries
+    for resources currently in use.
+    """
+
+    def __init__(self):
+        """Initialize empty lock table."""
+        self._locks = {}  # uri -> [Lock, number of holders and waiters]
+        self._held = set()  # uris with lock currently held
+
+    @asynccontextmanager
+    async def lock(self, uris):
+        """Async context manager holding locks for all of uris.
+
+        Locks are acquired in sorted order so that requests locking
+        overlapping sets of URIs cannot deadlock. None values in uris
+        are ignored.
+        """
+        uris = sorted(set(uri for uri in uris if uri is not None))
+        waited = []
+        held = set()
+        try:
+            for uri in uris:
+                entry = self._locks.setdefault(uri, [Lock(), 0])
+                entry[1] += 1
+                waited.append(uri)
+                await entry[0].acquire()
+                held.add(uri)
+                self._held.add(uri)
+            yield
+        finally:
+            for uri in reversed(waited):
+                entry = self._locks[uri]
+                if (uri in held):
+                    self._held.discard(uri)
+                    entry[0].release()
+                entry[1] -= 1
+                if (entry[1] == 0):
+                    del self._locks[uri]
+
+    def locked(self, uri):
+        """True if the lock for uri is held."""
+        return uri in self._held
+
+    def __len__(self):
+        """Number of URIs with locks held or waited on."""
+        return len(self._locks)
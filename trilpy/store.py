@@ -1,11 +1,21 @@
 """Trilpy store for resources."""
 
+from base64 import b64decode
+from contextlib import contextmanager
+from functools import wraps
 import logging
+import threading
 from urllib.parse import urljoin
 from rdflib import Graph, URIRef
 
+from .acl import ACLR
+from .datetime_index import memento_now
 from .ldpc import LDPC
+from .ldpnr import LDPNR
 from .ldprs import LDPRS
+from .memento_store import MementoStore
+from .namespace import ACL, VCARD
+from .tombstones import Tombstones
 
 
 class KeyDeleted(KeyError):
@@ -14,6 +24,21 @@ class KeyDeleted(KeyError):
     pass
 
 
+class ResourceConflict(Exception):
+    """Class indicating a change that conflicts with another change to a resource."""
+
+    pass
+
+
+def locked(method):
+    """Decorator for Store methods that run with the store's lock held."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class Store(object):
     """Resource store.
 
@@ -21,18 +46,53 @@ class Store(object):
     URIs as the keys. But also records deleted items (raising KeyDeleted
     instead of KeyError on attemt to access) and handles generation of
     URIs for newly added resources.
+
+    The store is normally changed only from one thread but a long
+    operation such as delete_subtree() may be run in another. Methods
+    that change the store hold lock, a re-entrant threading lock, and
+    delete_subtree() releases it between batches of resources so that
+    other changes may proceed.
     """
 
     acl_inheritance_limit = 100
+    # Number of resources deleted between progress reports in delete_subtree()
+    progress_interval = 10000
     acl_default = '/missing.acl'
     acl_suffix = '.acl'
+    # Optional RepresentationCache, invalidated as resources change
+    representation_cache = None
+
+    def __init__(self, base_uri, blob_store=None):
+        """Initialize empty store with a base_uri.
 
-    def __init__(self, base_uri):
-        """Initialize empty store with a base_uri."""
+        If blob_store is given then LDPNR content is moved into that
+        BlobStore when resources are added or updated.
+        """
         self.base_uri = base_uri
+        self.blob_store = blob_store
+        self.lock = threading.RLock()
         self._resources = {}
-        self.deleted = set()
-
+        # URIs of deleted resources
+        self.deleted = Tombstones()
+        # Blob key used by each resource URI, if any
+        self._blobs = {}
+        # Inverted index of object URI -> set of (resource URI, s, p)
+        # for triples in LDPRS content, and the reverse map of resource
+        # URI -> set of (o, s, p) used to remove entries again
+        self._references = {}
+        self._referenced_by = {}
+        # ACL URI of each resource with an individual ACL, and memo of
+        # (ACL URI or None for default, hops) inherited from each container
+        self._acls = {}
+        self._inherited_acls = {}
+        # Delta-encoded content of RDF mementos
+        self.mementos = MementoStore()
+        # Next number to try for a new resource URI, see _get_uri()
+        self._next_id = 1
+        # StoreViews to be told of changes to resources, see preserve()
+        self.views = []
+
+    @locked
     def add(self, resource, uri=None, context=None, slug=None):
         """Add resource, optionally with specific uri.
 
@@ -55,18 +115,127 @@ class Store(object):
                 uri = self.base_uri
         if (uri in self.deleted):
             self.deleted.discard(uri)
+        elif (uri in self._resources):
+            self.preserve(self._resources[uri])
+            self._resources[uri].store = None
         self._resources[uri] = resource
         resource.uri = uri
+        resource.store = self
+        self._index_references(resource)
+        self._index_blob(resource)
+        self._index_acl(resource)
+        self._index_memento(resource)
+        self._invalidate(uri)
         if (context):
             container = self._resources[context]
             # Add containment and contains relationships
             resource.contained_in = context
             container.add_contained(uri)
+            self._invalidate(context)
             # if (container.container_type == LDP.DirectContainer):
             #    resource.member_of = context
             #    container.add_member(uri)
         return(uri)
 
+    @locked
+    def new_uri(self, context=None, slug=None):
+        """URI for a resource to be added later in container context.
+
+        For a resource that must know its URI before it is complete,
+        such as RDF parsed from a POST body. Nothing is stored so the
+        URI may be taken by the time the resource is added with
+        add_new().
+        """
+        return self._get_uri(context, slug)
+
+    @locked
+    def add_new(self, resource, uri, context=None):
+        """Add resource at uri from new_uri() in container context.
+
+        Raises KeyError if uri has been used since it was allocated.
+        """
+        if (uri in self._resources or uri in self.deleted):
+            raise KeyError("URI %s has already been used" % (uri))
+        return self.add(resource, uri=uri, context=context)
+
+    @locked
+    def add_memento(self, resource, content, context, slug=None, datetime=None):
+        """Add LDPRS resource as a memento in LDPCv context, content as given.
+
+        The content (a graph or other iterable of triples) is stored in
+        mementos as a delta against the previous memento in context,
+        rather than in resource, and is materialized from there when
+        resource.content is accessed. The Memento-Datetime is datetime,
+        else now. Returns the URI of the memento.
+        """
+        uri = self._get_uri(context, slug)
+        self.mementos.add(context, uri, content)
+        resource.content = None
+        resource.memento_datetime = datetime or memento_now()
+        resource.original = self._resources[context].original
+        resource.timemap = context
+        return self.add(resource, uri=uri, context=context)
+
+    @locked
+    def add_batch(self, resources):
+        """Add or replace all of resources in one operation, return list of URIs.
+
+        Each resource is put at resource.uri, or a new URI if that is
+        None, and is contained in resource.contained_in if that is set.
+        All resources are put in place first and then containment and
+        the indexes are updated in a single pass, so resources may be
+        given in any order. An LDPRS that describes an LDPNR without a
+        describedby link becomes its description. The content of RDF
+        mementos is moved into mementos, in Memento-Datetime order.
+        """
+        uris = []
+        for resource in resources:
+            uri = self._get_uri() if resource.uri is None else resource.uri
+            old_resource = self._resources.get(uri)
+            if (old_resource is not None):
+                self.preserve(old_resource)
+                old_resource.store = None
+                if (old_resource.contained_in != resource.contained_in):
+                    self._uncontain(uri, old_resource)
+                if (isinstance(old_resource, LDPC) and isinstance(resource, LDPC)):
+                    resource.contains = old_resource.contains
+                if (old_resource.is_ldpcv and resource.is_ldpcv):
+                    resource.datetime_index = old_resource.datetime_index
+                self.mementos.remove(uri)
+            self._resources[uri] = resource
+            resource.uri = uri
+            resource.store = self
+            uris.append(uri)
+        for uri in uris:
+            self.deleted.discard(uri)
+        placed = [self._resources[uri] for uri in uris]
+        mementos = []
+        for resource in placed:
+            if (isinstance(resource, LDPRS) and resource.describes is not None):
+                described = self._resources.get(resource.describes)
+                if (isinstance(described, LDPNR) and described.describedby is None):
+                    self.preserve(described)
+                    described.describedby = resource.uri
+            if (isinstance(resource, LDPRS) and resource.is_ldprm and resource._content is not None):
+                resource.memento_datetime = resource.memento_datetime or memento_now()
+                mementos.append(resource)
+        for resource in sorted(mementos, key=lambda r: r.memento_datetime):
+            self.mementos.add(resource.timemap, resource.uri, resource._content)
+            resource.content = None
+        for resource in placed:
+            if (resource.contained_in is not None):
+                container = self._resources.get(resource.contained_in)
+                if (isinstance(container, LDPC)):
+                    container.add_contained(resource.uri)
+                    self._invalidate(container.uri)
+            self._index_references(resource)
+            self._index_blob(resource)
+            self._index_acl(resource)
+            self._index_memento(resource)
+            self._invalidate(resource.uri)
+        return uris
+
+    @locked
     def update(self, resource):
         """Update content of the resource at resource.uri in the store.
 
@@ -80,35 +249,207 @@ class Store(object):
             raise KeyError("Attempt to update resource %s that does not exist." % resource.uri)
         # Retain containment link
         old_resource = self._resources[resource.uri]
+        self.preserve(old_resource)
         resource.contained_in = old_resource.contained_in
+        if (old_resource is not resource):
+            old_resource.store = None
         self._resources[resource.uri] = resource
+        resource.store = self
+        self._index_references(resource)
+        self._index_blob(resource)
+        self._index_acl(resource)
+        self._index_memento(resource)
+        self._invalidate(resource.uri)
+
+    @locked
+    def apply_delta(self, uri, added, removed, etag=None):
+        """Apply delta to the content of the LDPRS at uri, return the resource.
+
+        The delta is as from LDPRS.patch_delta(). If etag is given then
+        raises ResourceConflict unless the resource still has that ETag,
+        that is unless it has not changed since the delta was computed.
+        """
+        resource = self._resources.get(uri)
+        if (not isinstance(resource, LDPRS) or
+                (etag is not None and resource.etag != etag)):
+            raise ResourceConflict("Resource %s has been changed" % (uri))
+        resource.apply_delta(added, removed)
+        return resource
+
+    @locked
+    def replace_content(self, uri, resource, etag=None):
+        """Replace content of the resource at uri with that of resource, return it.
+
+        Other attributes of the stored resource are kept, see
+        LDPR.replace_content(), and the change is stored with update().
+        Raises ResourceConflict if there is no resource at uri to replace
+        or if binary content would be replaced with RDF or the reverse,
+        and if etag is given then also unless the stored resource still
+        has that ETag, as for apply_delta().
+        """
+        current = self._resources.get(uri)
+        if (current is None or
+                isinstance(current, LDPNR) != isinstance(resource, LDPNR) or
+                (etag is not None and current.etag != etag)):
+            raise ResourceConflict("Resource %s has been changed" % (uri))
+        current.replace_content(resource)
+        self.update(current)
+        return current
+
+    @locked
+    def changed(self, resource, added=None, removed=None):
+        """Update indexes after in-place change to the content of resource.
+
+        Called via resource.changed() when, for example, a stored LDPRS
+        is patched. Ignored if resource is not the object currently held
+        in the store at resource.uri. If the change is known to be exactly
+        the triples in added and removed then these are given too, they
+        are not needed here.
+        """
+        if (self._resources.get(resource.uri) is resource):
+            self._index_references(resource)
+            self._index_acl(resource)
+            self._invalidate(resource.uri)
+
+    def sync(self):
+        """Bring store up to date with changes made elsewhere.
+
+        No-op for this in-memory store, see PersistentStore.sync().
+        """
+        pass
+
+    def close(self):
+        """Release any files held by the store.
+
+        No-op for this in-memory store, see PersistentStore.close().
+        """
+        pass
 
+    @locked
     def delete(self, uri):
         """Delete resource and record deletion. Return context of deleted resource.
 
         If the resource being deleted is recorded as being contained
         in a container then delete the entry from the container.
+        Resources contained in the deleted resource are not affected,
+        see delete_subtree().
         """
         context = None
         if (uri in self._resources):
             resource = self._resources[uri]
-            if (resource.contained_in is not None):
-                context = resource.contained_in
-                try:
-                    # Delete containment and contains relationships
-                    resource.contained_in = None
-                    container = self._resources[context]
-                    container.del_contained(uri)
-                except KeyError:
-                    logging.warn("OOPS - failed to remove containment of %s from %s" %
-                                 (uri, context))
-                # if (container.container_type == LDP.DirectContainer):
-                #        resource.member_of = None
-                #        container.del_member(uri)
-            del self._resources[uri]
+            context = self._uncontain(uri, resource)
+            self._remove(uri)
             self.deleted.add(uri)
         return context
 
+    def delete_subtree(self, uri, progress=None):
+        """Delete resource and all resources it contains, recursively.
+
+        Returns the context of the deleted resource as for delete().
+        Only the containment of uri itself needs to be removed from a
+        container that remains, and tombstones are added a batch of
+        progress_interval resources at a time. If progress is given then
+        it is called as progress(n, total) after every batch and at the
+        end.
+
+        The lock is held for each batch rather than throughout, see
+        _exclusive(), so that when run in another thread other changes
+        to the store can be made in between. Each batch is removed and
+        its tombstones added under the same lock so that no URI is ever
+        in neither place. Other requests must be kept away from the
+        resources in the subtree meanwhile.
+        """
+        with self._exclusive():
+            if (uri not in self._resources):
+                return None
+            context = self._uncontain(uri, self._resources[uri])
+            uris = list(self.subtree(uri))
+        total = len(uris)
+        for start in range(0, total, self.progress_interval):
+            batch = uris[start:start + self.progress_interval]
+            with self._exclusive():
+                for sub_uri in batch:
+                    # May have gone already if a PersistentStore reloaded
+                    if (sub_uri in self._resources):
+                        self._remove(sub_uri)
+                self.deleted.update(batch)
+            n = start + len(batch)
+            if (progress is not None and n % self.progress_interval == 0):
+                progress(n, total)
+        if (progress is not None):
+            progress(total, total)
+        return context
+
+    @contextmanager
+    def _exclusive(self):
+        """Context in which the store may be changed, with the lock held.
+
+        See PersistentStore._exclusive() which also catches up with
+        changes made by other processes.
+        """
+        with self.lock:
+            yield
+
+    def subtree(self, uri):
+        """Iterator over uri and all resources it contains, recursively.
+
+        Each container is listed before the resources it contains.
+        """
+        stack = [uri]
+        while (len(stack) > 0):
+            uri = stack.pop()
+            yield uri
+            resource = self._resources.get(uri)
+            if (isinstance(resource, LDPC)):
+                stack.extend(resource.contains)
+
+    def _uncontain(self, uri, resource):
+        """Remove containment of resource at uri, return URI of container or None."""
+        context = resource.contained_in
+        if (context is not None):
+            self.preserve(resource)
+            try:
+                # Delete containment and contains relationships
+                resource.contained_in = None
+                container = self._resources[context]
+                container.del_contained(uri)
+                self._invalidate(context)
+            except KeyError:
+                logging.warning("OOPS - failed to remove containment of %s from %s" %
+                                (uri, context))
+            # if (container.container_type == LDP.DirectContainer):
+            #        resource.member_of = None
+            #        container.del_member(uri)
+        return context
+
+    def _remove(self, uri):
+        """Remove resource at uri and its index entries, without adding a tombstone."""
+        self.preserve(self._resources[uri])
+        resource = self._resources.pop(uri)
+        if (isinstance(resource, LDPC) and resource.is_ldpcv):
+            self.mementos.remove_timemap(uri)
+        self.mementos.remove(uri)
+        resource.store = None
+        self._unindex_references(uri)
+        self._unindex_blob(uri)
+        self._unindex_acl(resource)
+        self._invalidate(uri)
+
+    @locked
+    def preserve(self, resource):
+        """Tell views that resource is about to be changed, replaced or removed.
+
+        Called before any change to a resource held in the store, see
+        LDPR.changing() for changes made in place.
+        """
+        for view in self.views:
+            view.preserve(resource)
+
+    def _invalidate(self, uri):
+        """Invalidate any cached representations of uri."""
+        if (self.representation_cache is not None):
+            self.representation_cache.invalidate(uri)
+
     def object_references(self, uri):
         """Graph of triples in store that refer to object uri.
 
@@ -116,42 +457,153 @@ class Store(object):
             1. Arbitrary triples in RDF then have uri as the object.
             2. Containment and membership relations for uri.
 
-        FIXME - This is SPECTACULARLY inefficient! Does a simple
-        search over all triples in all LDPRS objects looking for
-        for object uri.
+        Arbitrary triples and membership relations are looked up in the
+        inverted index maintained by _index_references(). The containment
+        relation is found from the contained_in link of uri itself.
         """
         g = Graph()
-        triple_pattern = (None, None, URIRef(uri))
-        for r_uri, resource in self.items():
-            if (isinstance(resource, LDPRS)):
-                for (s, p, o) in resource.triples(triple_pattern):
-                    g.add((s, p, o))
-            if (isinstance(resource, LDPC)):
-                if (uri in resource.contains):
-                    g.add((URIRef(resource.uri),
-                           resource.containment_predicate,
-                           URIRef(uri)))
-                if (uri in resource.members):
-                    g.add((URIRef(resource.uri),
-                           resource.membership_predicate,
-                           URIRef(uri)))
+        o = URIRef(uri)
+        for (r_uri, s, p) in list(self._references.get(uri, ())):
+            g.add((s, p, o))
+        resource = self._resources.get(uri)
+        if (resource is not None and resource.contained_in is not None):
+            container = self._resources.get(resource.contained_in)
+            if (isinstance(container, LDPC) and uri in container.contains):
+                g.add((URIRef(container.uri),
+                       container.containment_predicate,
+                       o))
         return g
 
-    def contained_graph(self, uri, omits):
-        """Graph of resource content for resources contained by uri.
+    def _index_references(self, resource):
+        """Add entries for resource to the inverted object index.
 
-        Simply iterates through the set of contained resources and adds
-        the content (following omits rules) of any that are LDPRS to the
-        graph.
+        Any existing entries for resource.uri are first removed so this
+        may be used both for new resources and to re-index changed ones.
+        Only triples with a URIRef object are indexed, along with membership
+        relations for any LDPC.
+        """
+        r_uri = resource.uri
+        self._unindex_references(r_uri)
+        entries = set()
+        if (isinstance(resource, LDPRS)):
+            for (s, p, o) in resource.triples((None, None, None)):
+                if (isinstance(o, URIRef)):
+                    entries.add((str(o), s, p))
+        if (isinstance(resource, LDPC)):
+            for member in resource.members:
+                entries.add((str(member), URIRef(r_uri),
+                             resource.membership_predicate))
+        for (o, s, p) in entries:
+            self._references.setdefault(o, set()).add((r_uri, s, p))
+        if (len(entries) > 0):
+            self._referenced_by[r_uri] = entries
+
+    def _unindex_references(self, r_uri):
+        """Remove all entries for resource r_uri from the inverted object index."""
+        for (o, s, p) in self._referenced_by.pop(r_uri, ()):
+            refs = self._references[o]
+            refs.discard((r_uri, s, p))
+            if (len(refs) == 0):
+                del self._references[o]
+
+    def _index_blob(self, resource):
+        """Move any LDPNR content into the blob store and update reference counts.
+
+        Content not already in the blob store, either in a file at
+        content_path (such as a spooled upload) or in memory, is added to
+        it. Reference counts are kept per resource URI so that replacing
+        content decrements the count for the blob previously used.
+        """
+        if (self.blob_store is None):
+            return
+        key = None
+        if (isinstance(resource, LDPNR)):
+            if (resource.blob is not None):
+                key = resource.blob
+            elif (resource.content_path is not None):
+                sha256 = resource.digests.get('sha-256')
+                if (sha256 is not None):
+                    sha256 = b64decode(sha256).hex()
+                key = self.blob_store.add_file(resource.content_path, sha256)
+            elif (resource.content is not None):
+                key = self.blob_store.add_bytes(resource.content)
+        old_key = self._blobs.pop(resource.uri, None)
+        if (key is not None):
+            resource.set_blob(key, self.blob_store.path(key))
+            self.blob_store.incref(key)
+            self._blobs[resource.uri] = key
+        if (old_key is not None):
+            self.blob_store.decref(old_key)
+
+    def _index_acl(self, resource):
+        """Record ACL link of resource, clear memo of inherited ACLs if affected.
+
+        Any change to an ACL might change whether it has heritable
+        authorizations so clears the memo, as does a change to the ACL
+        link of a resource on the path of any memoized lookup.
+        """
+        uri = resource.uri
+        acl = getattr(resource, 'acl', None)
+        if (isinstance(resource, ACLR) or
+                (acl != self._acls.get(uri) and uri in self._inherited_acls)):
+            self._inherited_acls = {}
+        if (acl is None):
+            self._acls.pop(uri, None)
+        else:
+            self._acls[uri] = acl
+
+    def _unindex_acl(self, resource):
+        """Remove ACL link of deleted resource, clear memo of inherited ACLs if affected."""
+        self._acls.pop(resource.uri, None)
+        if (isinstance(resource, ACLR) or resource.uri in self._inherited_acls):
+            self._inherited_acls = {}
 
-        FIXME - this has the potential to get quite large, should there be a cutoff?
+    def _index_memento(self, resource):
+        """Add memento resource to the datetime index of its TimeMap.
+
+        Does nothing unless resource is an LDPRm with a Memento-Datetime
+        and its TimeMap (LDPCv) is in the store. Removal from the index
+        happens with removal of containment in delete().
         """
-        resource = self[uri]
-        contained_graph = Graph()
-        for contained_uri in resource.contains:
-            contained_resource = self[contained_uri]
+        if (getattr(resource, 'memento_datetime', None) is not None and resource.is_ldprm):
+            timemap = self._resources.get(resource.timemap)
+            if (timemap is not None and timemap.is_ldpcv):
+                timemap.add_memento(resource.uri, resource.memento_datetime)
+                self._invalidate(timemap.uri)
+
+    def _unindex_blob(self, uri):
+        """Release any blob used by resource uri."""
+        key = self._blobs.pop(uri, None)
+        if (key is not None):
+            self.blob_store.decref(key)
+
+    def contained_triples(self, uri, omits, contained=None):
+        """Iterator over triples describing resources contained by uri.
+
+        Yields the triples (following omits rules) of each contained
+        resource that is an LDPRS in turn, without building any
+        intermediate graph, so the descriptions can be streamed
+        directly into a response. If contained is not None then it
+        is an iterable of the contained URIs to describe, for example
+        one page of them, instead of all contained resources. The
+        contained resources must not be changed until iteration is
+        finished, see LDPHandler.write_rdf_chunks().
+        """
+        if contained is None:
+            contained = self[uri].contains
+        for contained_uri in contained:
+            contained_resource = self._resources.get(contained_uri)
             if isinstance(contained_resource, LDPRS):
-                contained_graph += contained_resource.graph(omits)
+                yield from contained_resource.iter_triples(omits)
+
+    def contained_graph(self, uri, omits, contained=None):
+        """Graph of resource content for resources contained by uri.
+
+        See contained_triples() for arguments.
+        """
+        contained_graph = Graph()
+        for triple in self.contained_triples(uri, omits, contained):
+            contained_graph.add(triple)
         return contained_graph
 
     def acl(self, uri, depth=0):
@@ -165,21 +617,96 @@ class Store(object):
         FIXME - How do we handle `control` type directives that apply to
         self in the case that uri is an ACL resource, see
         https://github.com/solid/web-access-control-spec#modes-of-access
+
+        An ACL link to a resource that does not exist or is not an ACLR
+        is ignored, as if there were no individual ACL.
+
+        The ACL inherited from each container is memoized, see
+        inherited_acl(). depth is the number of levels of the hierarchy
+        already followed to reach uri.
         """
         resource = self._resources[uri]
-        if (resource.acl is None):
-            if (resource.contained_in is None):
-                # This is not covered by WAC specification see:
-                # https://github.com/fcrepo/fcrepo-specification/issues/163
-                return(self.acl_default)
-        elif (depth == 0 or
-              self._resources[resource.acl].has_heritable_auths or
-              resource.contained_in is None):
+        if (isinstance(self._resources.get(resource.acl), ACLR)):
             return(resource.acl)
-        # Go up inheritance hierarchy
-        if (depth >= self.acl_inheritance_limit):
+        elif (resource.contained_in is None):
+            # This is not covered by WAC specification see:
+            # https://github.com/fcrepo/fcrepo-specification/issues/163
+            return(self.acl_default)
+        (acl, hops) = self.inherited_acl(resource.contained_in)
+        if (depth + hops >= self.acl_inheritance_limit):
             raise Exception("Exceeded acl_inheritance_limit!")
-        return(self.acl(resource.contained_in, depth=(depth + 1)))
+        return(self.acl_default if acl is None else acl)
+
+    def inherited_acl(self, uri):
+        """ACL inherited by resources contained in uri, as (acl, hops).
+
+        acl is the URI of the ACL of uri if it has heritable authorizations
+        (or uri is the top of the hierarchy), else, as for an ACL link to a
+        resource that is not an ACLR, the ACL inherited from
+        its container, or None for the default ACL. hops is the number of
+        further levels up the hierarchy followed from uri.
+
+        Results are memoized for every container on the path followed
+        and the memo is cleared when ACLs or ACL links change, see
+        _index_acl(), so repeated lookups in a subtree are O(1).
+        """
+        path = []
+        while (uri not in self._inherited_acls):
+            resource = self._resources[uri]
+            aclr = self._resources.get(resource.acl)
+            if (isinstance(aclr, ACLR) and
+                    (resource.contained_in is None or aclr.has_heritable_auths)):
+                self._inherited_acls[uri] = (resource.acl, 0)
+            elif (resource.contained_in is None):
+                self._inherited_acls[uri] = (None, 0)
+            elif (len(path) > len(self._resources)):
+                raise Exception("Loop in containment hierarchy at %s" % (uri))
+            else:
+                path.append(uri)
+                uri = resource.contained_in
+        (acl, hops) = self._inherited_acls[uri]
+        for uri in reversed(path):
+            hops += 1
+            self._inherited_acls[uri] = (acl, hops)
+        return (acl, hops)
+
+    def authorized(self, agent, mode, uri):
+        """True if agent has access mode (acl:Read etc.) to resource uri.
+
+        Implements the Web Access Control check using the effective ACL
+        from acl(). If that is the individual ACL of uri then authorizations
+        with acl:accessTo uri apply, otherwise those with acl:default.
+        Access of any type to an ACL resource itself requires acl:Control
+        on the resource it is for. Agent groups are looked up as vCard
+        groups in this store, see in_group().
+        """
+        resource = self._resources[uri]
+        if (isinstance(resource, ACLR) and resource._acl_for is not None):
+            mode = str(ACL.Control)
+            uri = urljoin(self.base_uri, resource._acl_for)
+            if (uri == (self.base_uri + '/')):
+                uri = self.base_uri
+            resource = self._resources.get(uri)
+            if (resource is None):
+                return False
+        acl_uri = self.acl(uri)
+        aclr = self._resources.get(acl_uri)
+        if (not isinstance(aclr, ACLR)):
+            return False
+        return aclr.permits(agent, mode, uri,
+                            inherited=(resource.acl != acl_uri),
+                            in_group=self.in_group)
+
+    def in_group(self, group, agent):
+        """True if agent is a vcard:hasMember of group.
+
+        The group is described in the resource with the group URI less
+        any fragment.
+        """
+        resource = self._resources.get(group.split('#')[0])
+        if (not isinstance(resource, LDPRS)):
+            return False
+        return (URIRef(group), VCARD.hasMember, URIRef(agent)) in resource.content
 
     def individual_acl(self, uri):
         """ACL uri for the individual ACL for uri, which may or may not exist.
@@ -198,7 +725,9 @@ class Store(object):
         """Get URI for a new resource.
 
         Will first try to honor the slug but creating a new URI
-        with slug as the final path element.
+        with slug as the final path element. Otherwise mints a URI
+        base_uri/<n> with n from a monotonic counter, so numbers are
+        never reused even after deletion.
         """
         if (context is not None and slug is not None):
             # Add trailing slash to context just in case, // tidied by urljoin
@@ -206,14 +735,15 @@ class Store(object):
             if (uri not in self._resources and
                     uri not in self.deleted):
                 return(uri)
-        # Otherwise consruct URI
-        n = 1
+        # Otherwise construct URI from the counter. Each number is tried
+        # just once, skipping any already used via slug or PUT, so this is
+        # O(1) amortized however many resources have been created
         while (True):
-            uri = urljoin(self.base_uri, '/' + str(n))
+            uri = urljoin(self.base_uri, '/' + str(self._next_id))
+            self._next_id += 1
             if (uri not in self._resources and
                     uri not in self.deleted):
                 return(uri)
-            n += 1
 
     def __getitem__(self, uri):
         """Item access with [uri] as key.
@@ -224,10 +754,15 @@ class Store(object):
         try:
             return self._resources[uri]
         except KeyError as e:
-            if (uri in self.deleted):
+            if (self.is_deleted(uri)):
                 raise KeyDeleted(uri + " has been deleted")
             raise e
 
+    @locked
+    def is_deleted(self, uri):
+        """True if resource uri has been deleted (and not created again)."""
+        return uri in self.deleted
+
     def __contains__(self, uri):
         """Item presence test with uri as key."""
         return(uri in self._resources)
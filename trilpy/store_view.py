@@ -0,0 +1,112 @@
+"""Consistent read-only view of a Store while it continues to change.
+
+An export of the whole store takes a while and must not stop writes,
+but should still describe the store as it was at one moment. A
+StoreView starts as a shallow copy of the store's dict of resources,
+which costs a pointer per resource and no copying of content. The
+store tells every view before a resource it holds is replaced, removed
+or changed in place (see Store.preserve() and LDPR.changing()) and
+the view then takes its own copy of that resource's state, if it has
+not yet been read. Entries are removed from the view as they are read
+so the view shrinks as an export proceeds.
+
+The store may tell a view of changes from another thread (see
+Store.delete_subtree()) so the view is read and changed with the
+store's lock held.
+"""
+from collections import namedtuple
+import os
+import tempfile
+
+from .ldpnr import LDPNR
+from .ldprs import LDPRS
+from .persistent_store import resource_to_record
+
+# Exported state of one resource: record as resource_to_record(resource,
+# content=False) plus blob for a binary in the blob store; triples for
+# an LDPRS, else None; and binary which is None, bytes, or the path of
+# a file with the content which is removed after reading if temporary
+ExportEntry = namedtuple('ExportEntry', ['record', 'triples', 'binary', 'temporary'])
+
+
+class StoreView(object):
+    """View of the resources in store at the time the view was created."""
+
+    def __init__(self, store):
+        """Initialize view of store and register it with the store."""
+        self.store = store
+        self.base_uri = store.base_uri
+        with store.lock:
+            self._resources = dict(store._resources)  # uri -> resource or ExportEntry
+            self.mementos = store.mementos.copy()
+            store.views.append(self)
+
+    def __len__(self):
+        """Number of resources not yet read from the view."""
+        return len(self._resources)
+
+    def preserve(self, resource):
+        """Take copy of state of resource which is about to change.
+
+        Does nothing unless resource is the object held in this view,
+        so only the first change after the view is created is copied.
+        """
+        if (self._resources.get(resource.uri) is resource):
+            self._resources[resource.uri] = self._entry(resource, copy=True)
+
+    def _entry(self, resource, copy=False):
+        """ExportEntry for resource.
+
+        With copy True the entry does not depend on resource or any
+        blob it uses staying unchanged. A blob is held by a hard link
+        in the blob store's temporary directory.
+        """
+        record = resource_to_record(resource, content=False)
+        triples = None
+        binary = None
+        temporary = False
+        if (isinstance(resource, LDPNR)):
+            record['digests'] = dict(resource.digests)
+            if (resource.blob is not None and self.store.blob_store is not None):
+                record['blob'] = resource.blob
+                binary = self.store.blob_store.path(resource.blob)
+                if (copy):
+                    (fd, link) = tempfile.mkstemp(dir=self.store.blob_store.tmp_dir, prefix='export-')
+                    os.close(fd)
+                    os.unlink(link)
+                    os.link(binary, link)
+                    (binary, temporary) = (link, True)
+            elif (resource._content is not None or resource.content_path is None):
+                binary = resource._content or b''
+            else:
+                binary = resource.content_path
+        elif (isinstance(resource, LDPRS)):
+            if (resource.uri in self.mementos):
+                triples = self.mementos.triples(resource.uri)
+            elif (copy):
+                triples = frozenset(resource.content)
+            else:
+                triples = resource.content
+        return ExportEntry(record, triples, binary, temporary)
+
+    def entries(self):
+        """Iterator over ExportEntry for each resource, removing them from the view.
+
+        The entry for a resource that has not changed is made as it is
+        read so must be used before the store is next changed.
+        """
+        while (len(self._resources) > 0):
+            with self.store.lock:
+                (uri, value) = self._resources.popitem()
+                entry = value if isinstance(value, ExportEntry) else self._entry(value)
+            yield entry
+
+    def close(self):
+        """Unregister view from the store and release any copies not read."""
+        with self.store.lock:
+            if (self in self.store.views):
+                self.store.views.remove(self)
+            for value in self._resources.values():
+                if (isinstance(value, ExportEntry) and value.temporary):
+                    os.unlink(value.binary)
+            self._resources = {}
@@ -0,0 +1,262 @@
+"""Compact set of the URIs of deleted resources.
+
+The store remembers every URI that has been deleted so that it can
+respond 410 Gone and so that URIs are not reused. Over time there may be
+very many of these and they are checked on every lookup of a missing
+resource, every new URI and every PUT. Tombstones keeps them sorted in
+blocks with front coding, where each URI is stored as the length of the
+prefix shared with the previous URI plus the remaining bytes, which for
+URIs minted in the same containers is a few bytes each. A Bloom filter
+in front answers most lookups of URIs that have not been deleted
+without decoding any block.
+"""
+from base64 import b64encode, b64decode
+from bisect import bisect_left, bisect_right
+import hashlib
+
+
+def _put_varint(out, n):
+    """Append unsigned int n to bytearray out as a varint."""
+    while (n >= 0x80):
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data, pos):
+    """Read varint from data at pos, return (value, new pos)."""
+    n = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if (b < 0x80):
+            return (n, pos)
+        shift += 7
+
+
+def _common_prefix_len(a, b):
+    """Length of common prefix of bytes a and b, by binary search."""
+    lo = 0
+    hi = min(len(a), len(b))
+    while (lo < hi):
+        mid = (lo + hi + 1) // 2
+        if (a[:mid] == b[:mid]):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def encode_block(uris):
+    """Front coded bytes for sorted list of URIs."""
+    out = bytearray()
+    prev = b''
+    for uri in uris:
+        b = uri.encode('utf-8')
+        n = _common_prefix_len(prev, b)
+        _put_varint(out, n)
+        _put_varint(out, len(b) - n)
+        out += b[n:]
+        prev = b
+    return bytes(out)
+
+
+def decode_block(data):
+    """Sorted list of URIs from front coded bytes."""
+    uris = []
+    prev = b''
+    pos = 0
+    while (pos < len(data)):
+        (n, pos) = _get_varint(data, pos)
+        (m, pos) = _get_varint(data, pos)
+        b = prev[:n] + data[pos:pos + m]
+        pos += m
+        uris.append(b.decode('utf-8'))
+        prev = b
+    return uris
+
+
+class BloomFilter(object):
+    """Bloom filter of strings, sized for capacity entries.
+
+    Uses a stable hash so that the filter may be persisted.
+    """
+
+    bits_per_entry = 10
+    num_hashes = 7
+
+    def __init__(self, capacity=1024):
+        """Initialize empty filter."""
+        self.capacity = capacity
+        self.num_bits = capacity * self.bits_per_entry
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        """Bit positions for key."""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key):
+        """Add key."""
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        """False if key has definitely not been added, else True."""
+        for pos in self._positions(key):
+            if (not self.bits[pos >> 3] & (1 << (pos & 7))):
+                return False
+        return True
+
+
+class Tombstones(object):
+    """Set of deleted URIs stored as front coded sorted blocks.
+
+    Each block holds at most 2 * block_size URIs and _firsts holds the
+    first URI of each block so that a URI is located by binary search
+    over _firsts and then decoding of one block. New URIs are collected
+    in a small set of recent additions and merged into the blocks
+    merge_size at a time, so that each affected block is re-encoded
+    once per merge rather than once per URI. Discarded URIs stay in the
+    Bloom filter until it is next rebuilt, which happens when it is
+    outgrown.
+    """
+
+    block_size = 64
+    merge_size = 1024
+
+    def __init__(self, uris=()):
+        """Initialize, optionally with an iterable of URIs."""
+        uris = sorted(set(uris))
+        size = self.block_size
+        self._blocks = [encode_block(uris[n:n + size]) for n in range(0, len(uris), size)]
+        self._firsts = uris[::size]
+        self._len = len(uris)  # number in blocks
+        self._recent = set()  # added but not yet merged into blocks
+        self._bloom = BloomFilter(max(1024, 2 * self._len))
+        for uri in uris:
+            self._bloom.add(uri)
+
+    def __len__(self):
+        """Number of URIs."""
+        return self._len + len(self._recent)
+
+    def __iter__(self):
+        """Iterator over URIs in order."""
+        self._merge()
+        for block in self._blocks:
+            yield from decode_block(block)
+
+    def _in_blocks(self, uri):
+        """True if uri is in the blocks."""
+        if (uri not in self._bloom):
+            return False
+        c = bisect_right(self._firsts, uri) - 1
+        if (c < 0):
+            return False
+        uris = decode_block(self._blocks[c])
+        n = bisect_left(uris, uri)
+        return n < len(uris) and uris[n] == uri
+
+    def __contains__(self, uri):
+        """True if uri is in the set."""
+        return uri in self._recent or self._in_blocks(uri)
+
+    def add(self, uri):
+        """Add uri, no change if already present."""
+        if (uri in self):
+            return
+        self._recent.add(uri)
+        if (len(self) > self._bloom.capacity):
+            self._rebuild_bloom(2 * len(self))
+        else:
+            self._bloom.add(uri)
+        if (len(self._recent) >= self.merge_size):
+            self._merge()
+
+    def update(self, uris):
+        """Add all of iterable uris, merging into the blocks once."""
+        uris = set(uris)
+        self._recent |= uris
+        self._merge()
+        if (len(self) > self._bloom.capacity):
+            self._rebuild_bloom(2 * len(self))
+        else:
+            for uri in uris:
+                self._bloom.add(uri)
+
+    def discard(self, uri):
+        """Remove uri if present, return True if it was removed."""
+        if (uri in self._recent):
+            self._recent.discard(uri)
+            return True
+        if (not self._in_blocks(uri)):
+            return False
+        c = bisect_right(self._firsts, uri) - 1
+        uris = decode_block(self._blocks[c])
+        uris.remove(uri)
+        if (len(uris) == 0):
+            del self._blocks[c]
+            del self._firsts[c]
+        else:
+            self._blocks[c] = encode_block(uris)
+            self._firsts[c] = uris[0]
+        self._len -= 1
+        return True
+
+    def _merge(self):
+        """Merge recent additions into the blocks."""
+        if (len(self._recent) == 0):
+            return
+        # Group recent URIs by the block they go in, none before the first
+        groups = {}
+        for uri in sorted(self._recent):
+            c = max(bisect_right(self._firsts, uri) - 1, 0)
+            groups.setdefault(c, []).append(uri)
+        if (len(self._blocks) == 0):
+            self._blocks.append(b'')
+            self._firsts.append(groups[0][0])
+        # Work from the end so that splitting blocks does not change the
+        # index of blocks still to do
+        size = self.block_size
+        for c in sorted(groups, reverse=True):
+            old_uris = decode_block(self._blocks[c])
+            uris = sorted(set(old_uris).union(groups[c]))
+            self._len += len(uris) - len(old_uris)
+            if (len(uris) > 2 * size):
+                chunks = [uris[n:n + size] for n in range(0, len(uris), size)]
+            else:
+                chunks = [uris]
+            self._blocks[c:c + 1] = [encode_block(chunk) for chunk in chunks]
+            self._firsts[c:c + 1] = [chunk[0] for chunk in chunks]
+        self._recent = set()
+
+    def _rebuild_bloom(self, capacity):
+        """Replace the Bloom filter with one for capacity entries."""
+        self._bloom = BloomFilter(capacity)
+        for uri in self:
+            self._bloom.add(uri)
+
+    def to_record(self):
+        """Dict record of the encoded data that can be written as JSON."""
+        self._merge()
+        return {'count': self._len,
+                'blocks': [b64encode(b).decode('ascii') for b in self._blocks],
+                'bloom_capacity': self._bloom.capacity,
+                'bloom': b64encode(self._bloom.bits).decode('ascii')}
+
+    @classmethod
+    def from_record(cls, record):
+        """New Tombstones from dict record made by to_record()."""
+        tombstones = cls()
+        tombstones._blocks = [b64decode(b) for b in record['blocks']]
+        tombstones._firsts = [decode_block(b)[0] for b in tombstones._blocks]
+        tombstones._len = record['count']
+        tombstones._bloom = BloomFilter(record['bloom_capacity'])
+        tombstones._bloom.bits = bytearray(b64decode(record['bloom']))
+        return tombstones
@@ -1,30 +1,57 @@
 """Tornado app for trilpy.
 
-DEMOWARE ONLY: NO ATTEMPT AT THREAD SAFETY, PERSISTENCE.
+DEMOWARE ONLY. Persistence is available by using a PersistentStore as
+the store.
+
+If LDPHandler.executor is set then CPU-bound work (parsing,
+serialization, patching, digests) on resources is run in that executor,
+and handlers hold per-resource locks while waiting on it so that
+concurrent requests for the same resources do not interleave. Work in
+the executor may read resources, such as the descriptions of contained
+resources, but does not modify the store, except for the deletion of a
+container's subtree. That is done a batch at a time holding the store's
+lock (see Store.delete_subtree()), with the locks for the whole subtree
+held by the handler, and all other changes to the store are made from
+the IOLoop thread.
 """
+from itertools import chain, islice
 import logging
-from negotiator2 import conneg_on_accept, memento_parse_datetime
+import mmap
+from negotiator2 import conneg_on_accept, memento_datetime_string, memento_parse_datetime
 import os.path
+import re
+import sys
+from tornado.httpserver import HTTPServer
 import tornado.ioloop
-from tornado.web import RequestHandler, HTTPError, StaticFileHandler, Application
-from urllib.parse import urljoin, urlsplit
+from tornado.web import RequestHandler, HTTPError, StaticFileHandler, Application, stream_request_body
+from urllib.parse import urlencode, urljoin, urlsplit
 
+from .archive import ArchiveError, ArchiveWriter, read_archive
 from .auth_basic import get_user
+from .datetime_index import memento_now
 from .digest import Digest, UnsupportedDigest, BadDigest
 from .ldp import is_ldp_same_or_sub_type
 from .ldpc import LDPC, UnsupportedContainerType, DataConflict
 from .ldpcv import LDPCv
 from .ldpnr import LDPNR
-from .ldpr import LDPR
 from .ldprs import LDPRS, PatchFailed, PatchIllegal
 from .links import RequestLinks, ResponseLinks
-from .namespace import LDP
-from .prefer_header import parse_prefer_return_representation
-from .store import KeyDeleted
+from .namespace import ACL, LDP
+from .prefer_header import parse_prefer_return_representation, find_max_member_count
+from .resource_locks import ResourceLocks
+from .store import KeyDeleted, ResourceConflict
+from .store_view import StoreView
+from .upload import SpooledUpload
 
 
+@stream_request_body
 class LDPHandler(RequestHandler):
-    """LDP and Fedora request handler."""
+    """LDP and Fedora request handler.
+
+    Request bodies are streamed: non-RDF bodies of PUT and POST requests
+    are spooled to a file in upload_dir as they arrive, other bodies are
+    accumulated in memory and are available via request_body.
+    """
 
     store = None
     no_auth = False
@@ -42,7 +69,21 @@ class LDPHandler(RequestHandler):
     ldp_rdf_source = str(LDP.RDFSource)
     ldp_nonrdf_source = str(LDP.NonRDFSource)
     constraints_path = '/constraints.txt'
+    write_chunk_size = 1024 * 1024  # chunk size for streaming non-RDF content
+    upload_dir = None  # directory for spooled uploads, None for blob store or system temp
+    max_upload_size = None  # maximum size of spooled upload in bytes, None for no limit
+    ingest_digest_types = ('md5', 'sha-256')  # digests always computed for non-RDF uploads
+    executor = None  # concurrent.futures.Executor for CPU-bound work, None to run inline
+    page_size = None  # page containers with more entries than this, None to page only on request
+    stream_min_triples = 10000  # stream RDF representations with at least this many triples, None to never stream
+    max_contained_descriptions = 1000  # limit on resources described for PreferContainedDescriptions, None for no limit
+    import_workers = None  # worker processes for parsing RDF of imports, None for one per CPU
+    resource_locks = ResourceLocks()
     # Authorization
+    access_modes = {'read': str(ACL.Read),
+                    'write': str(ACL.Write),
+                    'append': str(ACL.Append),
+                    'control': str(ACL.Control)}
     fedora_admin_webid = 'fedoraAdmin'  # This should really be a webid but usernames in HTTP Basic auth can't contain :
     users = {fedora_admin_webid: 'secret'}
 
@@ -60,6 +101,78 @@ class LDPHandler(RequestHandler):
         # response building
         self.response_links = ResponseLinks()  # accumulate links for Link header
         self.error_explanation = ''  # sent as addition to body of error response
+        # request body
+        self._upload = None  # SpooledUpload for a streamed non-RDF body
+        self._body_chunks = None  # list of chunks for other streamed bodies
+        self._digest_checked = False
+
+    def prepare(self):
+        """Set up to receive a streamed request body.
+
+        Bodies of PUT and POST requests with a non-RDF content type are
+        spooled to a file, computing any digests specified in a Digest
+        header and those in ingest_digest_types as the data arrives.
+        Anything else is accumulated in memory.
+
+        First brings the store up to date with any changes made by other
+        processes.
+        """
+        self.store.sync()
+        if (self.request.method not in ('PUT', 'POST', 'PATCH')):
+            return
+        content_type = self.request.headers.get('Content-Type', '').split(';')[0]
+        if (self.request.method != 'PATCH' and content_type and
+                content_type not in self.rdf_media_types):
+            digest_types = set(self.ingest_digest_types)
+            try:
+                digest_types.update(Digest(digest_header=self.request.headers.get('Digest')).digests.keys())
+            except (UnsupportedDigest, BadDigest):
+                pass  # error reported by check_digest()
+            spool_dir = self.upload_dir
+            if (spool_dir is None and self.store.blob_store is not None):
+                # Spool in blob store so the file can simply be moved in
+                spool_dir = self.store.blob_store.tmp_dir
+            self._upload = SpooledUpload(spool_dir, digest_types)
+            # Tornado's default limit still applies to bodies held in memory
+            self.request.connection.set_max_body_size(
+                sys.maxsize if self.max_upload_size is None else self.max_upload_size)
+        else:
+            self._body_chunks = []
+
+    def data_received(self, chunk):
+        """Handle chunk of streamed request body."""
+        if (self._upload is not None):
+            self._upload.write(chunk)
+        else:
+            self._body_chunks.append(chunk)
+
+    def on_finish(self):
+        """Remove any spooled upload that was not used for a resource."""
+        if (self._upload is not None):
+            self._upload.discard()
+            self._upload = None
+
+    def upload_stored(self):
+        """Hand any spooled upload over to the resource just stored.
+
+        Called once a resource created by put_post_resource() has been
+        added to the store, after which the file belongs to the resource
+        (or has been moved into the blob store) and must not be removed
+        when the request finishes.
+        """
+        self._upload = None
+
+    def on_connection_close(self):
+        """Clean up after client disconnect."""
+        self.on_finish()
+
+    @property
+    def request_body(self):
+        """Request body as bytes for bodies not spooled to a file."""
+        if (self._body_chunks is not None):
+            self.request.body = b''.join(self._body_chunks)
+            self._body_chunks = None
+        return self.request.body
 
     def get_current_user(self):
         """Get current user from authentication credentials.
@@ -72,21 +185,51 @@ class LDPHandler(RequestHandler):
         # do HTTP Basic auth
         return get_user(self.request.headers.get('Authorization'), self.users)
 
+    async def run_blocking(self, func, *args):
+        """Run func(*args) in executor and return result.
+
+        func must not modify the store because it will run in another
+        thread, except through Store.delete_subtree() which takes the
+        store's lock as it goes and is run only with the locks for the
+        whole subtree held. If there is no executor then func is simply
+        called.
+        """
+        if (self.executor is None):
+            return func(*args)
+        return await tornado.ioloop.IOLoop.current().run_in_executor(self.executor, func, *args)
+
     def head(self):
         """HEAD - GET with no body."""
-        self.get(is_head=True)
+        return self.get(is_head=True)
+
+    async def get(self, is_head=False):
+        """GET or HEAD if is_head set True.
 
-    def get(self, is_head=False):
-        """GET or HEAD if is_head set True."""
+        Non-RDF content is written in chunks (see write_nonrdf_content) and
+        a single byte range may be requested with a Range header. Large RDF
+        representations are streamed as N-Triples if the media type allows
+        (see write_rdf_chunks), otherwise they are serialized in full.
+        """
         uri = self.path_to_uri(self.request.path)
         want_digest = self.check_want_digest()
         resource = self.from_store(uri)
         self.check_authz(resource, 'read')
+        if (resource.is_ldprv and self.request.headers.get('Accept-Datetime')):
+            self.timegate_redirect(resource)
+            return
+        byte_range = None
         if (isinstance(resource, LDPNR)):
             content_type = resource.content_type
-            content = resource.content
-            logging.debug("Non-RDF response: %d bytes, starts %s" %
-                          (len(content), content[:30]))
+            content = None
+            etag = await self.run_blocking(lambda: resource.etag)
+            content_length = resource.content_length
+            logging.debug("Non-RDF response: %d bytes" % (content_length))
+            try:
+                byte_range = self.request_byte_range(content_length)
+            except ValueError:
+                self.set_header("Content-Range", "bytes */%d" % (content_length))
+                self.set_status(416)
+                return
         else:
             content_type = conneg_on_accept(
                 resource.rdf_media_types, self.request.headers.get("Accept"))
@@ -101,19 +244,58 @@ class LDPHandler(RequestHandler):
                 extra_graph = self.store.object_references(uri)
                 logging.debug("PreferInboundReferences, adding %d triples referencing %s" % (len(extra_graph), uri))
                 preference_applied = True
+            # Is there a PreferContainedDescriptions header? If so then
+            # contained is set to the URIs of resources to describe
+            contained = None
             if 'http://www.w3.org/ns/oa#PreferContainedDescriptions' in includes and isinstance(resource, LDPC):
-                contained_graph = self.store.contained_graph(uri, omits)
-                logging.debug("PreferContainedDescriptions, adding %d triples from contained LDPRS(s)" % (len(contained_graph)))
-                if extra_graph is None:
-                    extra_graph = contained_graph
-                else:
-                    extra_graph += contained_graph
+                contained = resource.contains
                 preference_applied = True
-            content = resource.serialize(content_type, omits, extra=extra_graph)
-            if (len(resource) < 20):
-                logging.debug("RDF response:\n" + content)
+            # Paging of large containers per LDP Paging
+            page = None
+            page_size = None
+            if (isinstance(resource, LDPC) and content_type in LDPRS.rdf_media_types):
+                page_size = self.request_page_size(resource, omits, contained is not None)
+            if (page_size is not None):
+                if (self.get_query_argument('page_size', None) is None):
+                    # Client must follow redirect to first page
+                    self.redirect(self.page_uri(uri, page_size), status=303)
+                    return
+                after = self.get_query_argument('page_after', None)
+                before = self.get_query_argument('page_before', None)
+                (page, has_prev, has_next) = await self.run_blocking(
+                    resource.page, page_size, omits, after, before)
+                self.response_links.add('type', [str(LDP.Page)])
+                self.response_links.add('first', [self.page_uri(uri, page_size)])
+                if (has_prev and len(page) > 0):
+                    self.response_links.add('prev', [self.page_uri(uri, page_size, before=page[0])])
+                if (has_next):
+                    self.response_links.add('next', [self.page_uri(uri, page_size, after=page[-1])])
+            if (contained is not None):
+                if (page is not None and resource.paged_entries(omits) is resource.contains):
+                    # Describe just the contained resources on this page
+                    contained = page
+                elif (self.max_contained_descriptions is not None and
+                        len(contained) > self.max_contained_descriptions):
+                    logging.warning("PreferContainedDescriptions, describing only first %d of %d contained resources" %
+                                    (self.max_contained_descriptions, len(contained)))
+                    contained = list(islice(contained, self.max_contained_descriptions))
+                logging.debug("PreferContainedDescriptions, adding triples from %d contained resources" % (len(contained)))
+            content = None
+            stream = (not is_head and not want_digest and
+                      content_type in resource.streamable_media_types and
+                      self.stream_min_triples is not None and
+                      (contained is not None or
+                       self.representation_size(resource, omits, extra_graph, page) >= self.stream_min_triples))
+            if (stream):
+                etag = None  # set in write_rdf_chunks()
+                content_length = None
             else:
-                logging.debug("RDF response: %d triples" % (len(resource)))
+                (etag, content) = await self.serialize_rdf(
+                    uri, resource, content_type, omits, extra_graph, page, contained)
+                content_length = len(content)
+            if (page is not None and etag is not None):
+                # Page is not the whole resource so has a weak ETag
+                etag = 'W/' + etag
             if (len(omits) > 0 or preference_applied):
                 self.set_header("Preference-Applied", "return=representation")
         self.response_links.add('type', resource.rdf_types)
@@ -132,26 +314,251 @@ class LDPHandler(RequestHandler):
             self.response_links.add('original timegate', [resource.original])  # FIXME - need this?
             self.response_links.add('type', ['http://mementoweb.org/ns#TimeMap'])
         elif (resource.is_ldprm):
+            self.response_links.add('original timegate', [resource.original])
+            self.response_links.add('timemap', [resource.timemap])
             self.response_links.add('type', ['http://mementoweb.org/ns#Memento'])
+            if (resource.memento_datetime is not None):
+                self.set_header("Memento-Datetime", memento_datetime_string(resource.memento_datetime))
         self.set_link_header()
         if (want_digest):
-            self.set_header("Digest", want_digest.digest_value(content))
+            if (isinstance(resource, LDPNR)):
+                digest = await self.run_blocking(resource.content_digest, want_digest.want_digest)
+                self.set_header("Digest", "%s=%s" % (want_digest.want_digest, digest))
+            else:
+                self.set_header("Digest", await self.run_blocking(want_digest.digest_value, content))
         self.set_header("Content-Type", content_type)
-        self.set_header("Content-Length", len(content))
-        self.set_header("Etag", resource.etag)
+        if (isinstance(resource, LDPNR)):
+            self.set_header("Accept-Ranges", "bytes")
+        if (byte_range is not None):
+            (start, end) = byte_range
+            self.set_status(206)
+            self.set_header("Content-Range", "bytes %d-%d/%d" % (start, end - 1, content_length))
+        elif (content_length is not None):
+            (start, end) = (0, content_length)
+        if (content_length is not None):
+            self.set_header("Content-Length", end - start)
+            self.set_header("Etag", etag)
         self.set_allow(resource)
         if (not is_head):
-            self.write(content)
+            if (isinstance(resource, LDPNR)):
+                await self.write_nonrdf_content(resource, start, end)
+            elif (content is None):
+                await self.write_rdf_chunks(uri, resource, content_type, omits, extra_graph, page, contained)
+            else:
+                self.write(content)
+
+    def timegate_redirect(self, resource):
+        """Redirect TimeGate request on LDPRv resource to a Memento.
+
+        The Memento is found by binary search over the Memento-Datetime
+        index of the resource's TimeMap (see LDPCv.memento_at()), giving
+        the latest Memento at or before the Accept-Datetime. 406 if there
+        are no Mementos to choose from.
+
+        See <https://tools.ietf.org/html/rfc7089#section-4.1.1>.
+        """
+        try:
+            datetime = memento_parse_datetime(self.request.headers.get('Accept-Datetime'))
+        except ValueError:
+            raise HTTPError(400, "Bad Accept-Datetime header")
+        timemap = self.from_store(resource.timemap)
+        memento = timemap.memento_at(datetime)
+        if (memento is None):
+            raise HTTPError(406, "No Mementos for %s" % (resource.uri))
+        self.set_header("Vary", 'Accept-Datetime')
+        self.response_links.add('original timegate', [resource.uri])
+        self.response_links.add('timemap', [resource.timemap])
+        self.set_link_header()
+        self.redirect(memento, status=302)
+
+    def representation_size(self, resource, omits, extra, page):
+        """Approximate number of triples in RDF representation of resource."""
+        size = len(resource)
+        if (extra is not None):
+            size += len(extra)
+        if (page is not None):
+            size += len(page)
+        elif (isinstance(resource, LDPC)):
+            size += len(resource.paged_entries(omits) or ())
+        return size
+
+    async def serialize_rdf(self, uri, resource, content_type, omits, extra, page, contained=None):
+        """ETag and serialization of RDF resource, returns (etag, content).
+
+        Representations of the resource alone are cached in the store's
+        representation_cache if there is one. If contained is not None
+        then the descriptions of those contained resources are included
+        too, see Store.contained_graph(), with their locks held as well
+        as the lock for uri.
+        """
+        content = None
+        cache = self.store.representation_cache
+        if (extra is not None or page is not None or contained is not None):
+            cache = None
+        if (contained is not None):
+            contained = list(contained)
+        async with self.resource_locks.lock([uri] + (contained or [])):
+            if (contained is not None):
+                contained_graph = await self.run_blocking(
+                    self.store.contained_graph, uri, omits, contained)
+                if extra is None:
+                    extra = contained_graph
+                else:
+                    extra += contained_graph
+            etag = await self.run_blocking(lambda: resource.etag)
+            if (cache is not None):
+                cache_key = cache.key(uri, etag, content_type, omits)
+                content = cache.get(cache_key)
+            if (content is None):
+                content = await self.run_blocking(
+                    lambda: resource.serialize(content_type, omits, extra=extra, page=page).encode('utf-8'))
+                if (cache is not None):
+                    cache.put(cache_key, content)
+                if (len(resource) < 20):
+                    logging.debug("RDF response:\n" + content.decode('utf-8'))
+                else:
+                    logging.debug("RDF response: %d triples" % (len(resource)))
+            else:
+                logging.debug("RDF response: %d bytes from cache" % (len(content)))
+        return (etag, content)
+
+    async def write_rdf_chunks(self, uri, resource, content_type, omits, extra, page, contained=None):
+        """Write streamed serialization of RDF resource with chunked transfer encoding.
+
+        See LDPRS.serialize_chunks(). Chunks are generated in the executor
+        and each is flushed to the client before the next is generated, so
+        memory use does not depend on the size of the representation. The
+        lock for uri is held throughout so that the resource and its
+        containment do not change part way through, and the ETag is set
+        under the same lock before the headers are sent. If contained is
+        not None then the descriptions of those contained resources are
+        streamed too, see Store.contained_triples(), and their locks are
+        held as well.
+        """
+        logging.debug("RDF response: streamed")
+        if (contained is not None):
+            contained = list(contained)
+        async with self.resource_locks.lock([uri] + (contained or [])):
+            if (contained is not None):
+                extra = chain(extra or (), self.store.contained_triples(uri, omits, contained))
+            etag = await self.run_blocking(lambda: resource.etag)
+            self.set_header("Etag", etag if page is None else 'W/' + etag)
+            chunks = resource.serialize_chunks(content_type, omits, extra, page, self.write_chunk_size)
+            while True:
+                chunk = await self.run_blocking(next, chunks, None)
+                if (chunk is None):
+                    break
+                self.write(chunk)
+                await self.flush()
+
+    def request_page_size(self, resource, omits, describe_contained=False):
+        """Page size for GET of LDPC resource with omits, None if not paged.
+
+        The page size is taken from the page_size query parameter of
+        a request for a page, else from a max-member-count preference
+        in the Prefer header, else is the server page_size if the
+        container has more entries than that. If describe_contained
+        is set and the contained resources are paged then it is also
+        max_contained_descriptions if there are more than that. There
+        is no paging if the paged entries are omitted.
+        """
+        entries = resource.paged_entries(omits)
+        if (entries is None):
+            return None
+        page_size = self.get_query_argument('page_size', None)
+        if (page_size is not None):
+            try:
+                page_size = int(page_size)
+            except ValueError:
+                page_size = 0
+            if (page_size < 1):
+                raise HTTPError(400, "Bad page_size")
+            return page_size
+        page_size = find_max_member_count(self.request.headers.get_list('Prefer'))
+        if (page_size is None and self.page_size is not None and
+                len(entries) > self.page_size):
+            page_size = self.page_size
+        if (describe_contained and entries is resource.contains and
+                self.max_contained_descriptions is not None and
+                len(entries) > self.max_contained_descriptions and
+                (page_size is None or page_size > self.max_contained_descriptions)):
+            page_size = self.max_contained_descriptions
+        return page_size
+
+    def page_uri(self, uri, page_size, after=None, before=None):
+        """URI of page of resource uri, first page unless after or before given.
+
+        See LDPC.page() for the meaning of after and before.
+        """
+        params = [('page_size', page_size)]
+        if (after is not None):
+            params.append(('page_after', after))
+        elif (before is not None):
+            params.append(('page_before', before))
+        return uri + '?' + urlencode(params)
 
-    def post(self):
+    def request_byte_range(self, length):
+        """Byte range (start, end) requested in Range header, None for whole content.
+
+        Supports a single range in bytes units, see
+        https://tools.ietf.org/html/rfc7233#section-2.1, and ignores
+        other forms (multiple ranges, other units) so that the whole
+        content will be returned. end is exclusive. Raises ValueError if
+        the range is not satisfiable.
+        """
+        range_header = self.request.headers.get('Range')
+        if (range_header is None):
+            return None
+        m = re.match(r'''bytes=(\d*)-(\d*)$''', range_header.strip())
+        if (not m or (m.group(1) == '' and m.group(2) == '')):
+            return None
+        if (m.group(1) == ''):
+            # Suffix range, last n bytes
+            suffix_length = int(m.group(2))
+            if (suffix_length == 0 or length == 0):
+                raise ValueError("Unsatisfiable suffix range")
+            return (max(0, length - suffix_length), length)
+        start = int(m.group(1))
+        end = length if m.group(2) == '' else min(int(m.group(2)) + 1, length)
+        if (start >= length or start >= end):
+            raise ValueError("Unsatisfiable range")
+        return (start, end)
+
+    async def write_nonrdf_content(self, resource, start, end):
+        """Write bytes start to end (exclusive) of LDPNR content.
+
+        Content held in a file is memory-mapped and written in chunks of
+        write_chunk_size, waiting on flush() after each so that only about
+        one chunk is held in memory at a time.
+        """
+        if (resource.content_path is None):
+            self.write(resource.content[start:end])
+            return
+        if (start >= end):
+            return
+        with open(resource.content_path, 'rb') as fh:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos = start
+                while (pos < end):
+                    n = min(self.write_chunk_size, end - pos)
+                    self.write(mm[pos:pos + n])
+                    await self.flush()
+                    pos += n
+
+    async def post(self):
         """HTTP POST.
 
         Fedora: https://fcrepo.github.io/fcrepo-specification/#httpPOST
         LDP: https://www.w3.org/TR/ldp/#ldpr-HTTP_POST
         """
         uri = self.path_to_uri(self.request.path)
+        async with self.resource_locks.lock([uri]):
+            await self.post_locked(uri)
+
+    async def post_locked(self, uri):
+        """HTTP POST to container uri with lock on uri held."""
         resource = self.from_store(uri)
-        self.check_authz(resource, 'write')
+        self.check_authz(resource, 'append')
         if (resource.is_ldprm):
             raise HTTPError(405, "POST not supported on LDPRm/Memento")
         elif (not isinstance(resource, LDPC)):
@@ -163,28 +570,41 @@ class LDPHandler(RequestHandler):
                 try:
                     datetime = memento_parse_datetime(mdt_header)
                 except ValueError:
-                    HTTPError(401, "Bad Memento-Datetime header")
+                    raise HTTPError(400, "Bad Memento-Datetime header")
         slug = self.request.headers.get('Slug')
+        # Check any Digest before reserving a location for the new resource
+        await self.check_digest()
         if (resource.is_ldpcv and not datetime):
             # Request to create LDPRm/Memento with copy of LDPRv content
             ldprv = self.store[resource.original]
             new_resource = type(ldprv)()
-            new_resource.content = ldprv.content
-            if (isinstance(ldprv, LDPNR)):
-                new_resource.content_type = ldprv.content_type
-            new_uri = self.store.add(new_resource, context=uri, slug=slug)
+            if (isinstance(ldprv, LDPRS)):
+                # Stored as a delta against the previous memento
+                new_uri = self.store.add_memento(new_resource, ldprv.content, context=uri, slug=slug)
+            else:
+                new_resource.replace_content(ldprv)
+                new_resource.memento_datetime = memento_now()
+                new_uri = self.store.add(new_resource, context=uri, slug=slug)
         else:
-            # Store dummy resource in order to get new_uri to parse
-            # any input RDF with put_post_resource
-            # FIXME - Perhaps should have some way to reserve new resource location?
-            new_uri = self.store.add(LDPR(), context=uri, slug=slug)
-            new_resource = self.put_post_resource(new_uri)
-            new_resource.uri = new_uri
-            self.store.update(new_resource)
+            # Allocate new_uri so that any input RDF can be parsed by
+            # put_post_resource, the resource is stored only once it is
+            # complete. A PUT to the same URI meanwhile waits on the lock
+            new_uri = self.store.new_uri(uri, slug)
+            async with self.resource_locks.lock([new_uri]):
+                new_resource = await self.put_post_resource(new_uri)
+                try:
+                    self.store.add_new(new_resource, new_uri, context=uri)
+                except KeyError:
+                    if (new_resource.describedby is not None):
+                        self.store.delete(new_resource.describedby)
+                    raise HTTPError(409, "Location %s was taken while creating resource" % (new_uri))
+                self.upload_stored()
         if (resource.is_ldpcv):
             # Request to create LDPRm/Memento
             new_resource.original = resource.original
             new_resource.timemap = resource.uri
+            if (datetime):
+                new_resource.memento_datetime = datetime
             self.store.update(new_resource)
         if self.is_request_for_versioning:
             tm = LDPCv(uri=None, original=new_uri)
@@ -200,7 +620,7 @@ class LDPHandler(RequestHandler):
         logging.debug("POST %s as %s in %s OK" %
                       (str(new_resource), new_uri, uri))
 
-    def put(self):
+    async def put(self):
         """HTTP PUT.
 
         Fedora: https://fcrepo.github.io/fcrepo-specification/#httpPUT
@@ -210,9 +630,14 @@ class LDPHandler(RequestHandler):
         if (not self.support_put):
             raise HTTPError(405, "PUT not supported")
         uri = self.path_to_uri(self.request.path)
+        async with self.resource_locks.lock([uri]):
+            await self.put_locked(uri)
+
+    async def put_locked(self, uri):
+        """HTTP PUT to uri with lock on uri held."""
         # 5.2.4.2 LDP servers that allow LDPR creation via
         # PUT should not re-use URIs. => 409 if deleted
-        if (uri in self.store.deleted):
+        if (self.store.is_deleted(uri)):
             raise HTTPError(409, "Rejecting PUT to deleted URI")
         replace = False
         current_type = None
@@ -225,7 +650,7 @@ class LDPHandler(RequestHandler):
                 raise HTTPError(405, "PUT not supported on LDPRm/Memento")
         else:
             self.check_authz(None, 'write')  # FIXME - We have no resource, how to compute auth?
-        resource = self.put_post_resource(uri, current_type)
+        resource = await self.put_post_resource(uri, current_type)
         if (uri in self.store):
             # FIXME - What about versioning PUT to replace requests?
             #
@@ -236,14 +661,20 @@ class LDPHandler(RequestHandler):
             logging.debug("PUT REPLACE: %s" % (str(resource)))
             current_resource = self.store[uri]
             self.check_replace_via_put(current_resource, resource)
-            # OK, do replace of content only
-            current_resource.content = resource.content
-            self.store.update(current_resource)
+            # OK, do replace of content only, checking the ETag again in
+            # case another process sharing the store has changed it
+            im = self.request.headers.get('If-Match')
+            try:
+                self.store.replace_content(uri, resource, im)
+            except ResourceConflict as e:
+                raise HTTPError(409 if im is None else 412, str(e))
+            self.upload_stored()
         else:
             # New resource
             self.store.add(resource, uri)
+            self.upload_stored()
             if self.is_request_for_versioning:
-                tm = LDPCv(uri=None, original=r)
+                tm = LDPCv(uri=None, original=uri)
                 tm_uri = self.store.add(tm)  # no naming advice
                 logging.debug("PUT Versioned request, timemap=%s" % (tm.uri))
                 resource.timemap = tm.uri
@@ -267,7 +698,7 @@ class LDPHandler(RequestHandler):
         if (isinstance(old_resource, LDPNR) and
                 isinstance(new_resource, LDPNR)):
             # OK to replace any binary with another
-            content = old_resource.content
+            pass
         elif (isinstance(old_resource, LDPC) and
               isinstance(new_resource, LDPC)):
             # Container triple checks - it is OK to repeat (or not)
@@ -290,7 +721,7 @@ class LDPHandler(RequestHandler):
             raise HTTPError(409, "Rejecting incompatible replace of %s with %s" %
                                  (str(old_resource), str(new_resource)))
 
-    def put_post_resource(self, uri=None, current_type=None):
+    async def put_post_resource(self, uri=None, current_type=None):
         """Create resource by parsing request data from PUT or POST.
 
         Handles both RDF and Non-RDF sources. Look first at the Link header
@@ -318,10 +749,12 @@ class LDPHandler(RequestHandler):
             # Take default model (LDPRS or LDPNR) from content type
             model = self.ldp_rdf_source if content_type_is_rdf else self.ldp_nonrdf_source
         logging.debug('POST/PUT model: ' + str(model))
+        # Is there an acl link? Checked before anything is stored
+        acl = self.request_links.acl_uri(self.base_uri)
         #
         # Now deal with the content
         #
-        self.check_digest()
+        await self.check_digest()
         if (model != self.ldp_nonrdf_source):
             if (not content_type_is_rdf):
                 raise HTTPError(415, "Unsupported RDF type: %s" % (content_type))
@@ -330,9 +763,7 @@ class LDPHandler(RequestHandler):
                     r = LDPC(uri=uri, container_type=model)
                 else:
                     r = LDPRS(uri=uri)
-                r.parse(content=self.request.body,
-                        content_type=content_type,
-                        context=uri)
+                await self.run_blocking(r.parse, self.request_body, content_type, uri)
             except UnsupportedContainerType as e:
                 raise HTTPError(400, "Unsupported container type: %s" % (str(e)))
             except DataConflict as e:
@@ -346,63 +777,119 @@ class LDPHandler(RequestHandler):
         else:
             # When an LDPNR is created, an LDPRS must also be created
             # that it is Link rel="describedby"
-            r = LDPNR(uri=uri, content=self.request.body, content_type=content_type)
+            if (self._upload is not None):
+                # The spooled file is used for the content but remains
+                # owned by this request, and so removed in on_finish(),
+                # until the resource is stored (see upload_stored())
+                self._upload.close()
+                r = LDPNR(uri=uri, content_path=self._upload.path, content_type=content_type)
+                r.digests.update(self._upload.digests)
+            else:
+                r = LDPNR(uri=uri, content=self.request_body, content_type=content_type)
             rd = LDPRS(describes=r.uri)
             self.store.add(rd, rd.uri)
             r.describedby = rd.uri
             self.response_links.add('describedby', [r.describedby])
-        # Is there an acl link?
-        r.acl = self.request_links.acl_uri(self.base_uri)
+        r.acl = acl
         return(r)
 
-    def patch(self):
-        """HTTP PATCH."""
+    async def patch(self):
+        """HTTP PATCH.
+
+        The patch is applied to a copy of the content, possibly in the
+        executor, and the resulting delta is then applied to the stored
+        content, provided that it has not been changed meanwhile by
+        another process sharing the store.
+        """
         if (not self.support_patch):
             raise HTTPError(405, "PATCH not supported")
         uri = self.path_to_uri(self.request.path)
+        async with self.resource_locks.lock([uri]):
+            await self.patch_locked(uri)
+
+    async def patch_locked(self, uri):
+        """HTTP PATCH of uri with lock on uri held."""
         resource = self.from_store(uri)
         self.check_authz(resource, 'write')
         if (resource.is_ldprm):
             raise HTTPError(405, "PATCH not supported on LDPRm/Memento")
         if (not isinstance(resource, LDPRS)):
             raise HTTPError(405, "Rejecting PATCH to non-LDPRS (%s)" % (str(resource)))
-        self.check_digest()
+        await self.check_digest()
         content_type = self.request_content_type()
         if (content_type not in self.rdf_patch_types):
             raise HTTPError(415, "Unsupported RDF PATCH type: %s" % (content_type))
+        etag = resource.etag
         try:
-            resource.patch(patch=self.request.body.decode('utf-8'),
-                           content_type=content_type)
+            (added, removed) = await self.run_blocking(resource.patch_delta,
+                                                       self.request_body.decode('utf-8'),
+                                                       content_type)
         except PatchIllegal as e:
             raise HTTPError(409, "PATCH illegal: " + str(e))
         except PatchFailed as e:
             raise HTTPError(400, "PATCH failed: " + str(e))
+        try:
+            self.store.apply_delta(uri, added, removed, etag)
+        except ResourceConflict as e:
+            raise HTTPError(409, "PATCH conflict: " + str(e))
         logging.debug("PATCH %s OK" % (uri))
         self.set_status(204)
         self.confirm("Patched")
 
-    def delete(self):
+    async def delete(self):
         """HTTP DELETE.
 
         Optional in LDP <https://www.w3.org/TR/ldp/#ldpr-HTTP_DELETE>
+
+        Locks the resource and also the container it is removed from and
+        any original resource of a TimeMap, which are modified too. For a
+        container every resource it contains is locked as well, trying
+        again if resources have been added to the subtree while waiting.
         """
         if (not self.support_delete):
             raise HTTPError(405, "DELETE not supported")
         uri = self.path_to_uri(self.request.path)
-        resource = self.from_store(uri)  # handles 404/410 if not present
+        while True:
+            resource = self.from_store(uri)  # handles 404/410 if not present
+            uris = set(self.delete_uris(uri, resource))
+            async with self.resource_locks.lock(uris):
+                resource = self.from_store(uri)  # may have changed while waiting
+                if (uris.issuperset(self.delete_uris(uri, resource))):
+                    await self.delete_locked(uri, resource)
+                    return
+
+    def delete_uris(self, uri, resource):
+        """URIs of resources changed by DELETE of resource at uri."""
+        uris = [uri, resource.contained_in, resource.original]
+        if (isinstance(resource, LDPC)):
+            uris.extend(self.store.subtree(uri))
+        return uris
+
+    async def delete_locked(self, uri, resource):
+        """HTTP DELETE of resource at uri with locks held.
+
+        Deleting a container deletes everything it contains, recursively,
+        including the Mementos in an LDPCv. That is done in the executor
+        as it may take a while for a large subtree.
+        """
         self.check_authz(resource, 'write')
         if (resource.is_ldpcv):
-            # Remove versioning from original, remove Memento
+            # Remove versioning from original
             ldprv = self.store[resource.original]
+            ldprv.changing()
             ldprv.timemap = None
-            self.store.update(resource)
-            for contained in resource.contains:
-                # FIXME - What to do about any Mementos that might themselves be LDPC?
-                self.store.delete(contained)
-        self.store.delete(uri)
+            self.store.update(ldprv)
+        if (isinstance(resource, LDPC)):
+            await self.run_blocking(self.store.delete_subtree, uri, self.delete_progress)
+        else:
+            self.store.delete(uri)
         self.set_status(204)
         self.confirm("Deleted")
 
+    def delete_progress(self, n, total):
+        """Log progress of delete of container subtree."""
+        logging.info("DELETE %s: deleted %d of %d resources" % (self.request.path, n, total))
+
     def options(self):
         """HTTP OPTIONS.
 
@@ -460,20 +947,27 @@ class LDPHandler(RequestHandler):
         types = self.request_links.types
         return('http://mementoweb.org/ns#OriginalResource' in types)
 
-    def check_digest(self):
+    async def check_digest(self):
         """Check request Digest if present, raise 409 if bad, 400 if not supported.
 
         Follows https://tools.ietf.org/html/rfc3230. Will take the only the first
         Digest header if multiple are specified. Per the Fedora API specification,
         will report a 400 error if any digest type specified is not supported.
 
-        Simply returns if either there is no digest or it is good.
+        Simply returns if either there is no digest or it is good. The check is
+        done only once per request. Digests for a spooled upload were computed
+        as the data arrived.
         """
         digest_header = self.request.headers.get("Digest")
-        if (digest_header is None):
+        if (digest_header is None or self._digest_checked):
             return
         try:
-            Digest(digest_header=digest_header).check(self.request.body)
+            if (self._upload is not None):
+                self._upload.close()
+                Digest(digest_header=digest_header).check_values(self._upload.digests)
+            else:
+                await self.run_blocking(Digest(digest_header=digest_header).check, self.request_body)
+            self._digest_checked = True
         except UnsupportedDigest as e:
             raise HTTPError(400, str(e))
         except BadDigest as e:
@@ -498,15 +992,28 @@ class LDPHandler(RequestHandler):
     def check_authz(self, resource, access_type):
         """Check authorization for access_type on resource.
 
-        Will send a 403 response if the access requested is not allowed.
+        access_type is one of the keys of access_modes, the check uses the
+        Web Access Control rules implemented by Store.authorized(). The
+        admin user has all access.
+
+        Will send a 401 response if the access requested is not allowed
+        and there is no authenticated user, 403 otherwise.
         """
         user = self.current_user
         if (resource is None):
             logging.debug("check_authz: %s for PUT-to-create %s" % (str(user), access_type))
         else:
             logging.debug("check_authz: %s for %s %s" % (str(user), resource.uri, access_type))
-        if (user != 'fedoraAdmin'):  # FIXME -- Add some real check of ACLs!
-            raise HTTPError(403, 'Access denied (user %s, perms %s)' % (str(user), access_type))
+        if (user == self.fedora_admin_webid):
+            return
+        # FIXME - PUT-to-create has no container to inherit an ACL from
+        # so is allowed only for the admin user
+        if (resource is not None and resource.store is self.store and
+                self.store.authorized(user, self.access_modes[access_type], resource.uri)):
+            return
+        if (user is None):
+            raise HTTPError(401, 'Authentication required (perms %s)' % (access_type))
+        raise HTTPError(403, 'Access denied (user %s, perms %s)' % (str(user), access_type))
 
     def from_store(self, uri):
         """Get resource from store, raise 404 or 410 if not present."""
@@ -581,6 +1088,8 @@ class LDPHandler(RequestHandler):
         self.response_links.add('http://www.w3.org/ns/ldp#constrainedBy',
                                 [self.path_to_uri(self.constraints_path)])
         self.set_link_header()
+        if (status_code == 401):
+            self.set_header('WWW-Authenticate', 'Basic realm="trilpy"')
         self.set_header('Content-Type', 'text/plain')
         self.finish(str(status_code) + ' - ' + self._reason + "\n" + self.error_explanation)
 
@@ -596,6 +1105,87 @@ class LDPHandler(RequestHandler):
         super(LDPHandler, self).finish(chunk)
 
 
+class ImportHandler(LDPHandler):
+    """Bulk import handler.
+
+    Accepts POST of an archive (see trilpy.archive) as a tar file, which
+    is spooled to disk as for any non-RDF upload. The archive is read
+    and its RDF parsed in the executor, then all the resources are added
+    to the store in one batch holding the locks for them and their
+    containers. Import bypasses access control so is allowed only for
+    the admin user.
+    """
+
+    SUPPORTED_METHODS = ('POST',)
+
+    async def post(self):
+        """HTTP POST of archive to import."""
+        user = self.current_user
+        if (user != self.fedora_admin_webid):
+            raise HTTPError(401 if user is None else 403, "Import is allowed only for admin user")
+        if (self._upload is None):
+            raise HTTPError(415, "Import requires a tar file (application/x-tar)")
+        self._upload.close()
+        try:
+            resources = await self.run_blocking(read_archive, self._upload.path,
+                                                self.store.blob_store, self.import_workers)
+        except ArchiveError as e:
+            raise HTTPError(400, "Bad archive: " + str(e))
+        uris = [r.uri for r in resources] + [r.contained_in for r in resources]
+        async with self.resource_locks.lock(uris):
+            self.store.add_batch(resources)
+        logging.info("Imported %d resources" % (len(resources)))
+        self.set_header("Content-Type", "text/plain")
+        self.finish("Imported %d resources\n" % (len(resources)))
+
+
+class ExportHandler(LDPHandler):
+    """Bulk export handler.
+
+    Responds to GET with an archive (see trilpy.archive) of every
+    resource in the store as a gzipped tar file. The archive is written
+    from a StoreView so it is a consistent snapshot while other requests
+    continue to change the store. Entries are taken from the view on the
+    IOLoop, as the store is changed only there, while the compression
+    and reading of binaries are done in the executor. Export includes
+    resources regardless of access control so is allowed only for the
+    admin user.
+    """
+
+    SUPPORTED_METHODS = ('GET',)
+
+    async def get(self):
+        """HTTP GET of archive of the whole store."""
+        user = self.current_user
+        if (user != self.fedora_admin_webid):
+            raise HTTPError(401 if user is None else 403, "Export is allowed only for admin user")
+        view = StoreView(self.store)
+        writer = ArchiveWriter()
+        self.set_header("Content-Type", "application/gzip")
+        self.set_header("Content-Disposition", 'attachment; filename="trilpy-export.tar.gz"')
+        try:
+            for entry in view.entries():
+                await self.write_export_chunks(writer.add(entry))
+            await self.write_export_chunks(writer.close())
+        finally:
+            view.close()
+        logging.info("Exported %d resources" % (writer.num_resources))
+        self.finish()
+
+    async def write_export_chunks(self, chunks):
+        """Write output from iterator chunks, flushing every write_chunk_size bytes."""
+        size = 0
+        while True:
+            chunk = await self.run_blocking(next, chunks, None)
+            if (chunk is None):
+                break
+            self.write(chunk)
+            size += len(chunk)
+            if (size >= self.write_chunk_size):
+                await self.flush()
+                size = 0
+
+
 class StatusHandler(RequestHandler):
     """Server status report handler."""
 
@@ -603,6 +1193,7 @@ class StatusHandler(RequestHandler):
 
     def get(self):
         """HTTP GET for status report."""
+        self.store.sync()
         self.set_header("Content-Type", "text/plain")
         self.write("Store has\n")
         self.write("  * %d active resources\n" % (len(self.store)))
@@ -613,8 +1204,6 @@ class StatusHandler(RequestHandler):
                 t = str(type(resource))
             self.write("    * %s - %s\n" % (name, t))
         self.write("  * %d deleted resources\n" % (len(self.store.deleted)))
-        for name in sorted(self.store.deleted):
-            self.write("    * %s - %s\n" % (name, 'deleted'))
 
 
 def make_app(store, **ldphandler_config):
@@ -634,20 +1223,29 @@ def make_app(store, **ldphandler_config):
     return Application([
         (r"/(favicon\.ico|constraints.txt)", StaticFileHandler, {'path': static_path}),
         (r"/status", StatusHandler),
+        (r"/fcr:import", ImportHandler),
+        (r"/fcr:export", ExportHandler),
         (r".*", LDPHandler),
     ])
 
 
-def run(port, store, **ldphandler_config):
+def run(port, store, sockets=None, **ldphandler_config):
     """Run LDP server on port with given store and options.
 
     port is the port to run the application on
 
+    sockets may be a list of already bound sockets to use instead of
+    listening on port, for example from tornado.netutil.bind_sockets()
+    in a server using tornado.process.fork_processes()
+
     store and **ldphandler_config are simply passed on to make_app().
     """
     app = make_app(store, **ldphandler_config)
     logging.info("Running trilpy on http://localhost:%d" % (port))
-    app.listen(port)
+    if (sockets is None):
+        app.listen(port)
+    else:
+        HTTPServer(app).add_sockets(sockets)
     try:
         tornado.ioloop.IOLoop.current().start()
     except KeyboardInterrupt as e:
@@ -0,0 +1,52 @@
+"""Spooling of uploaded request bodies to disk.
+
+Large binary uploads are written to a temporary file chunk by chunk as
+they arrive rather than being buffered in memory. Any digests needed to
+check a Digest header are computed incrementally at the same time so
+that the content need not be read again.
+"""
+import logging
+import os
+import tempfile
+
+from .digest import MultiDigest
+
+
+class SpooledUpload(object):
+    """Request body spooled to a file in spool_dir with incremental digests."""
+
+    def __init__(self, spool_dir=None, digest_types=None):
+        """Initialize with new empty temporary file in spool_dir.
+
+        If spool_dir is None then the system default temporary directory
+        is used. digest_types is a list of digest types (names in
+        Digest.supported_digests) to compute as data is written.
+        """
+        fd, self.path = tempfile.mkstemp(dir=spool_dir, prefix='upload-')
+        self._fh = os.fdopen(fd, 'wb')
+        self.length = 0
+        self._digest = MultiDigest(digest_types or [])
+
+    def write(self, chunk):
+        """Write chunk of data to spool file and update digests."""
+        self._fh.write(chunk)
+        self._digest.update(chunk)
+        self.length += len(chunk)
+
+    def close(self):
+        """Finish writing spool file."""
+        if (not self._fh.closed):
+            self._fh.close()
+
+    @property
+    def digests(self):
+        """Dict of base64 encoded digest values keyed by digest type."""
+        return self._digest.digests
+
+    def discard(self):
+        """Close and remove spool file."""
+        self.close()
+        try:
+            os.unlink(self.path)
+        except OSError as e:
+            logging.warning("Failed to remove spooled upload %s: %s" % (self.path, str(e)))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Trilpy - micro-benchmarks of store operations."""
+
+import argparse
+import timeit
+from rdflib import URIRef, RDF
+from trilpy import Store, LDPC, LDPRS, ACLR
+from trilpy.namespace import ACL
+
+
+def int_list(s):
+    """List of ints from comma separated string."""
+    return [int(x) for x in s.split(',')]
+
+
+def make_acl(acl_for, size):
+    """ACLR for acl_for with size authorizations, the last matching.
+
+    All but the last authorization grant Read to other agents so that
+    the matching authorization has to be found amongst size entries.
+    """
+    acl = ACLR(acl_for=acl_for)
+    for n in range(size):
+        auth = URIRef(acl_for + '.acl#auth' + str(n))
+        agent = 'http://example.org/agent' + str(n)
+        if (n == size - 1):
+            agent = 'http://example.org/reader'
+        acl.content.add((auth, RDF.type, ACL.Authorization))
+        acl.content.add((auth, ACL.agent, URIRef(agent)))
+        acl.content.add((auth, ACL.mode, ACL.Read))
+        acl.content.add((auth, ACL.accessTo, URIRef(acl_for)))
+        acl.content.add((auth, ACL.default, URIRef(acl_for)))
+    return acl
+
+
+def make_tree(depth, acl_size):
+    """Store with chain of depth containers under root, ACL on root.
+
+    Returns (store, uri) where uri is the URI of an LDPRS at the bottom
+    of the chain that inherits its ACL from the root container.
+    """
+    store = Store('http://example.org')
+    root = LDPC()
+    store.add(root, uri='http://example.org')
+    acl = make_acl(root.uri, acl_size)
+    store.add(acl, uri=root.uri + '/.acl')
+    root.acl = acl.uri
+    parent = root.uri
+    for n in range(depth):
+        parent = store.add(LDPC(), context=parent, slug='c' + str(n))
+    r = store.add(LDPRS(), context=parent, slug='r')
+    return store, r
+
+
+def bench_authz(args):
+    """Time authorization decisions against tree depth and ACL size."""
+    agent = 'http://example.org/reader'
+    mode = str(ACL.Read)
+    print("%6s %6s %12s %12s" %
+          ('depth', 'auths', 'cold us', 'steady us'))
+    for depth in args.depths:
+        for acl_size in args.acl_sizes:
+            store, uri = make_tree(depth, acl_size)
+            acl = store[store.acl(uri)]
+
+            def cold():
+                store._inherited_acls.clear()
+                acl._compiled = None
+                store.authorized(agent, mode, uri)
+
+            def steady():
+                store.authorized(agent, mode, uri)
+
+            assert store.authorized(agent, mode, uri)
+            cold_us = min(timeit.repeat(cold, number=args.cold_number,
+                                        repeat=3)) / args.cold_number * 1e6
+            steady()
+            steady_us = min(timeit.repeat(steady, number=args.number,
+                                          repeat=3)) / args.number * 1e6
+            print("%6d %6d %12.2f %12.2f" %
+                  (depth, acl_size, cold_us, steady_us))
+
+
+def bench_post(args):
+    """Time adding an un-slugged resource to a container against store size."""
+    print("%10s %12s" % ('resources', 'add us'))
+    for size in args.sizes:
+        store = Store('http://example.org')
+        root = LDPC()
+        store.add(root, uri='http://example.org')
+        for n in range(size):
+            store.add(LDPRS(), context=root.uri)
+
+        def post():
+            store.add(LDPRS(), context=root.uri)
+
+        post_us = min(timeit.repeat(post, number=args.post_number,
+                                    repeat=3)) / args.post_number * 1e6
+        print("%10d %12.2f" % (size, post_us))
+
+
+def bench_delete(args):
+    """Time delete of a container subtree against its size."""
+    print("%10s %12s %12s" % ('resources', 'total ms', 'per res us'))
+    for size in args.sizes:
+        store = Store('http://example.org')
+        root = LDPC()
+        store.add(root, uri='http://example.org')
+        c = store.add(LDPC(), context=root.uri, slug='c')
+        for n in range(size):
+            r = LDPRS()
+            r.content.add((URIRef(c + '/r' + str(n)), RDF.type, URIRef(c)))
+            store.add(r, context=c, slug='r' + str(n))
+        secs = timeit.timeit(lambda: store.delete_subtree(c), number=1)
+        print("%10d %12.1f %12.2f" % (size, secs * 1e3, secs / (size + 1) * 1e6))
+
+
+BENCHMARKS = {
+    'authz': bench_authz,
+    'delete': bench_delete,
+    'post': bench_post,
+}
+
+
+def main():
+    """Command line handler."""
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('benchmarks', nargs='*', default=sorted(BENCHMARKS),
+                        help="benchmarks to run (%s)" %
+                             ', '.join(sorted(BENCHMARKS)))
+    parser.add_argument('--depths', type=int_list, default='1,10,50,100',
+                        help="containment tree depths to test")
+    parser.add_argument('--acl-sizes', type=int_list, default='1,10,100,1000',
+                        help="numbers of authorizations in ACL to test")
+    parser.add_argument('--sizes', type=int_list, default='1000,10000,100000',
+                        help="numbers of resources in store to test")
+    parser.add_argument('--post-number', type=int, default=1000,
+                        help="number of resources to add when timing")
+    parser.add_argument('--number', type=int, default=10000,
+                        help="number of steady state operations to time")
+    parser.add_argument('--cold-number', type=int, default=20,
+                        help="number of cold operations to time")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if (name not in BENCHMARKS):
+            parser.error("Unknown benchmark %s" % (name))
+        print("# %s" % (name))
+        BENCHMARKS[name](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,14 @@
 import sys
 import logging
 import argparse
-from trilpy import Store, LDPC, ACLR, LDP, run
+from concurrent.futures import ThreadPoolExecutor
+import os.path
+from tornado.netutil import bind_sockets
+from tornado.process import fork_processes
+from trilpy import Store, PersistentStore, LDPC, ACLR, LDP, run
+from trilpy.archive import read_archive, write_archive
+from trilpy.blob_store import BlobStore
+from trilpy.cache import RepresentationCache
 
 
 def main():
@@ -33,6 +40,55 @@ def main():
                         help="define root ACL path")
     parser.add_argument('--default-acl', default='/default.acl',
                         help="define default ACL path")
+    parser.add_argument('--store-dir', default=None,
+                        help="directory for persistent store (default is to "
+                             "keep everything in memory)")
+    parser.add_argument('--snapshot-interval', type=int, default=10000,
+                        help="number of updates between snapshots of "
+                             "persistent store")
+    parser.add_argument('--cache-size', type=int, default=64,
+                        help="size in MB of cache of serialized RDF "
+                             "representations (0 to disable)")
+    parser.add_argument('--blob-dir', default=None,
+                        help="directory for content-addressed store of "
+                             "binaries (default is STORE_DIR/blobs if "
+                             "--store-dir is set, else binaries are kept "
+                             "in memory)")
+    parser.add_argument('--upload-dir', default=None,
+                        help="directory for spooling uploaded binaries "
+                             "(default is system temporary directory)")
+    parser.add_argument('--max-upload-size', type=int, default=0,
+                        help="maximum size in MB of uploaded binaries "
+                             "(0 for no limit)")
+    parser.add_argument('--page-size', type=int, default=None,
+                        help="split GET responses for containers with more "
+                             "than this many entries into LDP Paging pages "
+                             "(default is to page only if client requests)")
+    parser.add_argument('--stream-min-triples', type=int, default=10000,
+                        help="stream Turtle and N-Triples responses with at "
+                             "least this many triples (0 to always stream, "
+                             "-1 to never stream)")
+    parser.add_argument('--max-contained-descriptions', type=int, default=1000,
+                        help="maximum number of contained resources described "
+                             "in one response for PreferContainedDescriptions, "
+                             "more are paged (0 for no limit)")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="number of server processes sharing the "
+                             "store in STORE_DIR (0 for one per CPU, "
+                             "requires --store-dir if not 1)")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="number of worker threads for parsing, "
+                             "serialization, patching and digests (0 to "
+                             "do all work on the main thread)")
+    parser.add_argument('--import', dest='import_archive', default=None,
+                        help="import resources from archive (tar file or "
+                             "directory) before starting the server")
+    parser.add_argument('--import-workers', type=int, default=0,
+                        help="number of worker processes for parsing RDF "
+                             "in imports (0 for one per CPU)")
+    parser.add_argument('--export', dest='export_archive', default=None,
+                        help="export all resources to a gzipped tar file "
+                             "and exit, instead of starting the server")
     parser.add_argument('--verbose', '-v', action='store_true',
                         help="be verbose.")
     args = parser.parse_args()
@@ -45,24 +101,72 @@ def main():
     else:
         parser.error("Unrecognized container type '%s'" %
                      (args.container_type))
+    if (args.processes != 1 and not args.store_dir):
+        parser.error("--processes requires --store-dir")
     logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
     base_uri = 'http://localhost:%d' % (args.port)  # FIXME
-    store = Store(base_uri)
-    container = LDPC(container_type=container_type)
-    store.add(container, args.root_container)
-    if (not args.no_acl):
-        acl = ACLR(acl_for=args.root_container)
-        acl.add_public_read(inherit=True)
-        acl_uri = store.add(acl, args.root_acl)
-        container.acl = acl_uri
-        acl_default = ACLR(acl_for=args.default_acl)  # for self hack
-        acl_default.add_public_read(inherit=True)
-        acl.acl_default = store.add(acl, args.default_acl)
-    run(args.port, store,
+    blob_dir = args.blob_dir
+    if (blob_dir is None and args.store_dir):
+        blob_dir = os.path.join(args.store_dir, 'blobs')
+
+    def make_store(shared=False):
+        blob_store = BlobStore(blob_dir) if blob_dir else None
+        if (args.store_dir):
+            store = PersistentStore(base_uri, args.store_dir,
+                                    snapshot_interval=args.snapshot_interval,
+                                    blob_store=blob_store, shared=shared)
+        else:
+            store = Store(base_uri, blob_store=blob_store)
+        if (args.cache_size > 0):
+            store.representation_cache = RepresentationCache(args.cache_size * 1024 * 1024)
+        return store
+
+    store = make_store()
+    if (len(store) == 0):
+        container = LDPC(container_type=container_type)
+        store.add(container, args.root_container)
+        if (not args.no_acl):
+            acl = ACLR(acl_for=container.uri)
+            acl.add_public_read(inherit=True)
+            acl_uri = store.add(acl, args.root_acl)
+            container.acl = acl_uri
+            store.update(container)
+            acl_default = ACLR(acl_for=args.default_acl)  # for self hack
+            acl_default.add_public_read(inherit=True)
+            acl.acl_default = store.add(acl_default, args.default_acl)
+    else:
+        logging.info("Using existing store with %d resources" % (len(store)))
+    import_workers = args.import_workers or None
+    if (args.import_archive):
+        resources = read_archive(args.import_archive, store.blob_store, import_workers)
+        store.add_batch(resources)
+        logging.info("Imported %d resources from %s" % (len(resources), args.import_archive))
+    if (args.export_archive):
+        with open(args.export_archive, 'wb') as fh:
+            n = write_archive(store, fh)
+        logging.info("Exported %d resources to %s" % (n, args.export_archive))
+        store.close()
+        return
+    sockets = None
+    if (args.processes != 1):
+        # Each process opens the store itself after the fork
+        store.close()
+        sockets = bind_sockets(args.port)
+        task_id = fork_processes(args.processes)
+        logging.info("Started server process %d" % (task_id))
+        store = make_store(shared=True)
+    run(args.port, store, sockets=sockets,
         no_auth=(args.no_auth),
         support_put=(not args.no_put),
         support_delete=(not args.no_delete),
-        require_if_match_etag=(not args.optional_if_match_etag))
+        require_if_match_etag=(not args.optional_if_match_etag),
+        upload_dir=args.upload_dir,
+        page_size=args.page_size,
+        max_contained_descriptions=(args.max_contained_descriptions or None),
+        import_workers=import_workers,
+        stream_min_triples=(None if args.stream_min_triples < 0 else args.stream_min_triples),
+        max_upload_size=(args.max_upload_size * 1024 * 1024 or None),
+        executor=(ThreadPoolExecutor(args.workers) if args.workers > 0 else None))
 
 if __name__ == "__main__":
     main()